@@ -1,11 +1,13 @@
 """Evaluation API endpoint for receiving repository submissions."""
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header
 from pydantic import BaseModel, EmailStr, HttpUrl
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import Optional
 
 from database.db import get_db_session, init_db
 from database.models import Task, Repo
+from utils import tracing
 
 app = FastAPI(title="Evaluation API")
 
@@ -108,7 +110,8 @@ async def register_task(
 @app.post("/api/evaluate", response_model=SubmissionResponse)
 async def submit_repo(
     submission: RepoSubmission,
-    db: Session = Depends(get_db_session)
+    db: Session = Depends(get_db_session),
+    x_trace_id: Optional[str] = Header(None)
 ):
     """
     Accept repository submission from students.
@@ -118,6 +121,12 @@ async def submit_repo(
     2. Stores the submission in the repos table
     3. Returns 200 on success, 400 on validation error
     """
+    trace_id = tracing.trace_id_from_header(x_trace_id, submission.nonce)
+    with tracing.span("evaluation.submit", trace_id=trace_id, email=submission.email, task=submission.task):
+        return _store_submission(submission, db)
+
+
+def _store_submission(submission: RepoSubmission, db: Session) -> "SubmissionResponse":
     try:
         # Step 1: Find matching task
         task = db.query(Task).filter(
@@ -1,14 +1,14 @@
 """Student API endpoint for receiving and processing requests."""
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response, Header
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional, Dict, Any
-import hashlib
-import uuid
-from datetime import datetime
+import asyncio
 
-from utils.llm_client import llm_client
 from utils.github_helper import github_helper
-from utils.retry_helper import send_evaluation_response
+from utils.deployment_pipeline import deployment_pipeline
+from utils.callback_outbox import callback_outbox
+from utils import tracing
+from database.db import init_db
 from config.config import config
 
 app = FastAPI(title="Student LLM Code Deployment API")
@@ -34,6 +34,17 @@ class TaskRequest(BaseModel):
 class TaskResponse(BaseModel):
     status: str
     message: str
+    job_id: Optional[str] = None
+    repo_url: Optional[str] = None
+    commit_sha: Optional[str] = None
+    pages_url: Optional[str] = None
+
+
+@app.on_event("startup")
+async def startup():
+    """Initialize database and resume unfinished deployments."""
+    init_db()
+    await deployment_pipeline.resume()
 
 
 @app.get("/")
@@ -54,19 +65,31 @@ async def health():
     return status
 
 
-@app.post("/api/task", response_model=TaskResponse)
-async def receive_task(task: TaskRequest):
+@app.post("/api/task", response_model=TaskResponse, status_code=202)
+async def receive_task(task: TaskRequest, response: Response, x_trace_id: Optional[str] = Header(None)):
     """
-    Receive and process a task request.
+    Receive a task request and queue it for deployment.
+    
+    Requests are idempotent on (email, task, round, nonce): a retried request
+    attaches to the in-flight job (202) or replays the finished deployment (200).
     
-    This endpoint:
-    1. Validates the secret
-    2. Uses LLM to generate the app
-    3. Creates a GitHub repository
-    4. Pushes the code
-    5. Enables GitHub Pages
-    6. Sends evaluation response
+    This endpoint only validates the request and enqueues a deployment job;
+    a background worker pool then:
+    1. Uses LLM to generate the app
+    2. Creates a GitHub repository
+    3. Pushes the code
+    4. Enables GitHub Pages
+    5. Queues the evaluation response in the callback outbox
+    
+    Progress can be followed at GET /api/jobs/{job_id}. The deployment joins
+    the X-Trace-Id trace (or one derived from the nonce).
     """
+    trace_id = tracing.trace_id_from_header(x_trace_id, task.nonce)
+    with tracing.span("receive_task", trace_id=trace_id, email=task.email, task=task.task):
+        return await _receive_task(task, response, trace_id)
+
+
+async def _receive_task(task: TaskRequest, response: Response, trace_id: str) -> "TaskResponse":
     # --- SECURE GLOBAL SECRET CHECK ---
     if task.secret != config.SECRET_KEY:
         raise HTTPException(
@@ -75,104 +98,86 @@ async def receive_task(task: TaskRequest):
         )
     # --- END SECURE GLOBAL SECRET CHECK ---
 
+    # Step 1: Validate secret (per-email, optional)
+    expected_secret = config.STUDENT_SECRETS.get(task.email)
+    if expected_secret and task.secret != expected_secret:
+        raise HTTPException(status_code=401, detail="Invalid secret")
+    
+    # Step 2: Ensure GitHub credentials are present before attempting GH operations
+    if not github_helper.has_credentials():
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "GitHub credentials are not configured",
+                "hint": "Set GITHUB_TOKEN and GITHUB_USERNAME to enable deployment to GitHub",
+            },
+        )
+
+    # Step 3: Queue the deployment
+    request = task.dict(exclude={"secret"})
+    request["attachments"] = [att.dict() for att in task.attachments or []]
+    request["trace_id"] = trace_id
     try:
-        # Step 1: Validate secret (per-email, optional)
-        expected_secret = config.STUDENT_SECRETS.get(task.email)
-        if expected_secret and task.secret != expected_secret:
-            raise HTTPException(status_code=401, detail="Invalid secret")
-        
-        # Step 2: Ensure GitHub credentials are present before attempting GH operations
-        if not github_helper.has_credentials():
-            raise HTTPException(
-                status_code=503,
-                detail={
-                    "error": "GitHub credentials are not configured",
-                    "hint": "Set GITHUB_TOKEN and GITHUB_USERNAME to enable deployment to GitHub",
-                },
-            )
-
-        # Step 3: Generate app using LLM
-        print(f"Generating app for task: {task.task}")
-        files = llm_client.generate_app(
-            brief=task.brief,
-            checks=task.checks,
-            attachments=[att.dict() for att in task.attachments]
+        job, created = await deployment_pipeline.submit(request)
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Deployment queue is full, please retry later"
         )
-        
-        # Step 4: Create unique repository name
-        repo_name = f"{task.task}-{task.round}"
-        repo_name = repo_name.replace("_", "-").lower()
-        
-        # Create repository with collision handling (auto-suffix)
-        attempt = 0
-        while True:
-            try:
-                print(f"Creating repository: {repo_name}")
-                repo_url = github_helper.create_repo(
-                    repo_name=repo_name,
-                    description=f"Task: {task.task} Round {task.round}"
-                )
-                break
-            except Exception as ce:
-                msg = str(ce).lower()
-                if "already exists" in msg and attempt < 3:
-                    attempt += 1
-                    suffix = str(int(datetime.utcnow().timestamp()))
-                    repo_name = f"{repo_name}-{suffix}"
-                    print(f"Repository exists, retrying with name: {repo_name}")
-                    continue
-                raise
-        
-        # Step 5: Push files to repository (including gh-pages branch for auto Pages deployment)
-        print(f"Pushing files to repository")
-        commit_sha = github_helper.push_files(repo_name, files, also_gh_pages=True)
-        
-        # Step 6: Enable GitHub Pages (tries API, but gh-pages branch may auto-enable)
-        print(f"Enabling GitHub Pages")
-        pages_url = github_helper.enable_github_pages(repo_name)
-        
-        # Wait for Pages to be available and capture status
-        print(f"Waiting for GitHub Pages to be available")
-        ready = github_helper.wait_for_pages(pages_url, timeout=config.GITHUB_PAGES_TIMEOUT)
-        # Backward-compatible: handle older runtimes without get_pages_build_status
-        try:
-            pages_status = github_helper.get_pages_build_status(repo_name)  # type: ignore[attr-defined]
-        except Exception:
-            pages_status = {"status": "unknown"}
-        
-        # Step 7: Send evaluation response
-        evaluation_data = {
-            "email": task.email,
-            "task": task.task,
-            "round": task.round,
-            "nonce": task.nonce,
-            "repo_url": repo_url,
-            "commit_sha": commit_sha,
-            "pages_url": pages_url,
-        }
-        
-        # Send evaluation response asynchronously (non-blocking)
-        # This prevents circular dependency timeout when HF Space calls its own evaluation endpoint
-        import threading
-        def send_async():
-            try:
-                print(f"Sending evaluation response to {task.evaluation_url}")
-                success = send_evaluation_response(task.evaluation_url, evaluation_data)
-                if not success:
-                    print(f"Warning: Failed to send evaluation response")
-            except Exception as e:
-                print(f"Warning: Evaluation callback failed: {e}")
-        
-        threading.Thread(target=send_async, daemon=True).start()
-        
+    
+    if not created and job.status == "completed":
+        print(f"Replaying completed deployment {job.id} for task: {task.task}")
+        response.status_code = 200
         return TaskResponse(
             status="success",
-            message=f"App deployed successfully. Repo: {repo_url}, Pages: {pages_url} | PagesReady={ready} BuildStatus={pages_status.get('status')}"
+            message=f"App already deployed. Repo: {job.result.get('repo_url')}, Pages: {job.result.get('pages_url')}",
+            job_id=job.id,
+            repo_url=job.result.get("repo_url"),
+            commit_sha=job.result.get("commit_sha"),
+            pages_url=job.result.get("pages_url")
         )
     
-    except Exception as e:
-        print(f"Error processing task: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    if not created:
+        print(f"Attached duplicate request to in-flight deployment {job.id} for task: {task.task}")
+        message = f"Deployment already in progress. Track progress at /api/jobs/{job.id}"
+    else:
+        print(f"Queued deployment job {job.id} for task: {task.task}")
+        message = f"Deployment queued. Track progress at /api/jobs/{job.id}"
+    return TaskResponse(
+        status="accepted",
+        message=message,
+        job_id=job.id
+    )
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report a deployment job's stage and timings."""
+    job = await deployment_pipeline.find_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/api/pipeline/stats")
+async def pipeline_stats():
+    """Report per-stage queue depth, concurrency and wait times."""
+    return deployment_pipeline.stats()
+
+
+@app.get("/api/callbacks")
+async def callback_stats():
+    """Report evaluation callback outbox counts by status."""
+    return await callback_outbox.stats()
+
+
+@app.get("/api/callbacks/{callback_id}")
+async def get_callback(callback_id: int):
+    """Report the delivery status of one evaluation callback."""
+    callback = await callback_outbox.get(callback_id)
+    if not callback:
+        raise HTTPException(status_code=404, detail="Callback not found")
+    return callback
 
 
 @app.post("/api/secret")
@@ -1,12 +1,17 @@
 """Main application entry point combining both APIs."""
+import asyncio
+import importlib
+import contextlib
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-import gradio as gr
 
 from api.student_api import app as student_app
 from api.evaluation_api import app as evaluation_app
 from database.db import init_db
+from utils.deployment_pipeline import deployment_pipeline
+from utils import metrics, tracing
 from config.config import config
 
 # Initialize main app
@@ -16,7 +21,60 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Add CORS middleware
+DASHBOARD_PATH = "/dashboard"
+
+
+class LazyDashboard:
+    """Gradio dashboard that is built on its first request.
+    
+    Importing gradio takes seconds, which used to delay every cold start
+    (and the first /health response) although the dashboard is rarely opened.
+    The dashboard is mounted on its own FastAPI app, and requests under
+    DASHBOARD_PATH are forwarded to it unchanged.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._app = None
+        self._lock = asyncio.Lock()
+        self._lifespan = contextlib.AsyncExitStack()
+    
+    def handles(self, scope) -> bool:
+        path = scope.get("path", "")
+        return scope["type"] != "lifespan" and (path == self.path or path.startswith(self.path + "/"))
+    
+    async def get_app(self):
+        async with self._lock:
+            if self._app is None:
+                gr = await asyncio.to_thread(importlib.import_module, "gradio")
+                container = gr.mount_gradio_app(FastAPI(), create_dashboard(), path=self.path)
+                # Gradio's startup events run in the lifespan of the app it is mounted on
+                await self._lifespan.enter_async_context(container.router.lifespan_context(container))
+                self._app = container
+                print("✓ Dashboard loaded")
+        return self._app
+    
+    async def aclose(self):
+        await self._lifespan.aclose()
+
+
+class DashboardMiddleware:
+    """Route dashboard requests to the lazily built Gradio app."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if dashboard.handles(scope):
+            await (await dashboard.get_app())(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+dashboard = LazyDashboard(DASHBOARD_PATH)
+app.add_middleware(DashboardMiddleware)
+
+# Add CORS middleware (added last so it also wraps the dashboard)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -32,12 +90,18 @@ app.mount("/evaluation", evaluation_app)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup."""
+    """Initialize database and resume unfinished deployments on startup."""
     init_db()
     print("✓ Database initialized")
+    await deployment_pipeline.resume()
     print(f"✓ Server starting on {config.API_HOST}:{config.API_PORT}")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await dashboard.aclose()
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -47,7 +111,9 @@ async def root():
         "endpoints": {
             "student_api": "/student",
             "evaluation_api": "/evaluation",
-            "dashboard": "/dashboard",
+            "dashboard": DASHBOARD_PATH,
+            "metrics": "/metrics",
+            "traces": "/traces/{trace_id}",
             "docs": "/docs"
         }
     }
@@ -59,9 +125,34 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics (pipeline stages, evaluation checks, LLM tokens, GitHub rate limit)."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str, format: str = "json"):
+    """Spans of one trace; format=text renders a waterfall.
+    
+    trace_id may also be a task nonce, which is mapped to its trace id.
+    """
+    if len(trace_id) != 32:
+        trace_id = tracing.trace_id_for(trace_id)
+    spans = await asyncio.to_thread(tracing.load_trace, trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    if format == "text":
+        return PlainTextResponse(tracing.render_waterfall(spans))
+    return {"trace_id": trace_id, "spans": spans}
+
+
 # Create Gradio dashboard
 def create_dashboard():
     """Create Gradio dashboard for monitoring."""
+    import gradio as gr
+    
     with gr.Blocks(title="LLM Code Deployment Dashboard") as dashboard:
         gr.Markdown("# LLM Code Deployment System Dashboard")
         
@@ -145,10 +236,6 @@ def create_dashboard():
     return dashboard
 
 
-# Mount Gradio app
-dashboard = create_dashboard()
-app = gr.mount_gradio_app(app, dashboard, path="/dashboard")
-
 
 if __name__ == "__main__":
     uvicorn.run(
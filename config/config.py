@@ -23,12 +23,36 @@ class Config:
     # GitHub Settings
     GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
     GITHUB_USERNAME = os.getenv("GITHUB_USERNAME", "")
+    GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+    GITHUB_PUSH_MODE = os.getenv("GITHUB_PUSH_MODE", "api")  # api (Git Data API, in memory) or git (temp-dir clone)
     
     # LLM Settings
     LLM_API_KEY = os.getenv("LLM_API_KEY", "")
     LLM_API_PROVIDER = os.getenv("LLM_API_PROVIDER", "gemini")  # gemini, aipipe, openai, anthropic
     LLM_API_BASE_URL = os.getenv("LLM_API_BASE_URL", "https://generativelanguage.googleapis.com")
     LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")  # gemini-1.5-flash (free tier) or gemini-1.5-pro
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))  # seconds per request attempt
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))  # shared async keep-alive pool
+    LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))  # requests/minute per model (0 = unlimited)
+    LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))  # tokens/minute per model (0 = unlimited)
+    LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")  # overrides: provider[:model]=rpm/tpm,...
+    LLM_RATE_LIMIT_BACKOFF = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", "2"))  # seconds after a 429, doubling per retry
+    LLM_RATE_LIMIT_BACKOFF_MAX = float(os.getenv("LLM_RATE_LIMIT_BACKOFF_MAX", "60"))  # cap, also for Retry-After
+    LLM_FALLBACK_PROVIDERS = os.getenv("LLM_FALLBACK_PROVIDERS", "")  # provider:model,... keys from <PROVIDER>_API_KEY
+    LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "45"))  # hedge after this until p95 is known
+    LLM_STREAM_HEDGE_DELAY = float(os.getenv("LLM_STREAM_HEDGE_DELAY", "10"))  # same, for a stream's first chunk
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # latencies needed for a p95
+    LLM_HEDGE_HISTORY = int(os.getenv("LLM_HEDGE_HISTORY", "200"))  # recent latencies kept per provider
+    LLM_PROMPT_CACHING = os.getenv("LLM_PROMPT_CACHING", "true").lower() == "true"  # provider-side prompt prefix caching
+    LLM_GEMINI_CACHE_MIN_TOKENS = int(os.getenv("LLM_GEMINI_CACHE_MIN_TOKENS", "32768"))  # explicit caching minimum for the model
+    LLM_GEMINI_CACHE_TTL = int(os.getenv("LLM_GEMINI_CACHE_TTL", "3600"))  # seconds
+    LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"  # parse files as they stream in
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"  # reuse identical generations
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+    LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))  # LRU eviction bound
+    ATTACHMENTS_AS_FILES = os.getenv("ATTACHMENTS_AS_FILES", "true").lower() == "true"  # deploy data URIs as files, describe them in the prompt
+    TEMPLATE_REUSE_ENABLED = os.getenv("TEMPLATE_REUSE_ENABLED", "true").lower() == "true"  # one generation per template variant
+    REVISION_MODE_ENABLED = os.getenv("REVISION_MODE_ENABLED", "true").lower() == "true"  # round 2+ patches the round 1 repo
     
     # Security
     SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")
@@ -37,10 +61,56 @@ class Config:
     # Evaluation
     EVALUATION_BASE_URL = os.getenv("EVALUATION_BASE_URL", "http://localhost:7860")
     EVALUATION_TIMEOUT = int(os.getenv("EVALUATION_TIMEOUT", "600"))  # 10 minutes
+    EVALUATION_CONCURRENCY = int(os.getenv("EVALUATION_CONCURRENCY", "8"))  # repos evaluated at once
+    EVALUATION_BATCH_TOKENS = int(os.getenv("EVALUATION_BATCH_TOKENS", "12000"))  # prompt budget per grading batch (0 = no batching)
+    EVALUATION_BATCH_MAX_ITEMS = int(os.getenv("EVALUATION_BATCH_MAX_ITEMS", "8"))  # repos per grading batch
+    EVALUATION_BATCH_LINGER = float(os.getenv("EVALUATION_BATCH_LINGER", "2"))  # seconds to wait for a batch to fill
     
     # GitHub Pages
     GITHUB_PAGES_BRANCH = os.getenv("GITHUB_PAGES_BRANCH", "gh-pages")
     GITHUB_PAGES_TIMEOUT = int(os.getenv("GITHUB_PAGES_TIMEOUT", "300"))  # 5 minutes
+    PAGES_WATCHER_CONNECTIONS = int(os.getenv("PAGES_WATCHER_CONNECTIONS", "8"))  # shared polling pool
+    PAGES_EXPECTED_BUILD_SECONDS = int(os.getenv("PAGES_EXPECTED_BUILD_SECONDS", "40"))  # until history exists
+    PAGES_HISTORY_SIZE = int(os.getenv("PAGES_HISTORY_SIZE", "50"))  # recent build times kept
+    PAGES_POLL_MIN_INTERVAL = float(os.getenv("PAGES_POLL_MIN_INTERVAL", "2"))
+    PAGES_POLL_MAX_INTERVAL = float(os.getenv("PAGES_POLL_MAX_INTERVAL", "30"))
+    
+    # Deployment pipeline
+    DEPLOYMENT_QUEUE_SIZE = int(os.getenv("DEPLOYMENT_QUEUE_SIZE", "1000"))  # intake queue (LLM stage)
+    DEPLOYMENT_JOB_HISTORY = int(os.getenv("DEPLOYMENT_JOB_HISTORY", "1000"))  # finished jobs kept in memory
+    PIPELINE_STAGE_QUEUE_SIZE = int(os.getenv("PIPELINE_STAGE_QUEUE_SIZE", "50"))  # queues between stages
+    PIPELINE_LLM_CONCURRENCY = int(os.getenv("PIPELINE_LLM_CONCURRENCY", "4"))  # bound by tokens/minute
+    PIPELINE_REPO_CONCURRENCY = int(os.getenv("PIPELINE_REPO_CONCURRENCY", "2"))  # bound by GitHub API rate limit
+    PIPELINE_SPECULATIVE_REPO = os.getenv("PIPELINE_SPECULATIVE_REPO", "true").lower() == "true"  # create repo during generation
+    REPO_POOL_SIZE = int(os.getenv("REPO_POOL_SIZE", "0"))  # pre-created empty repos (0 = disabled)
+    REPO_POOL_PREFIX = os.getenv("REPO_POOL_PREFIX", "pool")
+    REPO_POOL_QUIET_SECONDS = float(os.getenv("REPO_POOL_QUIET_SECONDS", "60"))  # refill only after no claims for this long
+    REPO_POOL_REFILL_INTERVAL = float(os.getenv("REPO_POOL_REFILL_INTERVAL", "30"))
+    PIPELINE_PUSH_CONCURRENCY = int(os.getenv("PIPELINE_PUSH_CONCURRENCY", "4"))
+    PIPELINE_PAGES_CONCURRENCY = int(os.getenv("PIPELINE_PAGES_CONCURRENCY", "200"))  # waits share one watcher
+    PIPELINE_CALLBACK_CONCURRENCY = int(os.getenv("PIPELINE_CALLBACK_CONCURRENCY", "4"))
+    
+    # Preflight (js: checks run locally in headless Chromium before pushing)
+    PREFLIGHT_ENABLED = os.getenv("PREFLIGHT_ENABLED", "true").lower() == "true"
+    PIPELINE_PREFLIGHT_CONCURRENCY = int(os.getenv("PIPELINE_PREFLIGHT_CONCURRENCY", "4"))  # pages open in the shared browser
+    PREFLIGHT_MAX_REPAIRS = int(os.getenv("PREFLIGHT_MAX_REPAIRS", "3"))  # targeted index.html fixes per deployment
+    PREFLIGHT_MAX_REGENERATIONS = int(os.getenv("PREFLIGHT_MAX_REGENERATIONS", "1"))  # when a repair cannot be applied
+    
+    # Evaluation callback outbox
+    CALLBACK_TIMEOUT = int(os.getenv("CALLBACK_TIMEOUT", "90"))  # seconds per delivery attempt
+    CALLBACK_MAX_ATTEMPTS = int(os.getenv("CALLBACK_MAX_ATTEMPTS", "8"))
+    CALLBACK_BACKOFF_BASE = float(os.getenv("CALLBACK_BACKOFF_BASE", "2"))  # seconds
+    CALLBACK_BACKOFF_MAX = float(os.getenv("CALLBACK_BACKOFF_MAX", "300"))  # seconds
+    CALLBACK_MAX_CONNECTIONS = int(os.getenv("CALLBACK_MAX_CONNECTIONS", "20"))  # shared pool
+    CALLBACK_PER_HOST_CONCURRENCY = int(os.getenv("CALLBACK_PER_HOST_CONCURRENCY", "4"))
+    CALLBACK_POLL_INTERVAL = float(os.getenv("CALLBACK_POLL_INTERVAL", "30"))  # seconds
+    
+    # Tracing
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_FILE = os.getenv("TRACE_FILE", "data/traces.jsonl")  # one JSON span per line
+    TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(20 * 1024 * 1024)))  # rotate past this size
+    TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))  # rotated files kept (traces.jsonl.1 ...)
+    TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))  # spans waiting for the writer; extra are dropped
     
     # Playwright
     PLAYWRIGHT_TIMEOUT = int(os.getenv("PLAYWRIGHT_TIMEOUT", "15000"))  # 15 seconds
@@ -33,9 +33,16 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+_initialized = False
+
+
 def init_db():
-    """Initialize database tables."""
+    """Initialize database tables (once per process; the apps and scripts all call this)."""
+    global _initialized
+    if _initialized:
+        return
     Base.metadata.create_all(bind=engine)
+    _initialized = True
 
 
 @contextmanager
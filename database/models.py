@@ -1,6 +1,6 @@
 """Database models for the LLM Code Deployment project."""
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, JSON, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, JSON, Boolean, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -124,3 +124,119 @@ class Submission(Base):
             "github_url": self.github_url,
             "active": self.active,
         }
+
+
+class Deployment(Base):
+    """Student-side deployment pipeline state, one row per task request."""
+    __tablename__ = "deployments"
+    __table_args__ = (
+        UniqueConstraint("email", "task", "round", "nonce", name="uq_deployment_request"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(32), unique=True, index=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    email = Column(String(255), index=True, nullable=False)
+    task = Column(String(255), index=True, nullable=False)
+    round = Column(Integer, nullable=False)
+    nonce = Column(String(255), index=True, nullable=False)
+    request = Column(JSON, nullable=False)  # task request without the secret
+    status = Column(String(32), index=True, nullable=False)  # queued, running, completed, failed
+    stage = Column(String(64))
+    completed_stages = Column(JSON, default=list)
+    files = Column(JSON)  # generated files, kept so a resume skips the LLM
+    files_hash = Column(String(64))
+    repo_name = Column(String(255))
+    repo_url = Column(String(512))
+    commit_sha = Column(String(255))
+    pages_url = Column(String(512))
+    pages_status = Column(String(64))
+    callback_status = Column(String(64))
+    result = Column(JSON, default=dict)
+    timings = Column(JSON, default=dict)
+    error = Column(Text)
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "job_id": self.job_id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "email": self.email,
+            "task": self.task,
+            "round": self.round,
+            "nonce": self.nonce,
+            "status": self.status,
+            "stage": self.stage,
+            "completed_stages": self.completed_stages,
+            "files_hash": self.files_hash,
+            "repo_name": self.repo_name,
+            "repo_url": self.repo_url,
+            "commit_sha": self.commit_sha,
+            "pages_url": self.pages_url,
+            "pages_status": self.pages_status,
+            "callback_status": self.callback_status,
+            "timings": self.timings,
+            "error": self.error,
+        }
+
+
+class CallbackOutbox(Base):
+    """Evaluation callbacks waiting to be (re)delivered."""
+    __tablename__ = "callback_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    job_id = Column(String(32), index=True)  # deployment that produced the callback
+    url = Column(String(512), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(32), index=True, nullable=False, default="pending")  # pending, delivered, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_status_code = Column(Integer)
+    last_error = Column(Text)
+    delivered_at = Column(DateTime)
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "job_id": self.job_id,
+            "url": self.url,
+            "status": self.status,
+            "attempts": self.attempts,
+            "next_attempt_at": self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            "last_status_code": self.last_status_code,
+            "last_error": self.last_error,
+            "delivered_at": self.delivered_at.isoformat() if self.delivered_at else None,
+        }
+
+
+class GenerationCacheEntry(Base):
+    """Generated app files keyed by a hash of the prompt inputs and model."""
+    __tablename__ = "generation_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(64), unique=True, index=True, nullable=False)  # sha256 hex
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)  # LRU order
+    provider = Column(String(32))
+    model = Column(String(128))
+    files = Column(JSON, nullable=False)
+    size_bytes = Column(Integer, nullable=False, default=0)
+    hits = Column(Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            "key": self.key,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "last_used_at": self.last_used_at.isoformat() if self.last_used_at else None,
+            "provider": self.provider,
+            "model": self.model,
+            "files": sorted(self.files or {}),
+            "size_bytes": self.size_bytes,
+            "hits": self.hits,
+        }
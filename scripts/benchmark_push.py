@@ -0,0 +1,174 @@
+"""Benchmark the git and Git Data API push paths against local stand-ins.
+
+The API path talks to an in-process stand-in for the GitHub Git Data API;
+the git path pushes to a local bare repository. Neither touches github.com.
+
+Usage:
+    python scripts/benchmark_push.py [iterations]
+"""
+import sys
+import os
+import json
+import time
+import hashlib
+import tempfile
+import shutil
+import statistics
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from git import Repo as GitRepo
+from utils.github_helper import GitHubHelper
+
+
+class StandInGitHubAPI(BaseHTTPRequestHandler):
+    """Minimal in-memory stand-in for the Git Data and contents endpoints."""
+
+    objects = {}
+    refs = {}
+    requests_seen = 0
+    bytes_received = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        with self.lock:
+            StandInGitHubAPI.requests_seen += 1
+            StandInGitHubAPI.bytes_received += length
+        return json.loads(body) if body else {}
+
+    def _send(self, status, payload=None):
+        body = json.dumps(payload or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _store(self, payload):
+        sha = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        self.objects[sha] = payload
+        return sha
+
+    def do_GET(self):
+        self._read_json()
+        parts = self.path.strip("/").split("/")
+        # repos/{owner}/{repo}/git/ref/heads/{branch}
+        if len(parts) >= 7 and parts[3:5] == ["git", "ref"]:
+            key = (parts[2], "/".join(parts[5:]))
+            if key in self.refs:
+                return self._send(200, {"object": {"sha": self.refs[key]}})
+            return self._send(409, {"message": "Git Repository is empty."})
+        self._send(404, {"message": "Not Found"})
+
+    def do_PUT(self):
+        payload = self._read_json()
+        parts = self.path.strip("/").split("/")
+        # repos/{owner}/{repo}/contents/{path}
+        if len(parts) >= 5 and parts[3] == "contents":
+            sha = self._store(payload)
+            self.refs[(parts[2], "heads/" + payload.get("branch", "main"))] = sha
+            return self._send(201, {"commit": {"sha": sha}})
+        self._send(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        payload = self._read_json()
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 5 and parts[3] == "git" and parts[4] in {"blobs", "trees", "commits"}:
+            return self._send(201, {"sha": self._store(payload)})
+        if len(parts) == 5 and parts[3:5] == ["git", "refs"]:
+            self.refs[(parts[2], payload["ref"].replace("refs/", "", 1))] = payload["sha"]
+            return self._send(201, {"ref": payload["ref"]})
+        self._send(404, {"message": "Not Found"})
+
+    def do_PATCH(self):
+        payload = self._read_json()
+        parts = self.path.strip("/").split("/")
+        # repos/{owner}/{repo}/git/refs/heads/{branch}
+        if len(parts) >= 7 and parts[3:5] == ["git", "refs"]:
+            key = (parts[2], "/".join(parts[5:]))
+            if key not in self.refs:
+                return self._send(422, {"message": "Reference does not exist"})
+            self.refs[key] = payload["sha"]
+            return self._send(200, {"object": {"sha": payload["sha"]}})
+        self._send(404, {"message": "Not Found"})
+
+
+class LocalGitHubHelper(GitHubHelper):
+    """GitHubHelper whose git remote is a local bare repository."""
+
+    def __init__(self, api_base: str, remotes_dir: str):
+        super().__init__()
+        self.token = "benchmark-token"
+        self.username = "benchmark"
+        self.api_base = api_base
+        self.remotes_dir = remotes_dir
+
+    def _remote_url(self, repo_name: str) -> str:
+        path = os.path.join(self.remotes_dir, f"{repo_name}.git")
+        GitRepo.init(path, bare=True)
+        return path
+
+
+def sample_files() -> dict:
+    """A generated site of typical size (~30 KB)."""
+    rows = "\n".join(
+        f"      <tr><td>Item {i}</td><td>{i * 3.5:.2f}</td></tr>" for i in range(600)
+    )
+    return {
+        "index.html": f"<!DOCTYPE html>\n<html><body>\n  <table>\n{rows}\n  </table>\n</body></html>\n",
+        "README.md": "# Benchmark\n\n" + "Usage notes.\n" * 200,
+        "LICENSE": "MIT License\n\n" + "Permission is hereby granted...\n" * 20,
+    }
+
+
+def run(helper: GitHubHelper, mode: str, iterations: int) -> list:
+    files = sample_files()
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        helper.push_files(f"bench-{mode}-{i}", files, also_gh_pages=True, mode=mode)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(name: str, timings: list) -> str:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (
+        f"{name:<5} mean={statistics.mean(timings) * 1000:8.1f} ms  "
+        f"p50={statistics.median(timings) * 1000:8.1f} ms  p95={p95 * 1000:8.1f} ms"
+    )
+
+
+def main(iterations: int = 20):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInGitHubAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    remotes_dir = tempfile.mkdtemp(prefix="bench-remotes-")
+
+    try:
+        helper = LocalGitHubHelper(f"http://127.0.0.1:{server.server_port}", remotes_dir)
+        git_timings = run(helper, "git", iterations)
+        api_timings = run(helper, "api", iterations)
+
+        print(f"Push benchmark ({iterations} iterations, main + gh-pages)")
+        print(summarize("git", git_timings))
+        print(summarize("api", api_timings))
+        print(
+            f"api requests/push={StandInGitHubAPI.requests_seen / iterations:.1f}  "
+            f"bytes/push={StandInGitHubAPI.bytes_received / iterations:.0f}"
+        )
+        print(f"speedup (mean): {statistics.mean(git_timings) / statistics.mean(api_timings):.1f}x")
+    finally:
+        server.shutdown()
+        shutil.rmtree(remotes_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
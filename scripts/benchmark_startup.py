@@ -0,0 +1,115 @@
+"""Benchmark cold start: import cost per module and time to the first /health.
+
+Imports are measured with ``python -X importtime -c "import app"`` in a fresh
+interpreter. Time to healthy starts uvicorn on a free port and polls /health;
+the first dashboard request (which builds the Gradio app) is timed as well.
+
+Usage:
+    python scripts/benchmark_startup.py [runs]
+"""
+import sys
+import os
+import time
+import socket
+import statistics
+import subprocess
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Heavy dependencies that should only be imported on first use
+DEFERRED = ["gradio", "google.generativeai", "openai", "anthropic", "github", "git", "playwright"]
+OWN_PACKAGES = ("app", "api", "utils", "database", "config", "templates")
+
+
+def import_times(module: str = "app"):
+    """Return {module: (self_us, cumulative_us)} from -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def report_imports(top: int = 15):
+    times = import_times()
+    total = max(cumulative for _, cumulative in times.values())
+    by_package = {}
+    for name, (self_us, _) in times.items():
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+
+    print(f"import app: {total / 1e6:.2f}s, {len(times)} modules")
+    print("\nSlowest packages (self time):")
+    for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<30} {us / 1000:8.1f} ms")
+
+    print("\nProject modules (cumulative, includes what they import):")
+    own = [(name, cumulative) for name, (_, cumulative) in times.items()
+           if name.split(".")[0] in OWN_PACKAGES]
+    for name, us in sorted(own, key=lambda item: -item[1])[:top]:
+        print(f"  {name:<30} {us / 1000:8.1f} ms")
+
+    print("\nDeferred dependencies:")
+    for name in DEFERRED:
+        status = "imported at startup ⚠" if name in times else "deferred ✓"
+        print(f"  {name:<30} {status}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_healthy(timeout: float = 120):
+    """Start the app and return (seconds to first /health, seconds for first /dashboard/)."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("Server exited during startup")
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"/health not ready after {timeout}s")
+            try:
+                if httpx.get(f"{base}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.05)
+        healthy = time.perf_counter() - start
+
+        dashboard_start = time.perf_counter()
+        httpx.get(f"{base}/dashboard/", timeout=timeout).raise_for_status()
+        return healthy, time.perf_counter() - dashboard_start
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main(runs: int = 3):
+    report_imports()
+
+    results = [time_to_healthy() for _ in range(runs)]
+    healthy = [h for h, _ in results]
+    dashboard = [d for _, d in results]
+    print(f"\nCold start ({runs} runs)")
+    print(f"  first /health      mean={statistics.mean(healthy):6.2f}s  min={min(healthy):6.2f}s")
+    print(f"  first /dashboard/  mean={statistics.mean(dashboard):6.2f}s  min={min(dashboard):6.2f}s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
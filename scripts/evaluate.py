@@ -1,26 +1,225 @@
 """Evaluate student submissions."""
+import re
 import sys
+import json
+import time
 import asyncio
-from datetime import datetime
-from typing import Dict, Any, List
-from playwright.async_api import async_playwright, Browser, Page
+import itertools
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
 from sqlalchemy.orm import Session
 
 from database.db import get_db, init_db
 from database.models import Repo, Result, Task
 from utils.github_helper import github_helper
-from utils.llm_client import llm_client
+from utils.llm_client import async_llm_client
+from utils import metrics, tracing
 from config.config import config
 
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, Page
+
+# LLM-graded checks: Result check name, graded file, rubric and excerpt size
+QUALITY_CHECKS = {"readme": "README.md quality", "code": "Code quality"}
+QUALITY_FILES = {"readme": "README.md", "code": "index.html"}
+QUALITY_EXCERPT_CHARS = {"readme": 2000, "code": 3000}
+QUALITY_RUBRICS = {
+    "readme": """- Has clear title and description (0.2)
+- Includes setup instructions (0.2)
+- Includes usage instructions (0.2)
+- Has code explanation (0.2)
+- Mentions license (0.1)
+- Professional formatting (0.1)
+""",
+    "code": """- Clean, readable code (0.3)
+- Proper structure and organization (0.2)
+- Error handling (0.2)
+- Comments/documentation (0.1)
+- Best practices followed (0.2)
+""",
+}
+
+
+def _utc(moment: datetime) -> datetime:
+    """GitHub timestamps are timezone-aware; task timestamps are naive UTC."""
+    return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+
+
+class QualityGrader:
+    """LLM quality grading, batched across concurrently evaluated repos.
+    
+    Each item is one repo's {"readme": ..., "code": ...} contents. Items queue
+    while evaluations run; a batch is sent once the next item would exceed
+    config.EVALUATION_BATCH_TOKENS (estimated prompt tokens), when it holds
+    EVALUATION_BATCH_MAX_ITEMS, or after EVALUATION_BATCH_LINGER seconds. The
+    response must be a JSON object keyed by item id; items missing from it or
+    malformed are graded again on their own. A budget of 0 grades every item
+    individually.
+    """
+    
+    def __init__(self, token_budget: int = None, max_items: int = None, linger: float = None):
+        self.token_budget = config.EVALUATION_BATCH_TOKENS if token_budget is None else token_budget
+        self.max_items = max_items or config.EVALUATION_BATCH_MAX_ITEMS
+        self.linger = config.EVALUATION_BATCH_LINGER if linger is None else linger
+        self._pending: List[Tuple[str, Dict[str, str], asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self._ids = itertools.count(1)
+        self.requests = 0
+        self.items = 0
+        self.reruns = 0
+    
+    async def grade(self, contents: Dict[str, str]) -> Tuple[Optional[Dict[str, Dict[str, Any]]], str]:
+        """Return ({key: {"score", "reason"}} or None if unparseable, raw response)."""
+        self.items += 1
+        if self.token_budget <= 0:
+            return await self._grade_single(contents)
+        
+        loop = asyncio.get_running_loop()
+        tokens = self._estimate_tokens(contents)
+        if self._pending and self._pending_tokens + tokens > self.token_budget:
+            self._flush()
+        future = loop.create_future()
+        self._pending.append((f"s{next(self._ids)}", contents, future))
+        self._pending_tokens += tokens
+        if len(self._pending) >= self.max_items or self._pending_tokens >= self.token_budget:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._flush)
+        return await future
+    
+    def stats(self) -> Dict[str, int]:
+        return {"items": self.items, "requests": self.requests, "reruns": self.reruns}
+    
+    @staticmethod
+    def _estimate_tokens(contents: Dict[str, str]) -> int:
+        return sum(min(len(content), QUALITY_EXCERPT_CHARS[key]) for key, content in contents.items()) // 4 + 50
+    
+    def _flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run_batch(self, batch: List[Tuple[str, Dict[str, str], asyncio.Future]]):
+        if len(batch) == 1:
+            await self._settle(batch[0][2], self._grade_single(batch[0][1]))
+            return
+        
+        parsed = None
+        try:
+            self.requests += 1
+            response = await async_llm_client.generate_code(self.batch_prompt(batch))
+            parsed = self._parse_json(response)
+        except Exception as e:
+            print(f"⚠ Batched grading of {len(batch)} repos failed ({str(e)[:100]}), grading individually")
+        
+        retry = []
+        for item_id, contents, future in batch:
+            entry = parsed.get(item_id) if isinstance(parsed, dict) else None
+            scores = self.scores_from(entry, list(contents))
+            if scores is None:
+                retry.append((contents, future))
+            elif not future.done():
+                future.set_result((scores, json.dumps(entry)))
+        if retry:
+            self.reruns += len(retry)
+            await asyncio.gather(*(self._settle(future, self._grade_single(contents)) for contents, future in retry))
+    
+    async def _grade_single(self, contents: Dict[str, str]) -> Tuple[Optional[Dict[str, Dict[str, Any]]], str]:
+        self.requests += 1
+        response = await async_llm_client.generate_code(self.prompt(contents))
+        return self.scores_from(self._parse_json(response), list(contents)), response
+    
+    @staticmethod
+    async def _settle(future: asyncio.Future, grading):
+        try:
+            result = await grading
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+    
+    @staticmethod
+    def _sections(contents: Dict[str, str], heading: str = "###") -> str:
+        sections = ""
+        for key, content in contents.items():
+            sections += f"\n{heading} {key}\n\n{QUALITY_FILES[key]} content:\n{content[:QUALITY_EXCERPT_CHARS[key]]}\n"
+        return sections
+    
+    @staticmethod
+    def _criteria(keys) -> str:
+        return "".join(f"\nCriteria for {key}:\n{QUALITY_RUBRICS[key]}" for key in keys)
+    
+    @classmethod
+    def prompt(cls, contents: Dict[str, str]) -> str:
+        """Prompt grading one repo's files against their rubrics."""
+        schema = ", ".join(f'"{key}": {{"score": 0.0-1.0, "reason": "brief explanation"}}' for key in contents)
+        return f"""Evaluate the quality of the files below, each on a scale of 0.0 to 1.0 against its own criteria.
+{cls._criteria(contents)}{cls._sections(contents)}
+Respond with ONLY a JSON object:
+{{{schema}}}
+"""
+    
+    @classmethod
+    def batch_prompt(cls, batch: List[Tuple[str, Dict[str, str], asyncio.Future]]) -> str:
+        """Prompt grading several repos at once, keyed by item id."""
+        keys = sorted({key for _, contents, _ in batch for key in contents}, key=list(QUALITY_RUBRICS).index)
+        submissions = ""
+        schema = []
+        for item_id, contents, _ in batch:
+            submissions += f"\n## Submission {item_id}\n{cls._sections(contents)}"
+            fields = ", ".join(f'"{key}": {{"score": 0.0-1.0, "reason": "brief explanation"}}' for key in contents)
+            schema.append(f'"{item_id}": {{{fields}}}')
+        return f"""Evaluate the quality of each independent submission below. Grade every file of every
+submission on a scale of 0.0 to 1.0 against the criteria for its kind.
+{cls._criteria(keys)}{submissions}
+Respond with ONLY a JSON object with exactly one entry per submission id:
+{{{", ".join(schema)}}}
+"""
+    
+    @staticmethod
+    def _parse_json(response: str) -> Optional[Any]:
+        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        if not json_match:
+            return None
+        try:
+            return json.loads(json_match.group())
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def scores_from(parsed: Any, keys: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Extract {key: {"score", "reason"}} for every key, or None if any is missing."""
+        try:
+            return {
+                key: {
+                    "score": float(parsed[key]["score"]),
+                    "reason": str(parsed[key].get("reason", "")),
+                }
+                for key in keys
+            }
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+
 
 class Evaluator:
     """Evaluator for student submissions."""
     
     def __init__(self):
-        self.browser: Browser = None
+        self.browser: Optional["Browser"] = None
+        self.grader = QualityGrader()
     
     async def init_browser(self):
         """Initialize Playwright browser."""
+        from playwright.async_api import async_playwright
         playwright = await async_playwright().start()
         self.browser = await playwright.chromium.launch(headless=True)
     
@@ -30,17 +229,40 @@ class Evaluator:
             await self.browser.close()
     
     def check_repo_created_after_task(self, repo: Repo, task: Task) -> Dict[str, Any]:
-        """Check if repository was created after task was sent."""
+        """Check if repository was created after task was sent.
+
+        Later rounds may revise the round-1 repo in place: then the repo must
+        have been created after that student's round-1 task and the submitted
+        revision commit made after this round's task.
+        """
         check_name = "Repo created after task"
         
         try:
             # Extract repo name from URL
             repo_name = repo.repo_url.split("/")[-1]
+            github_helper._ensure_client()  # the PyGithub client is created on first use
             gh_repo = github_helper.gh.get_user(config.GITHUB_USERNAME).get_repo(repo_name)
             
-            created_at = gh_repo.created_at
+            created_at = _utc(gh_repo.created_at)
             task_sent_at = task.timestamp
             
+            if task.round > 1 and created_at <= task_sent_at:
+                first_sent_at = self._first_round_sent_at(task)
+                committed_at = _utc(gh_repo.get_commit(repo.commit_sha).commit.committer.date)
+                if first_sent_at is None or created_at <= first_sent_at:
+                    reason = f"Repo created at {created_at}, before the round 1 task ({first_sent_at})"
+                elif committed_at <= task_sent_at:
+                    reason = f"Revision {repo.commit_sha[:7]} committed at {committed_at}, before task at {task_sent_at}"
+                else:
+                    return {
+                        "check": check_name,
+                        "score": 1.0,
+                        "reason": f"Repo created at {created_at} after the round 1 task ({first_sent_at}), "
+                                  f"revised at {committed_at} after task at {task_sent_at}",
+                        "logs": ""
+                    }
+                return {"check": check_name, "score": 0.0, "reason": reason, "logs": ""}
+            
             if created_at > task_sent_at:
                 return {
                     "check": check_name,
@@ -63,6 +285,19 @@ class Evaluator:
                 "logs": str(e)
             }
     
+    @staticmethod
+    def _first_round_sent_at(task: Task) -> Optional[datetime]:
+        """When this student's round-1 task of the same template was sent."""
+        template_id = task.task.rsplit("-", 1)[0]  # Remove hash suffix
+        with get_db() as db:
+            first = db.query(Task).filter(
+                Task.email == task.email,
+                Task.round == 1,
+                Task.task.like(f"{template_id}-%"),
+                Task.timestamp <= task.timestamp
+            ).order_by(Task.timestamp.desc()).first()
+            return first.timestamp if first else None
+    
     def check_license(self, repo: Repo) -> Dict[str, Any]:
         """Check if repository has MIT LICENSE."""
         check_name = "MIT LICENSE in root"
@@ -97,135 +332,72 @@ class Evaluator:
                 "logs": str(e)
             }
     
-    def check_readme_quality(self, repo: Repo) -> Dict[str, Any]:
-        """Check README.md quality using LLM."""
-        check_name = "README.md quality"
+    async def check_quality(self, repo: Repo) -> List[Dict[str, Any]]:
+        """Grade README.md and index.html quality with a single LLM call.
         
-        try:
-            repo_name = repo.repo_url.split("/")[-1]
-            readme_content = github_helper.get_file_content(
-                repo_name,
-                "README.md",
-                repo.commit_sha
-            )
-            
-            if not readme_content:
-                return {
+        Both files and both rubrics go into one prompt (shared with other repos
+        by the QualityGrader); the response carries a score per rubric, which
+        becomes the usual per-check results.
+        """
+        repo_name = repo.repo_url.split("/")[-1]
+        readme_content, html_content = await asyncio.gather(
+            asyncio.to_thread(github_helper.get_file_content, repo_name, "README.md", repo.commit_sha),
+            asyncio.to_thread(github_helper.get_file_content, repo_name, "index.html", repo.commit_sha),
+            return_exceptions=True,
+        )
+        
+        results = {}
+        rubrics = {}
+        for key, check_name, filename, content in (
+            ("readme", "README.md quality", "README.md", readme_content),
+            ("code", "Code quality", "index.html", html_content),
+        ):
+            if isinstance(content, Exception):
+                results[key] = {
                     "check": check_name,
                     "score": 0.0,
-                    "reason": "README.md not found",
-                    "logs": ""
-                }
-            
-            prompt = f"""Evaluate the quality of this README.md file on a scale of 0.0 to 1.0.
-
-Criteria:
-- Has clear title and description (0.2)
-- Includes setup instructions (0.2)
-- Includes usage instructions (0.2)
-- Has code explanation (0.2)
-- Mentions license (0.1)
-- Professional formatting (0.1)
-
-README.md content:
-{readme_content[:2000]}
-
-Respond with ONLY a JSON object:
-{{"score": 0.0-1.0, "reason": "brief explanation"}}
-"""
-            
-            response = llm_client.generate_code(prompt)
-            # Parse JSON from response
-            import json
-            import re
-            json_match = re.search(r'\{[^}]+\}', response)
-            if json_match:
-                result = json.loads(json_match.group())
-                return {
-                    "check": check_name,
-                    "score": float(result.get("score", 0.0)),
-                    "reason": result.get("reason", ""),
-                    "logs": response
-                }
-            else:
-                return {
-                    "check": check_name,
-                    "score": 0.5,
-                    "reason": "Could not parse LLM response",
-                    "logs": response
+                    "reason": f"Error: {str(content)}",
+                    "logs": str(content)
                 }
-        
-        except Exception as e:
-            return {
-                "check": check_name,
-                "score": 0.0,
-                "reason": f"Error: {str(e)}",
-                "logs": str(e)
-            }
-    
-    def check_code_quality(self, repo: Repo) -> Dict[str, Any]:
-        """Check code quality using LLM."""
-        check_name = "Code quality"
-        
-        try:
-            repo_name = repo.repo_url.split("/")[-1]
-            html_content = github_helper.get_file_content(
-                repo_name,
-                "index.html",
-                repo.commit_sha
-            )
-            
-            if not html_content:
-                return {
+            elif not content:
+                results[key] = {
                     "check": check_name,
                     "score": 0.0,
-                    "reason": "index.html not found",
+                    "reason": f"{filename} not found",
                     "logs": ""
                 }
-            
-            prompt = f"""Evaluate the quality of this code on a scale of 0.0 to 1.0.
-
-Criteria:
-- Clean, readable code (0.3)
-- Proper structure and organization (0.2)
-- Error handling (0.2)
-- Comments/documentation (0.1)
-- Best practices followed (0.2)
-
-Code content:
-{html_content[:3000]}
-
-Respond with ONLY a JSON object:
-{{"score": 0.0-1.0, "reason": "brief explanation"}}
-"""
-            
-            response = llm_client.generate_code(prompt)
-            import json
-            import re
-            json_match = re.search(r'\{[^}]+\}', response)
-            if json_match:
-                result = json.loads(json_match.group())
-                return {
-                    "check": check_name,
-                    "score": float(result.get("score", 0.0)),
-                    "reason": result.get("reason", ""),
-                    "logs": response
-                }
             else:
-                return {
-                    "check": check_name,
-                    "score": 0.5,
-                    "reason": "Could not parse LLM response",
-                    "logs": response
-                }
+                rubrics[key] = content
         
-        except Exception as e:
-            return {
-                "check": check_name,
-                "score": 0.0,
-                "reason": f"Error: {str(e)}",
-                "logs": str(e)
-            }
+        if rubrics:
+            try:
+                scores, response = await self.grader.grade(rubrics)
+                for key in rubrics:
+                    check_name = QUALITY_CHECKS[key]
+                    if scores is None:
+                        results[key] = {
+                            "check": check_name,
+                            "score": 0.5,
+                            "reason": "Could not parse LLM response",
+                            "logs": response
+                        }
+                    else:
+                        results[key] = {
+                            "check": check_name,
+                            "score": scores[key]["score"],
+                            "reason": scores[key]["reason"],
+                            "logs": response
+                        }
+            except Exception as e:
+                for key in rubrics:
+                    results[key] = {
+                        "check": QUALITY_CHECKS[key],
+                        "score": 0.0,
+                        "reason": f"Error: {str(e)}",
+                        "logs": str(e)
+                    }
+        
+        return [results["readme"], results["code"]]
     
     async def check_dynamic(self, repo: Repo, checks: List[str]) -> List[Dict[str, Any]]:
         """Run dynamic checks using Playwright."""
@@ -233,10 +405,14 @@ Respond with ONLY a JSON object:
         
         try:
             page = await self.browser.new_page()
-            await page.goto(repo.pages_url, timeout=config.PLAYWRIGHT_TIMEOUT)
+            with tracing.span("playwright.goto", url=repo.pages_url):
+                await page.goto(repo.pages_url, timeout=config.PLAYWRIGHT_TIMEOUT)
             
             for check in checks:
-                check_result = await self._evaluate_check(page, check)
+                started = time.perf_counter()
+                with tracing.span("check.js" if check.startswith("js:") else "check.text", check=check[:80]):
+                    check_result = await self._evaluate_check(page, check)
+                self._observe_check("js" if check.startswith("js:") else "text", check_result, started)
                 results.append(check_result)
             
             await page.close()
@@ -251,7 +427,7 @@ Respond with ONLY a JSON object:
         
         return results
     
-    async def _evaluate_check(self, page: Page, check: str) -> Dict[str, Any]:
+    async def _evaluate_check(self, page: "Page", check: str) -> Dict[str, Any]:
         """Evaluate a single check."""
         # Check if it's a JS check
         if check.startswith("js:"):
@@ -290,20 +466,43 @@ Respond with ONLY a JSON object:
                 "logs": ""
             }
     
+    @staticmethod
+    def _observe_check(check_type: str, result: Dict[str, Any], started: float):
+        """Record a check's latency and pass/fail outcome."""
+        metrics.EVALUATION_CHECK_SECONDS.labels(check_type).observe(time.perf_counter() - started)
+        outcome = "pass" if result["score"] >= 0.7 else "fail"
+        metrics.EVALUATION_CHECKS_TOTAL.labels(check_type, outcome).inc()
+    
     async def evaluate_repo(self, repo: Repo, task: Task, db: Session):
-        """Evaluate a single repository."""
+        """Evaluate a single repository (traced under the task's trace id)."""
+        with tracing.span("evaluation.evaluate_repo", trace_id=tracing.trace_id_for(repo.nonce),
+                          email=repo.email, task=repo.task):
+            await self._evaluate_repo(repo, task, db)
+    
+    async def _evaluate_repo(self, repo: Repo, task: Task, db: Session):
         print(f"\nEvaluating {repo.email} - {repo.task} (Round {repo.round})")
         
         results = []
         
-        # Static checks
-        results.append(self.check_repo_created_after_task(repo, task))
-        results.append(self.check_license(repo))
-        results.append(self.check_readme_quality(repo))
-        results.append(self.check_code_quality(repo))
+        async def run_static(check_types: List[str], check) -> List[Dict[str, Any]]:
+            started = time.perf_counter()
+            with tracing.span(f"check.{'+'.join(check_types)}"):
+                check_results = await check
+            if isinstance(check_results, dict):
+                check_results = [check_results]
+            for check_type, result in zip(check_types, check_results):
+                self._observe_check(check_type, result, started)
+            return check_results
         
-        # Dynamic checks
-        dynamic_results = await self.check_dynamic(repo, task.checks)
+        # Static checks (GitHub lookups and LLM grading) run alongside the dynamic checks
+        *static_results, dynamic_results = await asyncio.gather(
+            run_static(["repo_created"], asyncio.to_thread(self.check_repo_created_after_task, repo, task)),
+            run_static(["license"], asyncio.to_thread(self.check_license, repo)),
+            run_static(["readme_quality", "code_quality"], self.check_quality(repo)),
+            self.check_dynamic(repo, task.checks),
+        )
+        for check_results in static_results:
+            results.extend(check_results)
         results.extend(dynamic_results)
         
         # Save results to database
@@ -346,6 +545,7 @@ async def evaluate_all():
             
             print(f"Found {len(repos)} repositories to evaluate")
             
+            pending = []
             for repo in repos:
                 # Check if already evaluated
                 existing_results = db.query(Result).filter(
@@ -369,11 +569,27 @@ async def evaluate_all():
                     print(f"Warning: No task found for {repo.email} - {repo.task}")
                     continue
                 
-                await evaluator.evaluate_repo(repo, task, db)
+                pending.append((repo, task))
+            
+            # Detach the rows so a commit by one evaluation does not expire
+            # (and reload from worker threads) the rows another is still using
+            db.expunge_all()
+            limit = asyncio.Semaphore(config.EVALUATION_CONCURRENCY)
+            
+            async def evaluate(repo: Repo, task: Task):
+                async with limit:
+                    await evaluator.evaluate_repo(repo, task, db)
+            
+            await asyncio.gather(*(evaluate(repo, task) for repo, task in pending))
     
     finally:
         await evaluator.close_browser()
     
+    grading = evaluator.grader.stats()
+    if grading["items"]:
+        print(f"✓ Quality-graded {grading['items']} repos with {grading['requests']} LLM requests "
+              f"({grading['reruns']} re-run individually)")
+    
     print("\n✓ Evaluation complete!")
 
 
@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 from database.db import get_db, init_db
 from database.models import Task, Repo
 from utils.retry_helper import retry_request
+from utils import tracing
 from config.config import config
 from templates.task_loader import TaskLoader
 
@@ -40,7 +41,7 @@ def send_round2_tasks():
             existing = db.query(Task).filter(
                 Task.email == email,
                 Task.round == 2,
-                Task.statuscode == 200
+                Task.statuscode.in_([200, 202])
             ).first()
             
             if existing:
@@ -92,12 +93,14 @@ def send_round2_tasks():
             # Send request to student endpoint
             print(f"Sending Round 2 task to {email}...")
             try:
-                response = retry_request(
-                    original_task.endpoint,
-                    method="POST",
-                    json_data=payload,
-                    max_retries=3
-                )
+                with tracing.span("round2.send_task", trace_id=tracing.trace_id_for(nonce), email=email, task=task_id):
+                    response = retry_request(
+                        original_task.endpoint,
+                        method="POST",
+                        json_data=payload,
+                        headers={"Content-Type": "application/json", **tracing.trace_headers()},
+                        max_retries=3
+                    )
                 status_code = response.status_code
                 print(f"  ✓ Response: {status_code}")
             except Exception as e:
@@ -0,0 +1,39 @@
+"""Print a task's trace as a waterfall.
+
+Usage:
+    python scripts/trace_view.py <trace_id | nonce> [traces.jsonl]
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import tracing
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    trace_id = sys.argv[1]
+    if len(trace_id) != 32:
+        trace_id = tracing.trace_id_for(trace_id)  # given a nonce
+    path = sys.argv[2] if len(sys.argv) > 2 else None
+
+    spans = tracing.load_trace(trace_id, path)
+    if not spans:
+        print(f"No spans found for trace {trace_id}")
+        sys.exit(1)
+    print(tracing.render_waterfall(spans))
+
+    # The slowest leaf spans are usually the answer to "where did the time go"
+    parents = {s["parent_id"] for s in spans}
+    leaves = sorted((s for s in spans if s["span_id"] not in parents),
+                    key=lambda s: s["duration_ms"], reverse=True)
+    print("\nSlowest calls:")
+    for s in leaves[:5]:
+        print(f"  {s['duration_ms'] / 1000:8.2f}s  {s['name']}  {s['attributes']}")
+
+
+if __name__ == "__main__":
+    main()
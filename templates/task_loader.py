@@ -1,6 +1,7 @@
 """Task template loader and generator."""
 import json
 import os
+import re
 import random
 import hashlib
 import base64
@@ -17,6 +18,7 @@ class TaskLoader:
     def __init__(self, templates_dir: str = None):
         self.templates_dir = templates_dir or config.TASK_TEMPLATES_DIR
         self.templates = self._load_templates()
+        self._variant_patterns = None
     
     def _load_templates(self) -> List[Dict[str, Any]]:
         """Load all task templates from directory."""
@@ -102,6 +104,77 @@ class TaskLoader:
             "attachments": attachments
         }
     
+    def match_task(self, brief: str, checks: List[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Recognise the template variant that produced a brief and its checks.
+        
+        Args:
+            brief: Task brief as sent to the student
+            checks: Task checks as sent to the student
+        
+        Returns:
+            None if no variant matches, otherwise a dict with template_id,
+            round, variant (0 for round 1, n for the n-th round2 option), the
+            extracted seed/result values (None when not present in the text)
+            and the unsubstituted variant brief, checks and attachments
+        """
+        if self._variant_patterns is None:
+            self._variant_patterns = self._build_variant_patterns()
+        
+        text = self._task_text(brief, checks or [])
+        for pattern, info in self._variant_patterns:
+            match = pattern.fullmatch(text)
+            if not match:
+                continue
+            values = match.groupdict()
+            seed, result = values.get("seed"), values.get("result")
+            if seed is not None:
+                # Both values derive from the seed, so they must agree
+                expected = str(sum(ord(c) for c in seed) % 1000)
+                if result is not None and result != expected:
+                    continue
+                result = expected
+            return {**info, "seed": seed, "result": result}
+        return None
+    
+    def _build_variant_patterns(self) -> List[Any]:
+        """Compile one regex per template variant, with ${seed}/${result} as captures."""
+        patterns = []
+        for template in self.templates:
+            variants = [(1, 0, template)] + [
+                (2, i + 1, variant) for i, variant in enumerate(template.get("round2", []))
+            ]
+            for round_num, index, variant in variants:
+                checks = variant.get("checks", [])
+                pattern = self._placeholder_pattern(self._task_text(variant["brief"], checks))
+                patterns.append((pattern, {
+                    "template_id": template["id"],
+                    "round": round_num,
+                    "variant": index,
+                    "brief": variant["brief"],
+                    "checks": checks,
+                    "attachments": variant.get("attachments", []),
+                }))
+        return patterns
+    
+    @staticmethod
+    def _task_text(brief: str, checks: List[str]) -> str:
+        return "\n".join([brief.strip()] + [check.strip() for check in checks])
+    
+    @staticmethod
+    def _placeholder_pattern(text: str):
+        groups = {"${seed}": ("seed", r"[0-9A-Za-z]+"), "${result}": ("result", r"-?\d+")}
+        seen = set()
+        parts = []
+        for part in re.split(r"(\$\{seed\}|\$\{result\})", text):
+            if part in groups:
+                name, body = groups[part]
+                parts.append(f"(?P={name})" if name in seen else f"(?P<{name}>{body})")
+                seen.add(name)
+            else:
+                parts.append(re.escape(part))
+        return re.compile("".join(parts), re.DOTALL)
+    
     def _substitute(self, text: str, seed: str) -> str:
         """Substitute ${seed} and ${result} in text."""
         # For now, just replace ${seed}
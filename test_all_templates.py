@@ -23,6 +23,7 @@ from database.models import Task
 STUDENT_API_URL = "https://mathcsai-llm-code-deployment.hf.space/student/api/task"
 EVALUATION_API_URL = "https://mathcsai-llm-code-deployment.hf.space/evaluation/api/evaluate"
 REGISTER_TASK_URL = "https://mathcsai-llm-code-deployment.hf.space/evaluation/api/register_task"
+JOBS_API_URL = "https://mathcsai-llm-code-deployment.hf.space/student/api/jobs"
 
 # Test email and secret
 TEST_EMAIL = "test@example.com"
@@ -53,6 +54,19 @@ def create_task_id(template_id, brief, attachments):
     timestamp = int(time.time())
     return f"{template_id}-{hash_value}-{timestamp}"
 
+def wait_for_job(job_id, timeout=600):
+    """Poll the student API until a deployment job finishes."""
+    start = time.time()
+    while time.time() - start < timeout:
+        resp = requests.get(f"{JOBS_API_URL}/{job_id}", timeout=30)
+        if resp.status_code == 200:
+            job = resp.json()
+            if job["status"] in ("completed", "failed"):
+                return job
+            print(f"  ... {job['stage']} ({job['total_seconds']:.0f}s)")
+        time.sleep(10)
+    return None
+
 def register_and_deploy(task_data, test_name):
     """Register task and deploy app."""
     print(f"\n{'='*60}")
@@ -90,28 +104,24 @@ def register_and_deploy(task_data, test_name):
     # Step 2: Submit to student API
     print(f"\n[2/3] Submitting task to student API...")
     try:
-        resp = requests.post(STUDENT_API_URL, json=task_data, timeout=300)
-        if resp.status_code != 200:
+        resp = requests.post(STUDENT_API_URL, json=task_data, timeout=60)
+        if resp.status_code not in (200, 202):
             print(f"✗ Student API error: {resp.status_code}")
             print(resp.text)
             return None
         
         result = resp.json()
-        print(f"✓ Task submitted successfully")
-        
-        # Extract deployment info
-        import re
-        msg = result.get("message", "")
-        repo_url_match = re.search(r"Repo: (https?://[^\s]+)", msg)
-        pages_url_match = re.search(r"Pages: (https?://[^\s]+)", msg)
+        print(f"✓ Task submitted successfully (job {result.get('job_id')})")
         
-        if not repo_url_match or not pages_url_match:
-            print(f"✗ Could not extract URLs from response")
-            print(f"  Message: {msg}")
+        # Wait for the background deployment to finish
+        job = wait_for_job(result["job_id"])
+        if not job or job["status"] != "completed":
+            print(f"✗ Deployment did not complete")
+            print(f"  Job: {job}")
             return None
         
-        repo_url = repo_url_match.group(1)
-        pages_url = pages_url_match.group(1)
+        repo_url = job["result"]["repo_url"]
+        pages_url = job["result"]["pages_url"]
         
         print(f"  Repo: {repo_url}")
         print(f"  Pages: {pages_url}")
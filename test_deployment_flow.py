@@ -72,26 +72,29 @@ except Exception as e:
 # Step 2: Submit task to student API
 print("\nSubmitting task to student API...")
 resp = requests.post(STUDENT_API_URL, json=task_data)
-if resp.status_code != 200:
+if resp.status_code not in (200, 202):
     print(f"Student API error: {resp.status_code}", resp.text)
     exit(1)
 result = resp.json()
 print("Student API response:", result)
 
-# Robustly extract repo_url, pages_url, and commit_sha from the message string
-import re
-msg = result.get("message", "")
-repo_url_match = re.search(r"Repo: (https?://[\w./-]+)", msg)
-pages_url_match = re.search(r"Pages: (https?://[\w./-]+)", msg)
-commit_sha_match = re.search(r"Commit: ([a-f0-9]{7,40})", msg)
+# Deployment runs in the background; poll the job until it finishes
+job_url = f"{STUDENT_API_URL.rsplit('/', 1)[0]}/jobs/{result['job_id']}"
+job = None
+for _ in range(60):
+    job = requests.get(job_url).json()
+    if job.get("status") in ("completed", "failed"):
+        break
+    print(f"  ... {job.get('stage')}")
+    time.sleep(10)
 
-if not repo_url_match or not pages_url_match:
-    print("Could not extract repo_url or pages_url from response.")
+if not job or job.get("status") != "completed":
+    print("Deployment did not complete:", job)
     exit(3)
 
-repo_url = repo_url_match.group(1)
-pages_url = pages_url_match.group(1)
-commit_sha = commit_sha_match.group(1) if commit_sha_match else "unknown"
+repo_url = job["result"]["repo_url"]
+pages_url = job["result"]["pages_url"]
+commit_sha = job["result"].get("commit_sha", "unknown")
 
 submission = {
     "email": task_data["email"],
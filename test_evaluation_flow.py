@@ -110,8 +110,8 @@ except Exception as e:
 # Step 3: Submit to student API
 print("\n[3/4] Submitting task to student API...")
 try:
-    resp = requests.post(STUDENT_API_URL, json=task_data, timeout=300)
-    if resp.status_code != 200:
+    resp = requests.post(STUDENT_API_URL, json=task_data, timeout=60)
+    if resp.status_code not in (200, 202):
         print(f"✗ Student API error: {resp.status_code}")
         print(resp.text)
         sys.exit(2)
@@ -120,19 +120,23 @@ try:
     print("✓ Task submitted successfully")
     print(f"  Status: {result['status']}")
     
-    # Extract deployment info
-    import re
-    msg = result.get("message", "")
-    repo_url_match = re.search(r"Repo: (https?://[\w./-]+)", msg)
-    pages_url_match = re.search(r"Pages: (https?://[\w./-]+)", msg)
+    # Deployment runs in the background; poll the job until it finishes
+    job_url = f"{STUDENT_API_URL.rsplit('/', 1)[0]}/jobs/{result['job_id']}"
+    job = None
+    for _ in range(60):
+        job = requests.get(job_url, timeout=30).json()
+        if job.get("status") in ("completed", "failed"):
+            break
+        print(f"  ... {job.get('stage')}")
+        time.sleep(10)
     
-    if not repo_url_match or not pages_url_match:
-        print("✗ Could not extract repo_url or pages_url from response")
-        print(f"  Message: {msg}")
+    if not job or job.get("status") != "completed":
+        print("✗ Deployment did not complete")
+        print(f"  Job: {job}")
         sys.exit(3)
     
-    repo_url = repo_url_match.group(1)
-    pages_url = pages_url_match.group(1)
+    repo_url = job["result"]["repo_url"]
+    pages_url = job["result"]["pages_url"]
     
     print(f"  Repo: {repo_url}")
     print(f"  Pages: {pages_url}")
@@ -0,0 +1,42 @@
+"""Shared test setup: an isolated SQLite database and offline settings.
+
+Settings are read from the environment when config is imported, so they are
+set here before any project module is loaded.
+"""
+import os
+import sys
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="llm-deploy-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_tmp}/test.db",
+    "TRACE_FILE": f"{_tmp}/traces.jsonl",
+    "TRACING_ENABLED": "false",
+    "LLM_API_PROVIDER": "openai",
+    "LLM_API_KEY": "test-key",
+    "LLM_MODEL": "test-model",
+    "LLM_FALLBACK_PROVIDERS": "",
+    "LLM_RATE_LIMITS": "",
+    "GITHUB_TOKEN": "test-token",
+    "GITHUB_USERNAME": "test-user",
+    "TEMPLATE_REUSE_ENABLED": "false",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from database.db import init_db
+
+init_db()
+
+
+@pytest.fixture
+def fresh_config(monkeypatch):
+    """Patch config attributes for one test: fresh_config(NAME=value, ...)."""
+    from config.config import config
+
+    def patch(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(config, name, value)
+        return config
+    return patch
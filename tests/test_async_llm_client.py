@@ -0,0 +1,77 @@
+"""AsyncLLMClient: concurrent calls over one pooled connection set per event loop."""
+import asyncio
+
+import httpx
+import pytest
+
+from utils.llm_client import AsyncLLMClient
+
+COMPLETION = {
+    "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "m",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "done"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+}
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """Route the client's pooled httpx client to a slow in-process provider."""
+    state = {"pools": [], "in_flight": 0, "peak": 0, "cancelled": 0}
+    real_client = httpx.AsyncClient
+
+    async def handle(request):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            await asyncio.sleep(0.2)
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        finally:
+            state["in_flight"] -= 1
+        return httpx.Response(200, json=COMPLETION)
+
+    class ProviderPool(real_client):
+        def __init__(self, **kwargs):
+            state["pools"].append(kwargs["limits"])
+            super().__init__(transport=httpx.MockTransport(handle), timeout=kwargs.get("timeout"))
+
+    monkeypatch.setattr(httpx, "AsyncClient", ProviderPool)
+    return state
+
+
+def test_concurrent_calls_share_one_pool(provider, fresh_config):
+    fresh_config(LLM_MAX_CONNECTIONS=32)
+    client = AsyncLLMClient("openai", "m", "test-key", fallbacks=[])
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        answers = await asyncio.gather(*(client.generate_code(f"prompt {n}") for n in range(20)))
+        return answers, loop.time() - started
+
+    answers, seconds = asyncio.run(run())
+    assert answers == ["done"] * 20
+    assert provider["peak"] == 20 and seconds < 1.5  # all in flight at once, not 20 x 0.2s
+    assert len(provider["pools"]) == 1 and provider["pools"][0].max_connections == 32
+
+
+def test_each_event_loop_gets_its_own_pool(provider):
+    client = AsyncLLMClient("openai", "m", "test-key", fallbacks=[])
+    for _ in range(2):
+        assert asyncio.run(client.generate_code("prompt")) == "done"
+    assert len(provider["pools"]) == 2
+
+
+def test_cancelling_the_caller_aborts_the_request(provider):
+    client = AsyncLLMClient("openai", "m", "test-key", fallbacks=[])
+
+    async def run():
+        call = asyncio.create_task(client.generate_code("prompt"))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+    asyncio.run(run())
+    assert provider["cancelled"] == 1 and provider["in_flight"] == 0
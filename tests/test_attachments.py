@@ -0,0 +1,71 @@
+"""Attachments deployed as files, their prompt descriptions and the app prompt."""
+import base64
+
+from utils import attachments
+from utils.llm_client import LLMClient
+
+CSV = "name,score\nada,3\nbob,5\ncy,1\ndee,4\n"
+CSV_URI = "data:text/csv;base64," + base64.b64encode(CSV.encode()).decode()
+
+
+def test_decode_data_uri():
+    assert attachments.decode_data_uri(CSV_URI) == ("text/csv", CSV.encode())
+    assert attachments.decode_data_uri("data:,a%20b") == ("text/plain", b"a b")
+    assert attachments.decode_data_uri("https://example.com/data.csv") is None
+
+
+def test_as_files_keeps_only_safe_data_uri_attachments(fresh_config):
+    fresh_config(ATTACHMENTS_AS_FILES=True)
+    files = attachments.as_files([
+        {"name": "data.csv", "url": CSV_URI},
+        {"name": "index.html", "url": CSV_URI},  # reserved name
+        {"name": "../evil.csv", "url": CSV_URI},  # path
+        {"name": ".env", "url": CSV_URI},  # hidden file
+        {"name": "remote.csv", "url": "https://example.com/remote.csv"},
+    ])
+    assert files == {"data.csv": CSV.encode()}
+
+
+def test_as_files_disabled(fresh_config):
+    fresh_config(ATTACHMENTS_AS_FILES=False)
+    assert attachments.as_files([{"name": "data.csv", "url": CSV_URI}]) == {}
+
+
+def test_describe_csv_with_and_without_sample():
+    text = attachments.describe("data.csv", CSV_URI)
+    assert "fetch('data.csv')" in text
+    assert "columns: name, score" in text
+    assert "4 data rows" in text
+    assert "ada,3" in text and "dee,4" not in text  # header + SAMPLE_ROWS rows
+
+    schema_only = attachments.describe("data.csv", CSV_URI, sample=False)
+    assert "columns: name, score" in schema_only
+    assert "ada" not in schema_only
+
+
+def test_describe_json_schema():
+    uri = "data:application/json," + '{"items": [{"id": 1}], "meta": {"total": 2, "next": null}, "ok": true}'
+    text = attachments.describe("data.json", uri, sample=False)
+    assert ('JSON schema: {"items": ["object"], "meta": {"total": "number", "next": "null"}, '
+            '"ok": "boolean"}') in text
+
+
+def test_app_prompt_loads_deployed_files_with_fetch(fresh_config):
+    fresh_config(ATTACHMENTS_AS_FILES=True)
+    client = LLMClient()
+    system_prompt, prompt = client._build_app_prompt("Chart scores", ["js: true"],
+                                                     [{"name": "data.csv", "url": CSV_URI}])
+    assert "fetch('data.csv')" in system_prompt
+    assert "atob(" not in system_prompt and "data URI" not in system_prompt
+    assert CSV_URI not in prompt
+    assert "fetch('data.csv')" in prompt
+
+
+def test_app_prompt_keeps_data_uri_guidance_for_inline_attachments(fresh_config):
+    fresh_config(ATTACHMENTS_AS_FILES=False)
+    client = LLMClient()
+    system_prompt, prompt = client._build_app_prompt("Chart scores", [], [{"name": "data.csv", "url": CSV_URI}])
+    assert CSV_URI in prompt
+    assert "atob(dataUri.split(',')[1])" in prompt
+    # The system prompt stays the same for every task (prompt caching)
+    assert system_prompt == client._build_app_prompt("Other", [], [])[0]
@@ -0,0 +1,123 @@
+"""Callback outbox: delivery bookkeeping, backoff and permanent failures."""
+import asyncio
+from datetime import datetime
+
+import httpx
+
+from database.db import get_db
+from database.models import CallbackOutbox as OutboxRow
+from utils import deployment_pipeline
+from utils.callback_outbox import CallbackOutbox
+from utils.deployment_pipeline import DeploymentJob, DeploymentPipeline
+
+
+def _row(outbox_id):
+    with get_db() as db:
+        row = db.query(OutboxRow).filter(OutboxRow.id == outbox_id).first()
+        return {"status": row.status, "attempts": row.attempts, "next_attempt_at": row.next_attempt_at,
+                "last_error": row.last_error}
+
+
+def _deliver_once(outbox, url, handler):
+    async def run():
+        outbox._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        outbox._wakeup = asyncio.Event()
+        outbox_id = outbox._insert(url, {"nonce": "n"}, None)
+        item = outbox._due(100)
+        item = next(i for i in item if i["id"] == outbox_id)
+        await outbox._deliver(item)
+        await outbox._client.aclose()
+        return outbox_id
+    return asyncio.run(run())
+
+
+def test_delivered_callback_is_recorded():
+    outbox = CallbackOutbox()
+    outbox_id = _deliver_once(outbox, "http://eval.test/ok", lambda request: httpx.Response(200))
+    assert _row(outbox_id)["status"] == "delivered"
+    assert outbox.delivered == 1
+
+
+def test_invalid_url_fails_permanently_without_request(fresh_config):
+    fresh_config(CALLBACK_MAX_ATTEMPTS=8)
+    requests = []
+    outbox = CallbackOutbox()
+    for url in ("http://[::1/x", "http://localhost:99999/x", "ftp://eval.test/x"):
+        outbox_id = _deliver_once(outbox, url, lambda request: requests.append(request) or httpx.Response(200))
+        row = _row(outbox_id)
+        assert row["status"] == "failed"
+        assert row["attempts"] == 1
+        assert "Invalid callback URL" in row["last_error"]
+    assert requests == []
+
+
+def test_unexpected_transport_error_is_backed_off_then_fails(fresh_config):
+    fresh_config(CALLBACK_MAX_ATTEMPTS=2, CALLBACK_BACKOFF_BASE=30, CALLBACK_BACKOFF_MAX=300)
+
+    def handler(request):
+        raise RuntimeError("boom from the transport")
+
+    outbox = CallbackOutbox()
+    outbox_id = _deliver_once(outbox, "http://eval.test/unreachable", handler)
+    row = _row(outbox_id)
+    assert row["status"] == "pending"
+    assert row["attempts"] == 1
+    assert "boom" in row["last_error"]
+    assert (row["next_attempt_at"] - datetime.utcnow()).total_seconds() > 10
+
+    async def retry():
+        outbox._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        outbox._wakeup = asyncio.Event()
+        with get_db() as db:
+            db.query(OutboxRow).filter(OutboxRow.id == outbox_id).update({"next_attempt_at": datetime.utcnow()})
+        item = next(i for i in outbox._due(100) if i["id"] == outbox_id)
+        await outbox._deliver(item)
+        await outbox._client.aclose()
+    asyncio.run(retry())
+    row = _row(outbox_id)
+    assert row["status"] == "failed"
+    assert row["attempts"] == 2
+
+
+def test_worker_does_not_spin_on_unreachable_url(fresh_config):
+    fresh_config(CALLBACK_BACKOFF_BASE=60, CALLBACK_POLL_INTERVAL=0.05, CALLBACK_MAX_ATTEMPTS=8)
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        raise RuntimeError("unhandled errors in a TaskGroup")
+
+    async def run():
+        outbox = CallbackOutbox()
+        outbox.start()
+        await outbox._client.aclose()
+        outbox._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        outbox_id = await outbox.enqueue("http://127.0.0.1:9/unreachable", {"nonce": "n"})
+        await asyncio.sleep(0.5)
+        await outbox.stop()
+        return outbox_id
+
+    outbox_id = asyncio.run(run())
+    assert len(attempts) == 1
+    assert _row(outbox_id)["status"] == "pending"
+
+
+def test_rerun_callback_stage_reuses_the_outbox_row(monkeypatch):
+    outbox = CallbackOutbox()
+    monkeypatch.setattr(outbox, "start", lambda: setattr(outbox, "_wakeup", asyncio.Event()))
+    monkeypatch.setattr(deployment_pipeline, "callback_outbox", outbox)
+    job = DeploymentJob({"email": "s@example.com", "task": "t", "round": 1, "nonce": "resumed-nonce",
+                         "evaluation_url": "http://eval.test/cb"})
+    job.result = {"repo_url": "https://github.com/u/r", "commit_sha": "abc", "pages_url": "https://u.github.io/r/"}
+
+    async def run_callback_stage():
+        await DeploymentPipeline()._callback(job)
+        return job.result["callback_id"]
+
+    first = asyncio.run(run_callback_stage())
+    assert asyncio.run(run_callback_stage()) == first  # e.g. resumed after a crash before the stage was saved
+    with get_db() as db:
+        assert db.query(OutboxRow).filter(OutboxRow.job_id == job.id).count() == 1
+
+    job.result["commit_sha"] = "def"  # a retried deployment with a new commit is a new callback
+    assert asyncio.run(run_callback_stage()) != first
@@ -0,0 +1,95 @@
+"""SEARCH/REPLACE edits used by revisions and preflight repairs."""
+import asyncio
+
+import pytest
+
+from utils.llm_client import AsyncLLMClient, LLMClient, apply_edits, parse_edits
+
+HTML = """<html>
+  <body>
+    <h1 id="title">Counter</h1>
+    <button id="inc">+</button>
+  </body>
+</html>"""
+
+RESPONSE = """Fixing the title.
+[EDIT: index.html]
+<<<<<<< SEARCH
+    <h1 id="title">Counter</h1>
+=======
+    <h1 id="title">Click counter</h1>
+>>>>>>> REPLACE
+
+[EDIT: README.md]
+<<<<<<< SEARCH
+# App
+=======
+# Click counter
+>>>>>>> REPLACE
+"""
+
+
+def test_parse_edits():
+    assert parse_edits(RESPONSE) == [
+        ("index.html", '    <h1 id="title">Counter</h1>', '    <h1 id="title">Click counter</h1>'),
+        ("README.md", "# App", "# Click counter"),
+    ]
+
+
+def test_apply_edits_returns_only_changed_files():
+    files = {"index.html": HTML, "README.md": "# App\n", "LICENSE": "MIT"}
+    changed = apply_edits(files, parse_edits(RESPONSE))
+    assert set(changed) == {"index.html", "README.md"}
+    assert "Click counter</h1>" in changed["index.html"]
+    assert files["index.html"] == HTML  # inputs are not modified
+
+
+def test_apply_edits_tolerates_indentation_differences():
+    edits = [("index.html", '<button id="inc">+</button>', '    <button id="inc">Add</button>')]
+    assert apply_edits({"index.html": HTML}, edits)["index.html"].count('id="inc">Add<') == 1
+
+    reindented = [("index.html", '<h1 id="title">Counter</h1>\n<button id="inc">+</button>', "<p>new</p>")]
+    assert "<p>new</p>" in apply_edits({"index.html": HTML}, reindented)["index.html"]
+
+
+def test_later_edits_see_earlier_ones():
+    edits = [("index.html", "Counter", "Tally"), ("index.html", "Tally", "Score")]
+    assert '<h1 id="title">Score</h1>' in apply_edits({"index.html": HTML}, edits)["index.html"]
+
+
+@pytest.mark.parametrize("edit, message", [
+    (("index.html", "<nope>", "x"), "not found"),
+    (("index.html", "id=", "x"), "matches 2 places"),
+    (("index.html", "  \n", "x"), "Empty SEARCH"),
+    (("app.js", "x", "y"), "unknown file"),
+])
+def test_apply_edits_rejects_ambiguous_or_missing_search(edit, message):
+    with pytest.raises(ValueError, match=message):
+        apply_edits({"index.html": HTML}, [edit])
+
+
+def test_repair_only_applies_index_html_edits():
+    changed = LLMClient._apply_repair(RESPONSE, {"index.html": HTML, "README.md": "# App"})
+    assert list(changed) == ["index.html"]
+    with pytest.raises(ValueError, match="no applicable edits"):
+        LLMClient._apply_repair("[EDIT: README.md]\n<<<<<<< SEARCH\n# App\n=======\n# B\n>>>>>>> REPLACE",
+                                {"index.html": HTML, "README.md": "# App"})
+
+
+def test_repair_prompt_carries_only_index_html_and_the_failures():
+    client = AsyncLLMClient("openai", "m", "test-key", fallbacks=[])
+    prompts = []
+
+    async def generate_code(prompt, system_prompt=None):
+        prompts.append(prompt)
+        return RESPONSE
+    client.generate_code = generate_code
+    files = {"index.html": HTML, "README.md": "# App\n" + "setup " * 500, "data.csv": "a,b\n" * 1000}
+    failures = [{"check": "document.title.includes('Click')", "result": "false"}]
+
+    repaired = asyncio.run(client.generate_repair("Build a counter", failures, files, ["TypeError: x is null"]))
+    assert repaired == {"index.html": HTML.replace(">Counter<", ">Click counter<")}
+    prompt = prompts[0]
+    assert HTML in prompt and "document.title.includes('Click')" in prompt and "TypeError: x is null" in prompt
+    assert "setup setup" not in prompt and "a,b" not in prompt
+    assert len(prompt) < len(HTML) + 500
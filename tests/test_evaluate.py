@@ -0,0 +1,163 @@
+"""Evaluation checks that only need GitHub metadata, the task log or an LLM grader."""
+import asyncio
+import json
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from database.db import get_db
+from database.models import Repo, Task
+from scripts import evaluate
+from scripts.evaluate import Evaluator, QualityGrader
+from utils.github_helper import github_helper
+
+SENT = datetime(2026, 3, 1, 12, 0)  # round-1 task, naive UTC like the tasks table
+
+
+def _task(email, round_num, sent_at, suffix):
+    return Task(timestamp=sent_at, email=email, task=f"sum-of-sales-{suffix}", round=round_num,
+                nonce=uuid.uuid4().hex, brief="b", checks=[], evaluation_url="http://eval.test",
+                endpoint="http://student.test", secret="s")
+
+
+@pytest.fixture
+def github_repo(monkeypatch):
+    """Serve one repository's metadata as PyGithub would (timezone-aware)."""
+    def serve(created_at, committed_at):
+        commit = SimpleNamespace(commit=SimpleNamespace(committer=SimpleNamespace(date=committed_at)))
+        gh_repo = SimpleNamespace(created_at=created_at, pushed_at=committed_at, get_commit=lambda sha: commit)
+        user = SimpleNamespace(get_repo=lambda name: gh_repo)
+        monkeypatch.setattr(github_helper, "gh", SimpleNamespace(get_user=lambda login=None: user))
+    return serve
+
+
+def _check_round2(record_round1=True):
+    email = f"{uuid.uuid4().hex[:8]}@example.com"
+    round2 = _task(email, 2, SENT + timedelta(days=2), "bbbb")
+    if record_round1:
+        with get_db() as db:
+            db.add(_task(email, 1, SENT, "aaaa"))
+    repo = Repo(email=email, task=round2.task, round=2, nonce=round2.nonce, commit_sha="abc1234def",
+                repo_url="https://github.com/test-user/sum-of-sales", pages_url="https://pages.test/")
+    return Evaluator().check_repo_created_after_task(repo, round2)
+
+
+def _at(moment, hours):
+    return (moment + timedelta(hours=hours)).replace(tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("created, committed, score", [
+    (1, 49, 1.0),    # round-1 repo revised after the round-2 task
+    (-1, 49, 0.0),   # repo predates the student's round-1 task
+    (1, 47, 0.0),    # last commit predates the round-2 task
+])
+def test_round2_may_revise_the_round1_repo_in_place(github_repo, created, committed, score):
+    github_repo(_at(SENT, created), _at(SENT, committed))
+    result = _check_round2()
+    assert result["score"] == score, result["reason"]
+
+
+def test_round2_without_a_round1_task_is_not_credited(github_repo):
+    github_repo(_at(SENT, 1), _at(SENT, 49))
+    result = _check_round2(record_round1=False)
+    assert result["score"] == 0.0
+
+
+def test_round1_compares_creation_time(github_repo):
+    github_repo(_at(SENT, 1), _at(SENT, 1))
+    task = _task("r1@example.com", 1, SENT, "aaaa")
+    repo = Repo(repo_url="https://github.com/test-user/x", commit_sha="abc")
+    assert Evaluator().check_repo_created_after_task(repo, task)["score"] == 1.0
+
+
+class RubricLLM:
+    """Grades each requested rubric key; `skip` ids are left out of batched answers."""
+
+    def __init__(self, skip=()):
+        self.skip = set(skip)
+        self.prompts = []
+
+    async def generate_code(self, prompt, system_prompt=None):
+        self.prompts.append(prompt)
+        keys = [key for key in ("readme", "code") if f"### {key}" in prompt]
+        grades = {key: {"score": 0.8 if key == "readme" else 0.6, "reason": f"graded {key}"} for key in keys}
+        ids = re.findall(r"## Submission (s\d+)", prompt)
+        if not ids:
+            return json.dumps(grades)
+        return "```json\n" + json.dumps({item: grades for item in ids if item not in self.skip}) + "\n```"
+
+
+def test_readme_and_code_are_graded_in_one_call(monkeypatch):
+    llm = RubricLLM()
+    monkeypatch.setattr(evaluate, "async_llm_client", llm)
+    contents = {"README.md": "# Sales\nSetup: open index.html", "index.html": "<script>sum()</script>"}
+    monkeypatch.setattr(github_helper, "get_file_content", lambda repo, path, ref=None: contents[path])
+    evaluator = Evaluator()
+    evaluator.grader = QualityGrader(token_budget=0)
+    repo = Repo(repo_url="https://github.com/test-user/sales", commit_sha="abc")
+
+    results = asyncio.run(evaluator.check_quality(repo))
+    assert [(r["check"], r["score"], r["reason"]) for r in results] == [
+        ("README.md quality", 0.8, "graded readme"),
+        ("Code quality", 0.6, "graded code"),
+    ]
+    assert len(llm.prompts) == 1
+    assert "Criteria for readme" in llm.prompts[0] and "Criteria for code" in llm.prompts[0]
+
+
+def test_missing_readme_is_scored_without_grading_it(monkeypatch):
+    llm = RubricLLM()
+    monkeypatch.setattr(evaluate, "async_llm_client", llm)
+    monkeypatch.setattr(github_helper, "get_file_content",
+                        lambda repo, path, ref=None: "<h1>app</h1>" if path == "index.html" else None)
+    evaluator = Evaluator()
+    evaluator.grader = QualityGrader(token_budget=0)
+    results = asyncio.run(evaluator.check_quality(Repo(repo_url="https://github.com/test-user/x", commit_sha="abc")))
+    assert {r["check"]: r["score"] for r in results} == {"README.md quality": 0.0, "Code quality": 0.6}
+    assert "### readme" not in llm.prompts[0]
+
+
+def _grade_all(grader, repos):
+    async def run():
+        return await asyncio.gather(*(grader.grade(contents) for contents in repos))
+    return asyncio.run(run())
+
+
+REPOS = [{"readme": f"# App {n}", "code": f"<h1>{n}</h1>"} for n in range(5)]
+
+
+def test_concurrent_repos_share_one_grading_request(monkeypatch):
+    llm = RubricLLM()
+    monkeypatch.setattr(evaluate, "async_llm_client", llm)
+    grader = QualityGrader(token_budget=10000, max_items=8, linger=0.05)
+    results = _grade_all(grader, REPOS)
+    assert all(scores == {"readme": {"score": 0.8, "reason": "graded readme"},
+                          "code": {"score": 0.6, "reason": "graded code"}} for scores, _ in results)
+    assert len(llm.prompts) == 1
+    assert re.findall(r"## Submission (s\d+)", llm.prompts[0]) == ["s1", "s2", "s3", "s4", "s5"]
+    assert grader.stats() == {"items": 5, "requests": 1, "reruns": 0}
+
+
+def test_batches_are_split_by_size_and_token_budget(monkeypatch):
+    llm = RubricLLM()
+    monkeypatch.setattr(evaluate, "async_llm_client", llm)
+    _grade_all(QualityGrader(token_budget=10000, max_items=2, linger=0.05), REPOS)
+    assert [len(re.findall("## Submission", p)) for p in llm.prompts] == [2, 2, 0]  # a lone leftover is graded alone
+
+    llm.prompts.clear()
+    one_repo = QualityGrader._estimate_tokens(REPOS[0])
+    _grade_all(QualityGrader(token_budget=one_repo * 3, max_items=8, linger=0.05), REPOS)
+    assert [len(re.findall("## Submission", p)) for p in llm.prompts] == [3, 2]
+
+
+def test_items_left_out_of_a_batch_answer_are_regraded_alone(monkeypatch):
+    llm = RubricLLM(skip={"s2"})
+    monkeypatch.setattr(evaluate, "async_llm_client", llm)
+    grader = QualityGrader(token_budget=10000, max_items=3, linger=5)
+    results = _grade_all(grader, REPOS[:3])
+    assert all(scores is not None for scores, _ in results)
+    assert "## Submission" not in llm.prompts[-1] and "# App 1" in llm.prompts[-1]
+    assert grader.stats() == {"items": 3, "requests": 2, "reruns": 1}
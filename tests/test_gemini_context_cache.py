@@ -0,0 +1,51 @@
+"""Gemini explicit context caching from the async client."""
+import asyncio
+import time
+
+from utils import llm_client as llm_client_module
+from utils.llm_client import AsyncLLMClient
+
+
+def test_async_cache_create_is_shared_and_off_the_event_loop(monkeypatch, fresh_config):
+    fresh_config(LLM_PROMPT_CACHING=True, LLM_GEMINI_CACHE_MIN_TOKENS=1, LLM_GEMINI_CACHE_TTL=3600)
+    monkeypatch.setattr(llm_client_module, "_gemini_caches", {})
+    monkeypatch.setattr(llm_client_module, "_gemini_cache_flights", {})
+    client = AsyncLLMClient("gemini", "gemini-test", "test-key", fallbacks=[])
+    creates = []
+
+    def create(system_prompt):
+        # Stands in for the blocking CachedContent.create round trip
+        creates.append(system_prompt)
+        time.sleep(0.3)
+        cached = f"cache-{len(creates)}"
+        llm_client_module._gemini_caches[client._gemini_cache_key(system_prompt)] = (cached, time.time() + 60)
+        return cached
+    monkeypatch.setattr(client, "_gemini_cached_content", create)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(client._gemini_cached_content_async("system prompt") for _ in range(5)))
+        again = await client._gemini_cached_content_async("system prompt")
+        ticking.cancel()
+        return results, again, ticks
+
+    results, again, ticks = asyncio.run(run())
+    assert results == ["cache-1"] * 5
+    assert again == "cache-1"
+    assert creates == ["system prompt"]
+    assert ticks >= 10  # the loop kept running during the create
+    assert llm_client_module._gemini_cache_flights == {}
+
+
+def test_short_system_prompt_is_not_cached_explicitly(fresh_config):
+    fresh_config(LLM_PROMPT_CACHING=True, LLM_GEMINI_CACHE_MIN_TOKENS=32768)
+    client = AsyncLLMClient("gemini", "gemini-test", "test-key", fallbacks=[])
+    assert asyncio.run(client._gemini_cached_content_async("short")) is None
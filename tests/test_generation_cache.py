@@ -0,0 +1,118 @@
+"""Generation cache: single-flight for identical requests, storage and eviction."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.generation_cache import GenerationCache
+
+FILES = {"index.html": "<h1>app</h1>", "README.md": "readme"}
+
+
+@pytest.fixture
+def cache():
+    cache = GenerationCache(max_entries=3, max_bytes=10_000)
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def test_async_identical_requests_share_one_generation(cache):
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return dict(FILES), True
+
+    async def run():
+        results = await asyncio.gather(*(cache.aget_or_generate("k", generate) for _ in range(5)))
+        again = await cache.aget_or_generate("k", generate)
+        return results, again
+
+    results, again = asyncio.run(run())
+    assert len(calls) == 1
+    assert sorted(source for _, source in results) == ["collapsed"] * 4 + ["miss"]
+    assert all(files == FILES for files, _ in results)
+    assert again == (FILES, "hit")
+    assert cache.collapsed == 4
+
+
+def test_async_failure_reaches_waiters_and_is_not_cached(cache):
+    async def generate():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("LLM down")
+
+    async def run():
+        return await asyncio.gather(*(cache.aget_or_generate("k", generate) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cache.get("k") is None
+    assert cache._async_flights == {}
+
+
+def test_cancelled_leader_fails_waiters_instead_of_hanging(cache):
+    async def generate():
+        await asyncio.sleep(10)
+        return dict(FILES), True
+
+    async def run():
+        leader = asyncio.create_task(cache.aget_or_generate("k", generate))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.aget_or_generate("k", generate))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.wait_for(asyncio.gather(waiter, return_exceptions=True), 1)
+
+    (result,) = asyncio.run(run())
+    assert "cancelled" in str(result)
+
+
+def test_degraded_results_are_returned_but_not_stored(cache):
+    files, source = asyncio.run(cache.aget_or_generate("k", _async_result(FILES, cacheable=False)))
+    assert (files, source) == (FILES, "miss")
+    assert cache.get("k") is None
+
+
+def test_sync_identical_requests_share_one_generation(cache):
+    calls = []
+    results = []
+
+    def generate():
+        calls.append(1)
+        time.sleep(0.2)
+        return dict(FILES), True
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_generate("k", generate)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(source for _, source in results) == ["collapsed"] * 3 + ["miss"]
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    for key in ("a", "b", "c"):
+        cache.put(key, FILES)
+        time.sleep(0.01)
+    cache.get("a")  # a is now more recent than b
+    cache.put("d", FILES)
+    assert cache.get("b") is None
+    assert all(cache.get(key) == FILES for key in ("a", "c", "d"))
+
+
+def test_make_key_ignores_input_order():
+    assert GenerationCache.make_key("openai", "m", prompt="p", system_prompt="s") == \
+        GenerationCache.make_key("openai", "m", system_prompt="s", prompt="p")
+    assert GenerationCache.make_key("openai", "m", prompt="p") != GenerationCache.make_key("openai", "m2", prompt="p")
+
+
+def _async_result(files, cacheable):
+    async def generate():
+        return dict(files), cacheable
+    return generate
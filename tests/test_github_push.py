@@ -0,0 +1,129 @@
+"""Pushing generated sites: the Git Data API path and the git path."""
+import pytest
+from git import Repo as GitRepo
+
+from utils.github_helper import GitHubHelper
+
+FILES = {"index.html": "<h1>app</h1>", "my data.csv": b"a,b\n1,2\n"}
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+
+    def json(self):
+        return self._payload
+
+
+class FakeGitHubAPI:
+    """Records _api_request calls and answers like the Git Data API."""
+
+    def __init__(self, main_sha=None):
+        self.main_sha = main_sha
+        self.calls = []
+
+    def __call__(self, method, path, ok_statuses=(200, 201), **kwargs):
+        body = kwargs.get("json")
+        self.calls.append((method, path, body))
+        if method == "GET" and path.endswith("/git/ref/heads/main"):
+            return FakeResponse(200, {"object": {"sha": self.main_sha}}) if self.main_sha else FakeResponse(409)
+        if method == "PATCH" and path.endswith("/refs/heads/gh-pages"):
+            return FakeResponse(422)  # no gh-pages branch yet
+        if method == "PATCH":
+            return FakeResponse(200, {"object": {"sha": body["sha"]}})
+        if method == "POST" and path.endswith("/git/commits"):
+            return FakeResponse(201, {"sha": "commit-sha"})
+        return FakeResponse(201, {"sha": f"{path.rsplit('/', 1)[-1]}-sha"})
+
+
+@pytest.fixture
+def helper(monkeypatch):
+    helper = GitHubHelper()
+    helper.username = "test-user"
+    monkeypatch.setattr(helper, "_ensure_client", lambda: None)
+    return helper
+
+
+def _api_push(monkeypatch, helper, api, files=FILES, **kwargs):
+    monkeypatch.setattr(helper, "_api_request", api)
+    return helper.push_files_api("site", files, also_gh_pages=True, **kwargs)
+
+
+def test_api_push_seeds_an_empty_repo_then_commits_once(monkeypatch, helper):
+    api = FakeGitHubAPI()
+    assert _api_push(monkeypatch, helper, api) == "commit-sha"
+    git = "/repos/test-user/site/git"
+    assert [(method, path) for method, path, _ in api.calls] == [
+        ("GET", f"{git}/ref/heads/main"),
+        ("PUT", "/repos/test-user/site/contents/index.html"),
+        ("POST", f"{git}/blobs"),  # binary files only; text goes inline in the tree
+        ("POST", f"{git}/trees"),
+        ("POST", f"{git}/commits"),
+        ("PATCH", f"{git}/refs/heads/main"),
+        ("PATCH", f"{git}/refs/heads/gh-pages"),
+        ("POST", f"{git}/refs"),
+    ]
+    bodies = {path.rsplit("/", 1)[-1]: body for _, path, body in api.calls}
+    assert bodies["trees"]["tree"] == [
+        {"path": "index.html", "mode": "100644", "type": "blob", "content": "<h1>app</h1>"},
+        {"path": "my data.csv", "mode": "100644", "type": "blob", "sha": "blobs-sha"},
+    ]
+    assert bodies["commits"]["parents"] == []  # replaces the seed commit
+    assert bodies["refs"] == {"ref": "refs/heads/gh-pages", "sha": "commit-sha"}
+
+
+def test_api_push_quotes_the_seed_path(monkeypatch, helper):
+    api = FakeGitHubAPI()
+    _api_push(monkeypatch, helper, api, files={"a b#1?.csv": "x"})
+    assert api.calls[1][:2] == ("PUT", "/repos/test-user/site/contents/a%20b%231%3F.csv")
+
+
+def test_api_push_keeps_an_existing_main_unless_replacing(monkeypatch, helper):
+    api = FakeGitHubAPI(main_sha="old-main")
+    _api_push(monkeypatch, helper, api)
+    assert not any(method == "PUT" for method, _, _ in api.calls)
+    assert [body for _, path, body in api.calls if path.endswith("/commits")][0]["parents"] == ["old-main"]
+
+    pooled = FakeGitHubAPI(main_sha="placeholder")
+    _api_push(monkeypatch, helper, pooled, replace_main=True)
+    assert [body for _, path, body in pooled.calls if path.endswith("/commits")][0]["parents"] == []
+
+
+def test_api_push_without_files_fails_clearly(monkeypatch, helper):
+    with pytest.raises(Exception, match="No files to push"):
+        _api_push(monkeypatch, helper, FakeGitHubAPI(), files={})
+
+
+@pytest.fixture
+def local_remote(tmp_path, monkeypatch, helper):
+    """Point the git path at a local bare repository."""
+    remote = tmp_path / "site.git"
+    GitRepo.init(remote, bare=True)
+    monkeypatch.setattr(helper, "_remote_url", lambda repo_name: str(remote))
+    return GitRepo(remote)
+
+
+def test_git_push_to_an_empty_repo(helper, local_remote):
+    sha = helper.push_files_git("site", FILES, also_gh_pages=True)
+    main = local_remote.commit("main")
+    assert main.hexsha == sha and main.parents == ()
+    assert local_remote.commit("gh-pages").hexsha == sha
+    assert (main.tree / "my data.csv").data_stream.read() == b"a,b\n1,2\n"
+
+
+def test_git_push_never_overwrites_an_existing_main(helper, local_remote):
+    first = helper.push_files_git("site", {"index.html": "v1", "notes.txt": "keep history"})
+    second = helper.push_files_git("site", {"index.html": "v2"})
+    main = local_remote.commit("main")
+    assert main.hexsha == second
+    assert [parent.hexsha for parent in main.parents] == [first]
+    assert [blob.path for blob in main.tree.blobs] == ["index.html"]
+
+
+def test_git_push_replaces_a_pooled_placeholder_main(helper, local_remote):
+    placeholder = helper.push_files_git("site", {"README.md": "pool placeholder"})
+    sha = helper.push_files_git("site", {"index.html": "app"}, replace_main=True)
+    main = local_remote.commit("main")
+    assert main.hexsha == sha and main.parents == ()
+    assert placeholder != sha
@@ -0,0 +1,30 @@
+"""Cold start: heavy SDKs stay unimported until they are first used."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from scripts.benchmark_startup import DEFERRED, ROOT
+
+
+def _loaded_after(statement):
+    code = f"import sys; {statement}; print(' '.join(sorted(sys.modules)))"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=dict(os.environ),
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    modules = set(proc.stdout.split())
+    return {name for name in DEFERRED if name in modules}
+
+
+@pytest.mark.parametrize("statement", [
+    "import app",
+    "import scripts.evaluate",
+    "from utils.llm_client import LLMClient, async_llm_client; LLMClient()",
+])
+def test_import_loads_no_deferred_dependency(statement):
+    assert _loaded_after(statement) == set()
+
+
+def test_first_use_imports_the_sdk():
+    assert _loaded_after("from utils.llm_client import LLMClient; LLMClient()._get_client()") == {"openai"}
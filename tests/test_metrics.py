@@ -0,0 +1,49 @@
+"""GET /metrics serves the Prometheus text exposition of recorded metrics."""
+import asyncio
+
+import httpx
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+from app import app
+from utils import metrics
+
+
+def _scrape():
+    async def get():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app.test") as client:
+            return await client.get("/metrics")
+    response = asyncio.run(get())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=")
+    samples = {}
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            samples[(sample.name, tuple(sorted(sample.labels.items())))] = sample.value
+    return samples
+
+
+def test_stage_latency_is_exposed_as_a_histogram_per_outcome():
+    with metrics.timed(metrics.PIPELINE_STAGE_SECONDS, stage="metrics-test"):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.timed(metrics.PIPELINE_STAGE_SECONDS, stage="metrics-test"):
+            raise RuntimeError("push failed")
+
+    samples = _scrape()
+    for outcome in ("ok", "error"):
+        labels = (("outcome", outcome), ("stage", "metrics-test"))
+        assert samples[("deployment_stage_seconds_count", labels)] == 1
+        assert samples[("deployment_stage_seconds_bucket", (("le", "0.1"),) + labels)] == 1
+        assert samples[("deployment_stage_seconds_bucket", (("le", "+Inf"),) + labels)] == 1
+
+
+def test_github_rate_limit_headers_update_the_gauges():
+    metrics.record_rate_limit({"X-RateLimit-Remaining": "4321", "X-RateLimit-Reset": "1800000000",
+                               "X-RateLimit-Resource": "graphql"})
+    metrics.record_rate_limit({})  # responses without rate-limit headers leave the gauges alone
+
+    samples = _scrape()
+    assert samples[("github_rate_limit_remaining", (("resource", "graphql"),))] == 4321
+    assert samples[("github_rate_limit_reset_timestamp", (("resource", "graphql"),))] == 1800000000
@@ -0,0 +1,94 @@
+"""One shared poller resolves Pages readiness for every waiting deployment."""
+import asyncio
+from collections import Counter
+
+import httpx
+import pytest
+
+from utils.pages_watcher import PagesWatcher
+
+
+class FakePages:
+    """GitHub's Pages build API plus the sites it publishes.
+
+    A repo's build is missing until triggered, then reported as building for
+    `builds_needed` polls before it is built for `commit`.
+    """
+
+    def __init__(self, builds_needed=2, commit="new"):
+        self.builds_needed = builds_needed
+        self.commit = commit
+        self.triggered = set()
+        self.polls = Counter()
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append((request.method, request.url.path))
+        if request.url.host != "api.github.com":
+            repo = request.url.path.strip("/")
+            built = self.polls[repo] > self.builds_needed
+            return httpx.Response(200 if built else 404)
+        repo = request.url.path.split("/")[3]
+        if request.method == "POST":
+            self.triggered.add(repo)
+            return httpx.Response(201)
+        if repo not in self.triggered:
+            return httpx.Response(404)
+        self.polls[repo] += 1
+        status = "built" if self.polls[repo] > self.builds_needed else "building"
+        return httpx.Response(200, json={"status": status, "commit": self.commit})
+
+
+@pytest.fixture
+def watch(fresh_config):
+    fresh_config(PAGES_EXPECTED_BUILD_SECONDS=0.05, PAGES_POLL_MIN_INTERVAL=0.01, PAGES_POLL_MAX_INTERVAL=0.05)
+
+    def run(pages, waits):
+        async def main():
+            watcher = PagesWatcher()
+            watcher.start()
+            await watcher._client.aclose()
+            watcher._client = httpx.AsyncClient(transport=httpx.MockTransport(pages))
+            try:
+                results = await asyncio.gather(*(watcher.wait(**kwargs) for kwargs in waits))
+            finally:
+                await watcher.stop()
+            return watcher, results
+        return asyncio.run(main())
+    return run
+
+
+def _site(repo, **kwargs):
+    return {"repo_name": repo, "pages_url": f"https://test-user.github.io/{repo}/", **kwargs}
+
+
+def test_all_deployments_are_served_by_one_poller(watch):
+    pages = FakePages()
+    repos = [f"app-{n}" for n in range(5)]
+    watcher, results = watch(pages, [_site(repo, timeout=5) for repo in repos] + [_site("app-0", timeout=5)])
+    assert results == [True] * 6
+    assert pages.triggered == set(repos)  # missing builds are requested once per site
+    assert watcher.stats()["ready"] == 5  # the duplicate wait shared app-0's entry
+    assert watcher.stats()["pending"] == 0 and watcher.stats()["history_size"] == 5
+    # The public URL is only fetched once the build is reported as built
+    for repo in repos:
+        site_gets = [i for i, request in enumerate(pages.requests) if request == ("GET", f"/{repo}/")]
+        build_polls = [i for i, (method, path) in enumerate(pages.requests)
+                       if method == "GET" and path.endswith(f"/{repo}/pages/builds/latest")]
+        assert site_gets and min(site_gets) > build_polls[pages.builds_needed]
+
+
+def test_revision_waits_for_the_build_of_its_commit(watch):
+    pages = FakePages(builds_needed=0, commit="old")
+    pages.triggered.add("app")
+    watcher, results = watch(pages, [_site("app", timeout=0.3, commit_sha="new")])
+    assert results == [False]
+    assert not any(path == "/app/" for _, path in pages.requests)  # the old build never counted
+    assert watcher.stats()["timed_out"] == 1
+
+
+def test_site_never_built_times_out(watch):
+    pages = FakePages(builds_needed=10 ** 6)
+    watcher, results = watch(pages, [_site("slow", timeout=0.3)])
+    assert results == [False]
+    assert 1 < watcher.stats()["polls"] < 60  # polled repeatedly, but backing off
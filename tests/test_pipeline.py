@@ -0,0 +1,202 @@
+"""Deployment pipeline: idempotent submissions and resuming after a restart."""
+import asyncio
+import uuid
+
+import pytest
+
+from utils import deployment_pipeline
+from utils.deployment_pipeline import DeploymentJob, DeploymentPipeline
+
+STAGES = ["generate", "preflight", "create_repo", "push", "pages", "callback"]
+
+
+class FakeOutbox:
+    def add_listener(self, listener):
+        pass
+
+    def start(self):
+        pass
+
+
+@pytest.fixture
+def make_pipeline(monkeypatch):
+    monkeypatch.setattr(deployment_pipeline, "callback_outbox", FakeOutbox())
+
+    def make(ran, fail_at=None):
+        pipeline = DeploymentPipeline()
+        for stage in pipeline.stages:
+            async def handler(job, name=stage.name):
+                ran.append((job.request["nonce"], name))
+                await asyncio.sleep(0.01)
+                if name == fail_at:
+                    raise RuntimeError(f"{name} broke")
+            stage.handler = handler
+        return pipeline
+    return make
+
+
+def _request(nonce=None):
+    return {"email": "s@example.com", "task": "demo-task", "round": 1, "nonce": nonce or uuid.uuid4().hex,
+            "brief": "b", "checks": [], "evaluation_url": "http://eval.test/cb"}
+
+
+async def _finished(pipeline, job, timeout=5):
+    """Wait until the job has finished and its final state is persisted."""
+    for _ in range(int(timeout / 0.01)):
+        if job.finished_at:
+            row = await asyncio.to_thread(pipeline._load_by_job_id, job.id)
+            if row.status == job.status:
+                return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job still {job.status} in {job.stage}")
+
+
+def test_duplicate_requests_share_one_deployment(make_pipeline):
+    ran = []
+    request = _request()
+
+    async def run():
+        pipeline = make_pipeline(ran)
+        submitted = await asyncio.gather(*(pipeline.submit(dict(request)) for _ in range(3)))
+        job = submitted[0][0]
+        await _finished(pipeline, job)
+        again = await pipeline.submit(dict(request))
+        await pipeline.stop()
+        return job, submitted, again
+
+    job, submitted, again = asyncio.run(run())
+    assert job.status == "completed"
+    assert all(other is job for other, _ in submitted)
+    assert sorted(created for _, created in submitted) == [False, False, True]
+    assert again == (job, False)
+    assert [stage for _, stage in ran] == STAGES
+
+
+def test_completed_deployment_is_found_after_restart(make_pipeline):
+    ran = []
+    request = _request()
+
+    async def run():
+        first = make_pipeline(ran)
+        job, _ = await first.submit(dict(request))
+        await _finished(first, job)
+        await first.stop()
+        restarted = make_pipeline(ran)
+        existing, created = await restarted.submit(dict(request))
+        await restarted.stop()
+        return job, existing, created
+
+    job, existing, created = asyncio.run(run())
+    assert not created
+    assert existing.id == job.id and existing.status == "completed"
+    assert len(ran) == len(STAGES)
+
+
+def test_failed_deployment_can_be_retried(make_pipeline):
+    ran = []
+    request = _request()
+
+    async def run():
+        failing = make_pipeline(ran, fail_at="push")
+        job, _ = await failing.submit(dict(request))
+        await _finished(failing, job)
+        await failing.stop()
+        working = make_pipeline(ran)
+        retry, created = await working.submit(dict(request))
+        await _finished(working, retry)
+        await working.stop()
+        return job, retry, created
+
+    job, retry, created = asyncio.run(run())
+    assert job.status == "failed" and job.error == "push: push broke"
+    assert created and retry.id == job.id  # the failed deployment's row is reused
+    assert retry.status == "completed"
+
+
+def test_unfinished_deployment_resumes_after_its_last_completed_stage(make_pipeline):
+    ran = []
+    request = _request()
+
+    async def run():
+        pipeline = make_pipeline(ran)
+        job = DeploymentJob(request)
+        job.status, job.stage = "running", "create_repo"
+        job.completed_stages = ["generate", "preflight"]
+        job.files = {"index.html": "<h1>app</h1>"}
+        await asyncio.to_thread(pipeline._save, job)
+
+        await pipeline.resume()
+        await pipeline.resume()  # idempotent
+        resumed = pipeline.get_job(job.id)
+        await _finished(pipeline, resumed)
+        await pipeline.stop()
+        return resumed
+
+    resumed = asyncio.run(run())
+    assert resumed.status == "completed"
+    assert resumed.files == {"index.html": "<h1>app</h1>"}
+    assert [stage for nonce, stage in ran if nonce == request["nonce"]] == STAGES[2:]
+    assert resumed.completed_stages == STAGES
+
+
+def _gated_handler(active, peaks, name, seconds):
+    async def handler(job):
+        active[name] = active.get(name, 0) + 1
+        peaks[name] = max(peaks.get(name, 0), active[name])
+        await asyncio.sleep(seconds)
+        active[name] -= 1
+    return handler
+
+
+def test_each_stage_runs_at_most_its_concurrency(make_pipeline, fresh_config):
+    fresh_config(PIPELINE_LLM_CONCURRENCY=3, PIPELINE_PUSH_CONCURRENCY=1)
+    active, peaks = {}, {}
+
+    async def run():
+        pipeline = make_pipeline([])
+        stages = {stage.name: stage for stage in pipeline.stages}
+        stages["generate"].handler = _gated_handler(active, peaks, "generate", 0.05)
+        stages["push"].handler = _gated_handler(active, peaks, "push", 0.05)
+        jobs = [(await pipeline.submit(_request()))[0] for _ in range(6)]
+        for job in jobs:
+            await _finished(pipeline, job)
+        await pipeline.stop()
+        return jobs, stages
+
+    jobs, stages = asyncio.run(run())
+    assert all(job.status == "completed" for job in jobs)
+    assert peaks == {"generate": 3, "push": 1}
+    assert stages["push"].stats()["processed"] == 6
+    assert stages["push"].stats()["max_wait_seconds"] >= 0.1  # jobs queued behind the single pusher
+
+
+def test_full_downstream_queue_blocks_upstream_and_intake(make_pipeline, fresh_config):
+    fresh_config(DEPLOYMENT_QUEUE_SIZE=1, PIPELINE_STAGE_QUEUE_SIZE=1,
+                 PIPELINE_LLM_CONCURRENCY=1, PIPELINE_PREFLIGHT_CONCURRENCY=1)
+
+    async def run():
+        pipeline = make_pipeline([])
+        stages = {stage.name: stage for stage in pipeline.stages}
+        stuck = asyncio.Event()
+
+        async def preflight(job):
+            await stuck.wait()
+        stages["preflight"].handler = preflight
+
+        accepted = []
+        # preflight holds the first job and queues the second; generate then
+        # blocks holding the third, and the fourth waits in the intake queue
+        for _ in range(4):
+            accepted.append((await pipeline.submit(_request()))[0])
+            await asyncio.sleep(0.1)
+        with pytest.raises(asyncio.QueueFull):
+            await pipeline.submit(_request())
+        stuck.set()
+        for job in accepted:
+            await _finished(pipeline, job)
+        await pipeline.stop()
+        return accepted, stages
+
+    accepted, stages = asyncio.run(run())
+    assert all(job.status == "completed" for job in accepted)
+    assert stages["generate"].stats()["blocked_seconds"] >= 0.1
@@ -0,0 +1,83 @@
+"""Preflight runs against a stubbed browser pool."""
+import asyncio
+import contextlib
+
+import httpx
+
+from utils.preflight import Preflight, StaticSiteServer
+
+
+class FakePage:
+    def on(self, event, handler):
+        pass
+
+    async def goto(self, url, timeout=None):
+        pass
+
+    async def wait_for_load_state(self, state, timeout=None):
+        pass
+
+    async def evaluate(self, expression):
+        return expression == "true"
+
+
+class FlakyPool:
+    """Fails the first `failures` pages with a browser-side error."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.resets = 0
+        self.launches = 0
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Target page, context or browser has been closed")
+        yield FakePage()
+
+    async def reset(self):
+        self.resets += 1
+
+    async def close(self):
+        pass
+
+
+def test_browser_failure_skips_the_run_and_resets_the_browser():
+    preflight = Preflight()
+    preflight.browsers = FlakyPool(failures=1)
+    files = {"index.html": "<h1>app</h1>"}
+
+    async def run():
+        first = await preflight.run(files, ["js: true"])
+        second = await preflight.run(files, ["js: true", "js: false"])
+        preflight.server.close()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is None
+    assert preflight.browsers.resets == 1
+    assert preflight.unavailable is None  # later runs still use the browser
+    assert (preflight.skipped, preflight.errors) == (1, 1)
+    assert second["failed"] == ["js: false"]
+
+
+def test_without_js_checks_nothing_runs():
+    preflight = Preflight()
+    preflight.browsers = FlakyPool(failures=0)
+    assert asyncio.run(preflight.run({"index.html": ""}, ["Repo has a README"])) is None
+    assert preflight.skipped == 1 and preflight.errors == 0
+
+
+def test_static_server_serves_sites_under_their_own_path():
+    server = StaticSiteServer()
+    site_id, url = server.add({"index.html": "<h1>app</h1>", "data.csv": b"a,b\n1,2\n"})
+    try:
+        assert httpx.get(url).text == "<h1>app</h1>"
+        csv = httpx.get(url + "data.csv")
+        assert csv.content == b"a,b\n1,2\n" and csv.headers["content-type"].startswith("text/csv")
+        assert httpx.get(url.rstrip("/")).status_code == 301
+        server.remove(site_id)
+        assert httpx.get(url).status_code == 404
+    finally:
+        server.close()
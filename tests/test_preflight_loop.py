@@ -0,0 +1,104 @@
+"""The preflight stage's repair / regenerate loop."""
+import asyncio
+
+import pytest
+
+from utils import deployment_pipeline
+from utils.deployment_pipeline import DeploymentJob, DeploymentPipeline
+from utils.preflight import Preflight
+
+CHECKS = ["js: a", "js: b", "js: c"]
+
+
+class FakePreflight:
+    """Fails the checks listed per index.html content; None means no browser."""
+
+    def __init__(self, failing):
+        self.failing = failing
+        self.checked = []
+
+    async def run(self, files, checks, template="unmatched"):
+        html = files["index.html"]
+        self.checked.append(html)
+        failed = self.failing[html]
+        if failed is None:
+            return None
+        return {"passed": not failed, "failed": failed, "errors": [], "seconds": 0.01,
+                "checks": [{"check": c, "passed": c not in failed, "result": "false"} for c in checks]}
+
+    feedback = staticmethod(Preflight.feedback)
+
+
+class FakeLLM:
+    def __init__(self, repairs=(), regenerations=()):
+        self.repairs = list(repairs)
+        self.regenerations = list(regenerations)
+        self.calls = []
+
+    async def generate_repair(self, brief, failures, files, errors=None):
+        self.calls.append(("repair", files["index.html"]))
+        if not self.repairs:
+            raise ValueError("no usable edits")
+        return {"index.html": self.repairs.pop(0)}
+
+    async def generate_app(self, brief, checks, attachments=None, use_cache=None):
+        self.calls.append(("regenerate", use_cache))
+        return {"index.html": self.regenerations.pop(0), "README.md": "readme"}
+
+
+@pytest.fixture
+def run_preflight(monkeypatch, fresh_config):
+    fresh_config(PREFLIGHT_ENABLED=True, PREFLIGHT_MAX_REPAIRS=2, PREFLIGHT_MAX_REGENERATIONS=1)
+
+    def run(failing, llm):
+        fake = FakePreflight(failing)
+        monkeypatch.setattr(deployment_pipeline, "preflight", fake)
+        monkeypatch.setattr(deployment_pipeline, "async_llm_client", llm)
+        job = DeploymentJob({"email": "s@example.com", "task": "demo", "round": 1, "nonce": "n",
+                             "brief": "Show a counter", "checks": CHECKS, "attachments": []})
+        job.files = {"index.html": "v1", "README.md": "readme"}
+        asyncio.run(DeploymentPipeline()._preflight(job))
+        return job, fake
+    return run
+
+
+def test_repair_that_passes_is_deployed(run_preflight):
+    llm = FakeLLM(repairs=["v2"])
+    job, fake = run_preflight({"v1": ["js: a"], "v2": []}, llm)
+    assert job.files["index.html"] == "v2"
+    assert job.result["preflight"]["passed"] is True
+    assert [r["fix"] for r in job.result["preflight"]["runs"]] == ["generate", "repair"]
+
+
+def test_worse_repair_is_discarded_and_regeneration_bypasses_cache(run_preflight):
+    llm = FakeLLM(repairs=["worse"], regenerations=["v3"])
+    job, fake = run_preflight({"v1": ["js: a"], "worse": CHECKS, "v3": []}, llm)
+    # The second repair starts from v1 again, not from the worse build; it fails,
+    # so the loop regenerates without the generation cache
+    assert llm.calls == [("repair", "v1"), ("repair", "v1"), ("regenerate", False)]
+    assert job.files["index.html"] == "v3"
+    assert [r["fix"] for r in job.result["preflight"]["runs"]] == ["generate", "repair", "regenerate"]
+
+
+def test_fixes_are_bounded_and_best_build_is_deployed(run_preflight):
+    llm = FakeLLM(repairs=["r1", "r2"], regenerations=["g1"])
+    failing = {"v1": ["js: a", "js: b"], "r1": ["js: b"], "r2": CHECKS, "g1": CHECKS}
+    job, fake = run_preflight(failing, llm)
+    assert fake.checked == ["v1", "r1", "r2", "g1"]
+    assert job.files["index.html"] == "r1"
+    assert job.result["preflight"]["passed"] is False
+    assert job.result["preflight"]["failed"] == ["js: b"]
+
+
+def test_browser_lost_after_a_fix_keeps_best_checked_build(run_preflight):
+    llm = FakeLLM(repairs=["unchecked"])
+    job, fake = run_preflight({"v1": ["js: a"], "unchecked": None}, llm)
+    assert job.files["index.html"] == "v1"
+    assert job.result["preflight"]["failed"] == ["js: a"]
+    assert job.result["preflight"]["runs"][-1] == {"fix": "repair", "skipped": True}
+
+
+def test_no_browser_skips_preflight(run_preflight):
+    job, fake = run_preflight({"v1": None}, FakeLLM())
+    assert job.files["index.html"] == "v1"
+    assert "preflight" not in job.result
@@ -0,0 +1,137 @@
+"""Client-side token-bucket limits for LLM requests and tokens."""
+import asyncio
+
+import pytest
+
+from utils import llm_client as llm_client_module
+from utils.llm_client import AsyncLLMClient, LLMClient, RateLimiter
+
+
+def test_parse_limits():
+    assert RateLimiter.parse_limits("gemini:gemini-1.5-flash=15/1000000, openai=60/,bad") == {
+        ("gemini", "gemini-1.5-flash"): (15, 1000000),
+        ("openai", ""): (60, 0),
+    }
+
+
+def test_model_limit_overrides_provider_and_default():
+    limiter = RateLimiter(default_rpm=10, default_tpm=0, limits="openai=20/0,openai:big=5/1000")
+    assert limiter._get_buckets("openai", "big")[0].capacity == 5
+    assert limiter._get_buckets("openai", "big")[1].capacity == 1000
+    assert limiter._get_buckets("openai", "small")[0].capacity == 20
+    assert limiter._get_buckets("openai", "small")[1] is None
+    assert limiter._get_buckets("gemini", "flash")[0].capacity == 10
+
+
+def test_unlimited_never_waits():
+    limiter = RateLimiter(default_rpm=0, default_tpm=0, limits="")
+    assert all(limiter._try_take("openai", "m", 10 ** 9) == 0 for _ in range(1000))
+
+
+def test_request_budget_runs_out_and_reports_wait():
+    limiter = RateLimiter(default_rpm=60, default_tpm=0, limits="")
+    assert all(limiter._try_take("openai", "m", 1) == 0 for _ in range(60))
+    assert limiter._try_take("openai", "m", 1) == pytest.approx(1.0, abs=0.05)  # 1 request/second refill
+
+
+def test_oversized_call_waits_for_a_full_bucket_only():
+    limiter = RateLimiter(default_rpm=0, default_tpm=600, limits="")
+    assert limiter._try_take("openai", "m", 5000) == 0  # capped at a minute's budget
+    assert limiter._try_take("openai", "m", 5000) == pytest.approx(60, abs=0.5)
+
+
+def test_settle_refunds_overestimates_and_penalize_drains():
+    limiter = RateLimiter(default_rpm=60, default_tpm=1000, limits="")
+    limiter._try_take("openai", "m", 800)
+    limiter.settle("openai", "m", reserved=800, used=300)
+    assert limiter._get_buckets("openai", "m")[1].level == pytest.approx(700, abs=1)
+
+    limiter.penalize("openai", "m")
+    requests, tokens = limiter._get_buckets("openai", "m")
+    assert requests.level <= 0 and tokens.level <= 0
+    assert limiter.rate_limited == 1
+
+
+def test_cancelled_async_waiter_takes_no_budget():
+    limiter = RateLimiter(default_rpm=60, default_tpm=0, limits="")
+    for _ in range(60):
+        limiter._try_take("openai", "m", 1)
+
+    async def run():
+        waiter = asyncio.create_task(limiter.acquire_async("openai", "m", 1))
+        await asyncio.sleep(0.1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(run())
+    requests = limiter._get_buckets("openai", "m")[0]
+    assert 0 <= requests.level < 1
+    assert limiter.waits == 0
+
+
+def test_acquire_async_waits_for_refill():
+    limiter = RateLimiter(default_rpm=600, default_tpm=0, limits="")  # 10 requests/second
+    for _ in range(600):
+        limiter._try_take("openai", "m", 1)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await limiter.acquire_async("openai", "m", 1)
+        return loop.time() - started
+
+    assert 0.05 <= asyncio.run(run()) < 0.5
+    assert limiter.waits == 1
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, headers=None):
+        super().__init__("Error code: 429 - rate limit exceeded")
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def _flaky_client(errors):
+    client = AsyncLLMClient("openai", "m", "test-key", fallbacks=[])
+    attempts = []
+
+    async def complete(prompt, system_prompt, attempt, reserved=0):
+        attempts.append(asyncio.get_running_loop().time())
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+    client._complete = complete
+    return client, attempts
+
+
+def test_429_with_unlimited_budget_backs_off(fresh_config):
+    fresh_config(LLM_RATE_LIMIT_BACKOFF=0.1, LLM_RATE_LIMIT_BACKOFF_MAX=60)
+    client, attempts = _flaky_client([RateLimitError(), RateLimitError()])
+    assert asyncio.run(client._generate_code("p", None, 3, 5)) == "ok"
+    first_wait, second_wait = attempts[1] - attempts[0], attempts[2] - attempts[1]
+    assert 0.1 <= first_wait < 0.2
+    assert 0.2 <= second_wait < 0.35  # doubles per attempt
+
+
+def test_429_honours_retry_after(fresh_config):
+    fresh_config(LLM_RATE_LIMIT_BACKOFF=30, LLM_RATE_LIMIT_BACKOFF_MAX=60)
+    client, attempts = _flaky_client([RateLimitError({"retry-after": "0.2"})])
+    assert asyncio.run(client._generate_code("p", None, 3, 5)) == "ok"
+    assert 0.2 <= attempts[1] - attempts[0] < 0.5
+
+
+def test_retry_after_sources():
+    assert LLMClient._retry_after(RateLimitError({"retry-after-ms": "1500"})) == 1.5
+    assert LLMClient._retry_after(Exception("429 Quota exceeded ... retry_delay {\n  seconds: 12\n}")) == 12
+    assert LLMClient._retry_after(Exception("Please retry in 3.5s.")) == 3.5
+    assert LLMClient._retry_after(RateLimitError({"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"})) is None
+
+
+def test_429_with_configured_budget_waits_in_the_limiter(monkeypatch, fresh_config):
+    fresh_config(LLM_RATE_LIMIT_BACKOFF=30)
+    monkeypatch.setattr(llm_client_module, "rate_limiter", RateLimiter(default_rpm=60, default_tpm=0, limits=""))
+    client = LLMClient()
+    assert client._rate_limit_delay(RateLimitError(), 0) == 0  # acquire waits for the refill instead
+    assert llm_client_module.rate_limiter._try_take(client.provider, client.model, 1) > 0
@@ -0,0 +1,111 @@
+"""Pre-created repository pool: claiming, refilling and adopting leftovers."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.github_helper import RepoPool
+
+
+class StubResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class InMemoryGitHub:
+    """The slice of GitHubHelper the pool uses, over a dict of repos."""
+
+    username = "test-user"
+
+    def __init__(self, repos=()):
+        self.repos = {name: {"branches": {"main": f"{name}-sha"}, "pages": False} for name in repos}
+        self.lock = threading.Lock()
+        self.renames = []
+
+    def has_credentials(self):
+        return True
+
+    def _ensure_client(self):
+        pass
+
+    def _api_request(self, method, path, ok_statuses=(200, 201), json=None, params=None):
+        parts = path.strip("/").split("/")
+        with self.lock:
+            if (method, path) == ("GET", "/user/repos"):
+                names = sorted(self.repos)[(params["page"] - 1) * 100:params["page"] * 100]
+                return StubResponse(200, [{"name": name} for name in names])
+            if (method, path) == ("POST", "/user/repos"):
+                self.repos[json["name"]] = {"branches": {"main": f"{json['name']}-sha"}, "pages": False}
+                return StubResponse(201)
+            if method == "PATCH":
+                old, new = parts[2], json["name"]
+                if new in self.repos:
+                    return StubResponse(422)
+                self.repos[new] = self.repos.pop(old)
+                self.renames.append((old, new))
+                return StubResponse(200, {"html_url": f"https://github.com/test-user/{new}"})
+            if method == "POST" and parts[-1] == "pages":
+                self.repos[parts[2]]["pages"] = json["source"]["branch"]
+                return StubResponse(201)
+        raise AssertionError(f"unexpected {method} {path}")
+
+    def _get_ref_sha(self, repo_name, branch):
+        return self.repos[repo_name]["branches"].get(branch)
+
+    def _set_ref(self, repo_name, branch, sha):
+        self.repos[repo_name]["branches"][branch] = sha
+
+
+def _pool(github, available=(), size=3):
+    pool = RepoPool(github, size=size, prefix="pool")
+    pool._available = list(available)
+    return pool
+
+
+def test_claim_renames_a_pooled_repo_in_one_call():
+    github = InMemoryGitHub(["pool-a"])
+    pool = _pool(github, ["pool-a"])
+    assert pool.claim("student-app") == "https://github.com/test-user/student-app"
+    assert github.renames == [("pool-a", "student-app")]
+    assert pool.claim("other-app") is None  # empty pool: caller creates the repo itself
+    assert pool.stats()["claimed"] == 1 and pool.stats()["misses"] == 1
+
+
+def test_taken_name_keeps_the_pooled_repo_for_the_next_claim():
+    github = InMemoryGitHub(["pool-a", "student-app"])
+    pool = _pool(github, ["pool-a"])
+    assert pool.claim("student-app") is None
+    assert pool._available == ["pool-a"]
+    assert pool.claim("fresh-app") == "https://github.com/test-user/fresh-app"
+
+
+def test_concurrent_claims_never_share_a_repo():
+    names = [f"pool-{n}" for n in range(4)]
+    github = InMemoryGitHub(names)
+    pool = _pool(github, names)
+    with ThreadPoolExecutor(8) as executor:
+        urls = list(executor.map(lambda n: pool.claim(f"app-{n}"), range(8)))
+    assert sum(url is not None for url in urls) == 4
+    assert sorted(old for old, _ in github.renames) == names
+
+
+def test_refill_creates_pages_ready_repos_and_adopts_leftovers(fresh_config):
+    fresh_config(REPO_POOL_QUIET_SECONDS=0, REPO_POOL_REFILL_INTERVAL=0.01, GITHUB_PAGES_BRANCH="gh-pages")
+    github = InMemoryGitHub(["pool-left-over", "unrelated"])
+    pool = _pool(github, size=3)
+    pool.start()
+    try:
+        deadline = time.time() + 5
+        while len(pool._available) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        pool.stop()
+    assert "pool-left-over" in pool._available and "unrelated" not in pool._available
+    assert pool.stats()["created"] == 2
+    for name in pool._available:
+        if name != "pool-left-over":
+            repo = github.repos[name]
+            assert repo["branches"]["gh-pages"] == repo["branches"]["main"] and repo["pages"] == "gh-pages"
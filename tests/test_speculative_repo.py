@@ -0,0 +1,98 @@
+"""Speculative repo creation during generation, and its rollback."""
+import asyncio
+
+import pytest
+
+from utils import deployment_pipeline
+from utils.deployment_pipeline import DeploymentJob, DeploymentPipeline
+from utils.github_helper import RepoExistsError
+
+
+class FakeGitHub:
+    def __init__(self, existing=()):
+        self.repos = set(existing)
+        self.created = []
+        self.deleted = []
+
+    def create_repo(self, repo_name, description="", replace_existing=True):
+        if repo_name in self.repos and not replace_existing:
+            raise RepoExistsError(f"Repository {repo_name} already exists")
+        self.repos.add(repo_name)
+        self.created.append(repo_name)
+        return f"https://github.com/test-user/{repo_name}"
+
+    def delete_repo(self, repo_name):
+        self.repos.discard(repo_name)
+        self.deleted.append(repo_name)
+
+
+class NoPool:
+    def claim(self, repo_name, description=""):
+        return None
+
+
+@pytest.fixture
+def github(monkeypatch, fresh_config):
+    fresh_config(PIPELINE_SPECULATIVE_REPO=True)
+
+    def install(existing=()):
+        fake = FakeGitHub(existing)
+        monkeypatch.setattr(deployment_pipeline, "github_helper", fake)
+        monkeypatch.setattr(deployment_pipeline, "repo_pool", NoPool())
+        return fake
+    return install
+
+
+def _generate(fail: bool):
+    request = {"email": "s@example.com", "task": "demo_task", "round": 1, "nonce": "n",
+               "brief": "b", "checks": [], "attachments": []}
+    job = DeploymentJob(request)
+
+    async def generate_files(job, on_file):
+        await asyncio.sleep(0.05)  # let the speculative create run first
+        if fail:
+            raise RuntimeError("generation failed")
+        job.files = {"index.html": "<html></html>"}
+
+    async def run():
+        pipeline = DeploymentPipeline()
+        pipeline._repo_slots = asyncio.Semaphore(2)
+        pipeline._generate_files = generate_files
+        try:
+            await pipeline._generate(job)
+        except RuntimeError:
+            pass
+        return job
+    return asyncio.run(run())
+
+
+def test_speculative_create_then_success_keeps_repo(github):
+    fake = github()
+    job = _generate(fail=False)
+    assert fake.created == ["demo-task-1"]
+    assert job.result["repo_name"] == "demo-task-1"
+    assert "create_repo_overlapped" in job.timings
+
+
+def test_existing_repo_is_not_replaced_speculatively(github):
+    fake = github(existing={"demo-task-1"})
+    job = _generate(fail=False)
+    assert fake.created == []
+    assert fake.deleted == []
+    assert "repo_name" not in job.result  # left to the create_repo stage
+
+
+def test_failed_generation_after_skipped_speculation_deletes_nothing(github):
+    fake = github(existing={"demo-task-1"})
+    _generate(fail=True)
+    assert fake.deleted == []
+    assert fake.repos == {"demo-task-1"}
+
+
+def test_failed_generation_rolls_back_only_the_created_repo(github):
+    fake = github(existing={"other-repo"})
+    job = _generate(fail=True)
+    assert fake.deleted == ["demo-task-1"]
+    assert fake.repos == {"other-repo"}
+    assert "repo_name" not in job.result
+    assert "create_repo_overlapped" not in job.timings
@@ -0,0 +1,100 @@
+"""Hedged streaming: a slow or failing primary stream loses to a fallback."""
+import asyncio
+
+from utils.llm_client import AsyncLLMClient, LLMClient
+
+
+def _response(name: str) -> str:
+    return f"[FILE: index.html]\n<h1>{name}</h1>\n[END FILE]\n"
+
+
+def _client(model: str, first_chunk_after: float = 0.0, error: Exception = None, events: list = None):
+    client = AsyncLLMClient("openai", model, "test-key", fallbacks=[])
+
+    async def stream(prompt, system_prompt=None):
+        try:
+            await asyncio.sleep(first_chunk_after)
+            if error:
+                raise error
+            for line in _response(model).splitlines(keepends=True):
+                yield line
+        except asyncio.CancelledError:
+            events.append(f"{model} cancelled")
+            raise
+    client._stream_code = stream
+    return client
+
+
+def _generate(primary, fallbacks):
+    primary.fallbacks = fallbacks
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        files = await primary._generate_files_streaming("prompt", "system")
+        await asyncio.sleep(0)  # let cancelled streams unwind
+        return files, asyncio.get_running_loop().time() - started
+    return asyncio.run(run())
+
+
+def test_slow_primary_stream_loses_to_fallback(fresh_config):
+    fresh_config(LLM_STREAM_HEDGE_DELAY=0.05)
+    events = []
+    primary = _client("slow-primary", first_chunk_after=5, events=events)
+    files, seconds = _generate(primary, [_client("fast-fallback", events=events)])
+    assert files == {"index.html": "<h1>fast-fallback</h1>"}
+    assert seconds < 1
+    assert events == ["slow-primary cancelled"]
+
+
+def test_fast_primary_stream_is_not_hedged(fresh_config):
+    fresh_config(LLM_STREAM_HEDGE_DELAY=0.5)
+    events = []
+    fallback = _client("fallback", events=events)
+    files, _ = _generate(_client("primary", events=events), [fallback])
+    assert files == {"index.html": "<h1>primary</h1>"}
+    assert events == []
+    assert len(fallback._first_chunk_latencies) == 0  # never started
+
+
+def test_stream_failing_before_first_chunk_fails_over(fresh_config):
+    fresh_config(LLM_STREAM_HEDGE_DELAY=5)
+    events = []
+    primary = _client("broken", error=RuntimeError("connection reset"), events=events)
+    files, seconds = _generate(primary, [_client("fallback", events=events)])
+    assert files == {"index.html": "<h1>fallback</h1>"}
+    assert seconds < 1
+
+
+BROKEN_STREAM = ["[FILE: index.html]\n<h1>app</h1>\n[END FILE]\n", "[FILE: README.md]\n# Ap"]
+FULL_RESPONSE = "[FILE: index.html]\n<h1>app</h1>\n[END FILE]\n[FILE: README.md]\n# App\n[END FILE]\n"
+
+
+def test_non_streamed_retry_does_not_re_emit_streamed_files():
+    emitted = []
+    client = LLMClient()
+
+    def stream_code(prompt, system_prompt=None):
+        yield from BROKEN_STREAM
+        raise ConnectionError("stream reset")
+    client.stream_code = stream_code
+    client.generate_code = lambda prompt, system_prompt=None: FULL_RESPONSE
+    files, _ = client._generate_app_files("b", "p", "s", lambda name, content: emitted.append(name), stream=True)
+    assert emitted == ["index.html", "README.md"]
+    assert files["README.md"] == "# App"
+
+
+def test_async_non_streamed_retry_does_not_re_emit_streamed_files():
+    emitted = []
+    client = AsyncLLMClient("openai", "m", "test-key", fallbacks=[])
+
+    async def stream_code(prompt, system_prompt=None):
+        for chunk in BROKEN_STREAM:
+            yield chunk
+        raise ConnectionError("stream reset")
+
+    async def generate_code(prompt, system_prompt=None):
+        return FULL_RESPONSE
+    client.stream_code, client.generate_code = stream_code, generate_code
+    files, _ = asyncio.run(client._generate_app_files("b", "p", "s", lambda name, content: emitted.append(name), True))
+    assert emitted == ["index.html", "README.md"]
+    assert files["README.md"] == "# App"
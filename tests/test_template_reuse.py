@@ -0,0 +1,113 @@
+"""Recognising template variants and instantiating one generation per student."""
+import asyncio
+
+import pytest
+
+from templates.task_loader import task_loader
+from utils import template_reuse as template_reuse_module
+from utils.template_reuse import TemplateReuse
+
+
+def _variants():
+    for template in task_loader.templates:
+        yield template, 1, 0, template
+        for index, variant in enumerate(template.get("round2", []), 1):
+            yield template, 2, index, variant
+
+
+@pytest.mark.parametrize("template, round_num, index, variant", list(_variants()),
+                         ids=lambda value: value["id"] if isinstance(value, dict) and "id" in value else None)
+def test_every_generated_variant_is_recognised(template, round_num, index, variant):
+    seed = "a1b2c3d4"
+    brief = task_loader._substitute(variant["brief"], seed)
+    checks = [task_loader._substitute(check, seed) for check in variant.get("checks", [])]
+    match = task_loader.match_task(brief, checks)
+    assert match is not None
+    assert (match["template_id"], match["round"], match["variant"]) == (template["id"], round_num, index)
+    if "${seed}" in variant["brief"] + "".join(variant.get("checks", [])):
+        assert match["seed"] == seed
+
+
+def test_inconsistent_result_or_edited_brief_does_not_match():
+    template = task_loader.get_template_by_id("sum-of-sales")
+    seed = "a1b2c3d4"
+    brief = task_loader._substitute(template["brief"], seed)
+    checks = [task_loader._substitute(check, seed) for check in template["checks"]]
+    assert task_loader.match_task(brief, checks)["result"] == str(sum(map(ord, seed)) % 1000)
+
+    wrong_result = [check.replace(str(sum(map(ord, seed)) % 1000), "12345") for check in checks]
+    assert task_loader.match_task(brief, wrong_result) is None
+    assert task_loader.match_task(brief + " Also add a chart.", checks) is None
+    assert task_loader.match_task(brief, checks[:-1]) is None
+
+
+class FakeLLM:
+    def __init__(self, html, readme="Seed __SEED__"):
+        self.html = html
+        self.readme = readme
+        self.calls = []
+
+    async def generate_app(self, brief, checks, attachments=None, use_cache=None):
+        self.calls.append({"brief": brief, "checks": checks, "attachments": attachments, "use_cache": use_cache})
+        return {"index.html": self.html, "README.md": self.readme}
+
+
+def _run(reuse, brief, checks, attachments):
+    return asyncio.run(reuse.generate(brief, checks, attachments))
+
+
+def _sum_of_sales_task(seed):
+    template = task_loader.get_template_by_id("sum-of-sales")
+    brief = task_loader._substitute(template["brief"], seed)
+    checks = [task_loader._substitute(check, seed) for check in template["checks"]]
+    return brief, checks
+
+
+def test_one_generation_is_instantiated_per_student(monkeypatch, fresh_config):
+    fresh_config(ATTACHMENTS_AS_FILES=True, LLM_CACHE_ENABLED=True)
+    llm = FakeLLM("<title>Sales Summary __SEED__</title><script>fetch('data.csv')</script>")
+    monkeypatch.setattr(template_reuse_module, "async_llm_client", llm)
+    reuse = TemplateReuse()
+    files = {}
+    for seed in ("aaaa1111", "bbbb2222"):
+        brief, checks = _sum_of_sales_task(seed)
+        files[seed], match = _run(reuse, brief, checks, [{"name": "data.csv", "url": "data:text/csv,a\n1"}])
+        assert match["template_id"] == "sum-of-sales"
+
+    assert files["aaaa1111"]["index.html"] == "<title>Sales Summary aaaa1111</title><script>fetch('data.csv')</script>"
+    assert files["bbbb2222"]["README.md"] == "Seed bbbb2222"
+    # Both students send the same parameterized request (one cached generation)
+    assert llm.calls[0] == llm.calls[1]
+    assert "__SEED__" in llm.calls[0]["brief"] and "aaaa1111" not in llm.calls[0]["brief"]
+    assert llm.calls[0]["attachments"][0]["sample"] is False
+    assert llm.calls[0]["use_cache"] is True
+    assert reuse.stats() == {"matched": 2, "unmatched": 0, "reused": 2, "fallbacks": 0}
+
+
+@pytest.mark.parametrize("html", [
+    "<title>Sales Summary 42</title>",  # seed used by the checks never reaches the page
+    "<title>Sales Summary __SEED__</title>__ATTACHMENT_OTHER__",  # placeholder that cannot be filled
+])
+def test_untrustworthy_template_falls_back(monkeypatch, html):
+    monkeypatch.setattr(template_reuse_module, "async_llm_client", FakeLLM(html, readme="Sales summary"))
+    reuse = TemplateReuse()
+    brief, checks = _sum_of_sales_task("aaaa1111")
+    assert _run(reuse, brief, checks, []) is None
+    assert reuse.fallbacks == 1
+
+
+def test_unrecognised_brief_is_not_reused(monkeypatch):
+    llm = FakeLLM("")
+    monkeypatch.setattr(template_reuse_module, "async_llm_client", llm)
+    reuse = TemplateReuse()
+    assert _run(reuse, "Build a todo app", ["js: true"], []) is None
+    assert llm.calls == [] and reuse.unmatched == 1
+
+
+def test_reuse_respects_disabled_generation_cache(monkeypatch, fresh_config):
+    fresh_config(LLM_CACHE_ENABLED=False)
+    llm = FakeLLM("<title>Sales Summary __SEED__</title>")
+    monkeypatch.setattr(template_reuse_module, "async_llm_client", llm)
+    brief, checks = _sum_of_sales_task("aaaa1111")
+    assert _run(TemplateReuse(), brief, checks, []) is not None
+    assert llm.calls[0]["use_cache"] is False
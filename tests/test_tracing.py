@@ -0,0 +1,49 @@
+"""Span recording: background writes, rotation and reading traces back."""
+import asyncio
+import os
+import threading
+
+from utils import tracing
+
+
+def test_spans_are_written_off_the_calling_thread(tmp_path, fresh_config):
+    fresh_config(TRACING_ENABLED=True, TRACE_FILE=str(tmp_path / "traces.jsonl"))
+    trace_id = tracing.trace_id_for("nonce-1")
+    writers = []
+    real_write = tracing._write
+
+    def spy(lines):
+        writers.append(threading.current_thread().name)
+        real_write(lines)
+
+    tracing._write = spy
+    try:
+        async def handle():
+            with tracing.span("receive_task", trace_id=trace_id):
+                with tracing.span("stage.push"):
+                    tracing.annotate(files=3)
+        asyncio.run(handle())
+        assert tracing.flush()
+    finally:
+        tracing._write = real_write
+
+    spans = tracing.load_trace(trace_id)
+    assert [s["name"] for s in spans] == ["receive_task", "stage.push"]
+    assert spans[1]["parent_id"] == spans[0]["span_id"]
+    assert spans[1]["attributes"] == {"files": 3}
+    assert writers and set(writers) == {"trace-writer"}
+
+
+def test_trace_file_rotates_and_keeps_a_bounded_history(tmp_path, fresh_config):
+    path = tmp_path / "traces.jsonl"
+    fresh_config(TRACING_ENABLED=True, TRACE_FILE=str(path), TRACE_FILE_MAX_BYTES=3000, TRACE_FILE_BACKUPS=2)
+    old, new = tracing.trace_id_for("old"), tracing.trace_id_for("new")
+    for index in range(40):
+        tracing.record("check.js", index, index + 1, trace_id=old if index < 20 else new, padding="x" * 100)
+        tracing.flush()
+
+    assert sorted(os.listdir(tmp_path)) == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    assert all(os.path.getsize(tmp_path / name) < 3000 + 400 for name in os.listdir(tmp_path))
+    recent = tracing.load_trace(new)
+    assert [s["start"] for s in recent] == list(range(20, 40))  # read across the rotated files
+    assert len(tracing.load_trace(old)) < 20  # the oldest spans were dropped
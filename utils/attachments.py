@@ -0,0 +1,118 @@
+"""Attachment handling for generation and deployment.
+
+Data-URI attachments are deployed as repo files next to index.html instead of
+being pasted into the LLM prompt (and echoed back in its output). The prompt
+only gets a description of each file: its type and size, a schema and a
+short sample. The generated app loads the file with fetch() at runtime, so
+prompt size and generation time no longer grow with attachment size.
+"""
+import re
+import io
+import csv
+import json
+import base64
+from typing import Dict, Any, Optional, Tuple, List
+from urllib.parse import unquote_to_bytes
+
+from config.config import config
+
+DATA_URI = re.compile(r"^data:(?P<mime>[^;,]*)(?P<params>(?:;[^;,]*)*),(?P<data>.*)$", re.DOTALL)
+# Files the generator writes itself; an attachment must never replace them
+RESERVED_NAMES = {"index.html", "README.md", "LICENSE"}
+SAMPLE_ROWS = 3
+SAMPLE_CHARS = 400
+
+
+def decode_data_uri(url: str) -> Optional[Tuple[str, bytes]]:
+    """Return (mime, bytes) for a data URI, or None for anything else."""
+    match = DATA_URI.match(url or "")
+    if not match:
+        return None
+    data = match.group("data")
+    try:
+        if ";base64" in match.group("params"):
+            payload = base64.b64decode(data, validate=False)
+        else:
+            payload = unquote_to_bytes(data)
+    except ValueError:
+        return None
+    return match.group("mime") or "text/plain", payload
+
+
+def is_file_attachment(attachment: Dict[str, Any]) -> bool:
+    """Whether an attachment is deployed as a repo file rather than inlined."""
+    name = attachment.get("name") or ""
+    return (
+        config.ATTACHMENTS_AS_FILES
+        and name not in RESERVED_NAMES
+        and "/" not in name and "\\" not in name and not name.startswith(".")
+        and decode_data_uri(attachment.get("url") or "") is not None
+    )
+
+
+def as_files(attachments: List[Dict[str, Any]]) -> Dict[str, bytes]:
+    """Repo files (name -> bytes) for the attachments deployed as files."""
+    files = {}
+    for attachment in attachments or []:
+        if is_file_attachment(attachment):
+            files[attachment["name"]] = decode_data_uri(attachment["url"])[1]
+    return files
+
+
+def describe(name: str, url: str, sample: bool = True) -> str:
+    """Prompt text for a file attachment: how to load it, its schema and a sample.
+
+    With sample=False only student-independent facts are given (type and
+    schema), so the description is identical across data sets of one template.
+    """
+    mime, data = decode_data_uri(url)
+    lines = [f"Deployed as the file ./{name} next to index.html ({mime}). Load it at runtime with "
+             f"fetch('{name}'); do not embed its contents."]
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        if sample:
+            lines.append(f"Binary file, {len(data)} bytes.")
+        return "\n".join(lines)
+
+    if name.lower().endswith(".csv") or mime == "text/csv":
+        rows = list(csv.reader(io.StringIO(text)))
+        if rows:
+            lines.append(f"CSV with header row; columns: {', '.join(rows[0])}")
+            if sample:
+                lines.append(f"{len(rows) - 1} data rows. First rows:")
+                lines.extend(text.splitlines()[:SAMPLE_ROWS + 1])
+        return "\n".join(lines)
+
+    if name.lower().endswith(".json") or mime.endswith("json"):
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            lines.append(f"JSON schema: {json.dumps(_schema(parsed))}")
+            if sample:
+                lines.append(f"Sample: {json.dumps(parsed)[:SAMPLE_CHARS]}")
+            return "\n".join(lines)
+
+    if sample:
+        lines.append(f"Text, {len(text.splitlines())} lines. Beginning:")
+        lines.append(text[:SAMPLE_CHARS])
+    return "\n".join(lines)
+
+
+def _schema(value: Any, depth: int = 0) -> Any:
+    """Types of a JSON value, keeping object keys and the first array element."""
+    if isinstance(value, dict):
+        if depth >= 2:
+            return "object"
+        return {key: _schema(item, depth + 1) for key, item in list(value.items())[:20]}
+    if isinstance(value, list):
+        return [_schema(value[0], depth + 1)] if value and depth < 2 else "array"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if value is None:
+        return "null"
+    return "string"
@@ -0,0 +1,266 @@
+"""Durable outbox for evaluation callbacks.
+
+Callbacks are written to the ``callback_outbox`` table first and delivered by
+a single asyncio worker over a shared HTTP connection pool, with a per-host
+concurrency limit and exponential backoff with jitter. Undelivered callbacks
+survive restarts and are picked up again when the worker starts.
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Callable
+from urllib.parse import urlparse
+
+import httpx
+
+from database.db import get_db
+from database.models import CallbackOutbox as OutboxRow, Deployment
+from config.config import config
+from utils import metrics, tracing
+
+
+class CallbackOutbox:
+    """Delivers queued evaluation callbacks from the outbox table."""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._in_flight: Dict[int, asyncio.Task] = {}
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._listeners: List[Callable[[str, str], None]] = []
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+
+    def add_listener(self, listener: Callable[[str, str], None]):
+        """Register listener(job_id, status) called when a callback settles."""
+        self._listeners.append(listener)
+
+    def start(self):
+        """Start the delivery worker on the running event loop (idempotent)."""
+        if self._task and not self._task.done():
+            return
+        self._client = httpx.AsyncClient(
+            timeout=config.CALLBACK_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=config.CALLBACK_MAX_CONNECTIONS,
+                max_keepalive_connections=config.CALLBACK_MAX_CONNECTIONS,
+            ),
+        )
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, *self._in_flight.values(), return_exceptions=True)
+            self._task = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def enqueue(self, url: str, payload: Dict[str, Any], job_id: str = None) -> int:
+        """Persist a callback for delivery and return its outbox id.
+
+        A deployment that re-runs its callback stage (e.g. resumed after a
+        restart) gets its existing row back instead of a second delivery.
+        """
+        self.start()
+        outbox_id = await asyncio.to_thread(self._insert, url, payload, job_id)
+        self._wakeup.set()
+        return outbox_id
+
+    async def get(self, outbox_id: int) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._load, outbox_id)
+
+    async def stats(self) -> Dict[str, Any]:
+        counts = await asyncio.to_thread(self._count_by_status)
+        return {
+            "outbox": counts,
+            "in_flight": len(self._in_flight),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+    def _insert(self, url: str, payload: Dict[str, Any], job_id: Optional[str]) -> int:
+        with get_db() as db:
+            if job_id:
+                existing = db.query(OutboxRow).filter(OutboxRow.job_id == job_id).order_by(OutboxRow.id.desc()).all()
+                for row in existing:
+                    if row.url == url and row.payload == payload:
+                        return row.id
+            row = OutboxRow(url=url, payload=payload, job_id=job_id, status="pending",
+                            attempts=0, next_attempt_at=datetime.utcnow())
+            db.add(row)
+            db.flush()
+            return row.id
+
+    def _load(self, outbox_id: int) -> Optional[Dict[str, Any]]:
+        with get_db() as db:
+            row = db.query(OutboxRow).filter(OutboxRow.id == outbox_id).first()
+            return row.to_dict() if row else None
+
+    def _count_by_status(self) -> Dict[str, int]:
+        from sqlalchemy import func
+        with get_db() as db:
+            rows = db.query(OutboxRow.status, func.count(OutboxRow.id)).group_by(OutboxRow.status).all()
+            return {status: count for status, count in rows}
+
+    def _due(self, limit: int) -> List[Dict[str, Any]]:
+        with get_db() as db:
+            query = db.query(OutboxRow).filter(
+                OutboxRow.status == "pending",
+                OutboxRow.next_attempt_at <= datetime.utcnow()
+            )
+            if self._in_flight:
+                query = query.filter(~OutboxRow.id.in_(list(self._in_flight)))
+            rows = query.order_by(OutboxRow.next_attempt_at).limit(limit).all()
+            return [{"id": r.id, "url": r.url, "payload": r.payload,
+                     "attempts": r.attempts, "job_id": r.job_id} for r in rows]
+
+    def _next_due_in(self) -> Optional[float]:
+        """Seconds until the next pending callback is due (None if none pending)."""
+        with get_db() as db:
+            query = db.query(OutboxRow).filter(OutboxRow.status == "pending")
+            if self._in_flight:
+                query = query.filter(~OutboxRow.id.in_(list(self._in_flight)))
+            row = query.order_by(OutboxRow.next_attempt_at).first()
+            if row is None:
+                return None
+            return max(0.0, (row.next_attempt_at - datetime.utcnow()).total_seconds())
+
+    def _record(self, item: Dict[str, Any], status: str, status_code: Optional[int],
+                error: Optional[str], retry_in: Optional[float] = None):
+        with get_db() as db:
+            row = db.query(OutboxRow).filter(OutboxRow.id == item["id"]).first()
+            row.attempts = item["attempts"] + 1
+            row.status = status
+            row.last_status_code = status_code
+            row.last_error = error
+            if status == "delivered":
+                row.delivered_at = datetime.utcnow()
+            if retry_in is not None:
+                row.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_in)
+            if status != "pending" and item["job_id"]:
+                deployment = db.query(Deployment).filter(Deployment.job_id == item["job_id"]).first()
+                if deployment:
+                    deployment.callback_status = status
+                    deployment.result = {**(deployment.result or {}), "callback_status": status}
+
+    def _backoff(self, attempts: int) -> float:
+        """Exponential backoff with equal jitter."""
+        delay = min(config.CALLBACK_BACKOFF_MAX, config.CALLBACK_BACKOFF_BASE * (2 ** (attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            sleep_for = config.CALLBACK_POLL_INTERVAL
+            try:
+                capacity = config.CALLBACK_MAX_CONNECTIONS * 2 - len(self._in_flight)
+                due = await asyncio.to_thread(self._due, capacity) if capacity > 0 else []
+                for item in due:
+                    task = asyncio.create_task(self._deliver(item))
+                    self._in_flight[item["id"]] = task
+                    task.add_done_callback(lambda _t, i=item["id"]: self._settled(i))
+
+                next_due = await asyncio.to_thread(self._next_due_in)
+                if next_due is not None and (capacity > len(due) or next_due > 0):
+                    sleep_for = min(sleep_for, next_due)
+            except Exception as e:
+                print(f"Warning: Callback outbox worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=sleep_for)
+            except asyncio.TimeoutError:
+                pass
+
+    def _settled(self, outbox_id: int):
+        self._in_flight.pop(outbox_id, None)
+        self._wakeup.set()
+
+    @staticmethod
+    def _invalid_url(url: str) -> Optional[str]:
+        """Why a callback URL can never be delivered to, or None if it looks usable."""
+        try:
+            parsed = urlparse(url or "")
+            parsed.port  # raises ValueError for out-of-range ports
+        except ValueError as e:
+            return f"Invalid callback URL: {e}"
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            return f"Invalid callback URL: {url!r}"
+        return None
+
+    async def _deliver(self, item: Dict[str, Any]):
+        status_code = None
+        error = self._invalid_url(item["url"])
+        permanent = error is not None
+        nonce = (item["payload"] or {}).get("nonce")
+        trace_id = tracing.trace_id_for(nonce) if nonce else None
+        if not permanent:
+            limit = self._host_limits.setdefault(
+                urlparse(item["url"]).netloc, asyncio.Semaphore(config.CALLBACK_PER_HOST_CONCURRENCY)
+            )
+            async with limit:
+                started = time.time()
+                try:
+                    with metrics.CALLBACK_DELIVERY_SECONDS.time():
+                        resp = await self._client.post(
+                            item["url"], json=item["payload"], headers=tracing.trace_headers(trace_id)
+                        )
+                    status_code = resp.status_code
+                    if not resp.is_success:
+                        error = f"HTTP {status_code}: {resp.text[:500]}"
+                except (httpx.InvalidURL, httpx.UnsupportedProtocol) as e:
+                    error, permanent = f"Invalid callback URL: {e}", True
+                except Exception as e:
+                    # Anything else (connection errors, bad ports surfacing from the
+                    # transport, ...) must still be recorded, or the row is retried at once
+                    error = str(e) or e.__class__.__name__
+                finally:
+                    if trace_id:
+                        tracing.record("callback.deliver", started, time.time(), trace_id=trace_id,
+                                       error=error, attempt=item["attempts"] + 1, status_code=status_code)
+
+        if status_code is not None and error is None:
+            await asyncio.to_thread(self._record, item, "delivered", status_code, None)
+            self.delivered += 1
+            metrics.CALLBACK_DELIVERIES_TOTAL.labels("delivered").inc()
+            self._notify(item, "delivered")
+            return
+
+        attempts = item["attempts"] + 1
+        # Client errors other than timeouts/rate limits will not succeed on retry
+        permanent = permanent or (
+            status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429)
+        )
+        if permanent or attempts >= config.CALLBACK_MAX_ATTEMPTS:
+            print(f"Warning: Evaluation callback {item['id']} to {item['url']} failed: {error}")
+            await asyncio.to_thread(self._record, item, "failed", status_code, error)
+            self.failed += 1
+            metrics.CALLBACK_DELIVERIES_TOTAL.labels("failed").inc()
+            self._notify(item, "failed")
+            return
+
+        retry_in = self._backoff(attempts)
+        print(f"Callback {item['id']} failed ({error}), retrying in {retry_in:.1f}s "
+              f"(attempt {attempts}/{config.CALLBACK_MAX_ATTEMPTS})")
+        await asyncio.to_thread(self._record, item, "pending", status_code, error, retry_in)
+        self.retries += 1
+        metrics.CALLBACK_DELIVERIES_TOTAL.labels("retry").inc()
+        self._wakeup.set()
+
+    def _notify(self, item: Dict[str, Any], status: str):
+        if not item["job_id"]:
+            return
+        for listener in self._listeners:
+            try:
+                listener(item["job_id"], status)
+            except Exception as e:
+                print(f"Warning: Callback listener failed: {e}")
+
+
+# Singleton instance (worker starts on first enqueue or at app startup)
+callback_outbox = CallbackOutbox()
@@ -0,0 +1,813 @@
+"""Background deployment pipeline for student task requests.
+
+The student API validates a request, enqueues a deployment job and returns
+immediately. The job then flows through a chain of stages (LLM generation,
+local preflight of the js: checks, repo creation, push, Pages, evaluation
+callback). Each stage has its own
+bounded queue and worker pool sized in ``config.Config``, so a backlog in one
+stage (e.g. slow Pages builds) applies backpressure upstream instead of
+starving the others. LLM calls use the async client on the event loop;
+other blocking steps run in worker threads. The repository
+is usually created while the LLM is still generating; the create_repo stage
+then only handles requests where that did not happen.
+
+Every job is mirrored in the ``deployments`` table after each stage, so after
+a restart unfinished deployments resume from their last completed stage.
+"""
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+
+from utils.llm_client import async_llm_client, rate_limiter
+from utils.github_helper import github_helper, repo_pool, RepoExistsError
+from utils.pages_watcher import pages_watcher
+from utils.callback_outbox import callback_outbox
+from utils.generation_cache import generation_cache
+from utils.template_reuse import template_reuse
+from utils.preflight import preflight
+from utils import attachments, metrics, tracing
+from database.db import get_db
+from database.models import Deployment
+from templates.task_loader import task_loader
+from config.config import config
+
+
+class DeploymentJob:
+    """A queued deployment and its progress."""
+
+    def __init__(self, request: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"  # queued, running, completed, failed
+        self.stage = "queued"
+        self.error: Optional[str] = None
+        self.result: Dict[str, Any] = {}
+        self.files: Dict[str, str] = {}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.timings: Dict[str, float] = {}  # seconds spent working in each stage
+        self.waits: Dict[str, float] = {}  # seconds spent queued before each stage
+        self.completed_stages: List[str] = []
+        self._enqueued_at = self.created_at
+        self._stage_started: Optional[float] = None
+
+    def enqueue(self, stage: str):
+        """Record that the job is waiting in a stage's queue."""
+        self.status = "queued"
+        self.stage = stage
+        self._enqueued_at = time.time()
+
+    def begin(self, stage: str) -> float:
+        """Record that a stage worker picked up the job; return the queue wait."""
+        now = time.time()
+        waited = now - self._enqueued_at
+        self.waits[stage] = round(waited, 3)
+        self.status = "running"
+        self.stage = stage
+        self.started_at = self.started_at or now
+        self._stage_started = now
+        return waited
+
+    def end(self, stage: str) -> float:
+        """Record that a stage finished; return the time spent in it."""
+        elapsed = time.time() - (self._stage_started or time.time())
+        self.timings[stage] = round(elapsed, 3)
+        self._stage_started = None
+        return elapsed
+
+    def finish(self, status: str, error: Optional[str] = None):
+        """Mark the job as finished."""
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        if status == "completed":
+            self.stage = "completed"
+
+    @classmethod
+    def from_row(cls, row: Deployment) -> "DeploymentJob":
+        """Rebuild a job from its persisted deployment row."""
+        job = cls(row.request)
+        job.id = row.job_id
+        job.status = row.status
+        job.stage = row.stage or "queued"
+        job.error = row.error
+        job.result = dict(row.result or {})
+        job.files = dict(row.files or {})
+        job.timings = dict(row.timings or {})
+        job.completed_stages = list(row.completed_stages or [])
+        job.created_at = row.created_at.timestamp() if row.created_at else job.created_at
+        if row.status in ("completed", "failed") and row.updated_at:
+            job.finished_at = row.updated_at.timestamp()
+        return job
+
+    @property
+    def trace_id(self) -> str:
+        return self.request.get("trace_id") or tracing.trace_id_for(self.request["nonce"])
+
+    def files_hash(self) -> Optional[str]:
+        if not self.files:
+            return None
+        return hashlib.sha256(json.dumps(self.files, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def to_row(self, row: Deployment):
+        """Copy the job's state and stage outputs onto its deployment row."""
+        row.job_id = self.id
+        row.email = self.request["email"]
+        row.task = self.request["task"]
+        row.round = int(self.request["round"])
+        row.nonce = self.request["nonce"]
+        row.request = self.request
+        row.status = self.status
+        row.stage = self.stage
+        row.completed_stages = list(self.completed_stages)
+        row.files = self.files or None
+        row.files_hash = self.files_hash()
+        row.repo_name = self.result.get("repo_name")
+        row.repo_url = self.result.get("repo_url")
+        row.commit_sha = self.result.get("commit_sha")
+        row.pages_url = self.result.get("pages_url")
+        row.pages_status = self.result.get("pages_status")
+        row.callback_status = self.result.get("callback_status")
+        row.result = dict(self.result)
+        row.timings = dict(self.timings)
+        row.error = self.error
+
+    def to_dict(self) -> Dict[str, Any]:
+        def iso(ts: Optional[float]) -> Optional[str]:
+            return datetime.utcfromtimestamp(ts).isoformat() if ts else None
+
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "email": self.request.get("email"),
+            "task": self.request.get("task"),
+            "round": self.request.get("round"),
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "trace_id": self.trace_id,
+            "result": self.result,
+            "created_at": iso(self.created_at),
+            "started_at": iso(self.started_at),
+            "finished_at": iso(self.finished_at),
+            "total_seconds": round(end - self.created_at, 3),
+            "timings": dict(self.timings),
+            "waits": dict(self.waits),
+            "completed_stages": list(self.completed_stages),
+        }
+
+
+class PipelineStage:
+    """A pipeline stage: a bounded queue drained by a fixed number of workers."""
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[DeploymentJob], Awaitable[None]],
+        concurrency: int,
+        queue_size: int,
+    ):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.service_total = 0.0
+        self.blocked_total = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.processed + self.failed
+        return {
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "busy": self.busy,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_wait_seconds": round(self.wait_total / done, 3) if done else 0.0,
+            "max_wait_seconds": round(self.wait_max, 3),
+            "avg_service_seconds": round(self.service_total / done, 3) if done else 0.0,
+            "blocked_seconds": round(self.blocked_total, 3),
+        }
+
+
+class DeploymentPipeline:
+    """Staged deployment pipeline with per-stage concurrency and backpressure."""
+
+    def __init__(self):
+        self.jobs: Dict[str, DeploymentJob] = {}
+        self._by_key: Dict[Tuple[str, str, int, str], DeploymentJob] = {}
+        self.stages: List[PipelineStage] = [
+            PipelineStage("generate", self._generate,
+                          config.PIPELINE_LLM_CONCURRENCY, config.DEPLOYMENT_QUEUE_SIZE),
+            PipelineStage("preflight", self._preflight,
+                          config.PIPELINE_PREFLIGHT_CONCURRENCY, config.PIPELINE_STAGE_QUEUE_SIZE),
+            PipelineStage("create_repo", self._create_repo,
+                          config.PIPELINE_REPO_CONCURRENCY, config.PIPELINE_STAGE_QUEUE_SIZE),
+            PipelineStage("push", self._push,
+                          config.PIPELINE_PUSH_CONCURRENCY, config.PIPELINE_STAGE_QUEUE_SIZE),
+            PipelineStage("pages", self._pages,
+                          config.PIPELINE_PAGES_CONCURRENCY, config.PIPELINE_STAGE_QUEUE_SIZE),
+            PipelineStage("callback", self._callback,
+                          config.PIPELINE_CALLBACK_CONCURRENCY, config.PIPELINE_STAGE_QUEUE_SIZE),
+        ]
+        self._tasks: List[asyncio.Task] = []
+        self._repo_slots: Optional[asyncio.Semaphore] = None  # bounds stage + speculative creates
+        self._resumed = False
+        callback_outbox.add_listener(self._on_callback_settled)
+
+    def start(self):
+        """Start all stage workers on the running event loop (idempotent)."""
+        if self._tasks:
+            return
+        self._repo_slots = asyncio.Semaphore(max(1, config.PIPELINE_REPO_CONCURRENCY))
+        repo_pool.start()
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.queue_size)
+            metrics.PIPELINE_QUEUE_DEPTH.labels(stage.name).set_function(stage.queue.qsize)
+            metrics.PIPELINE_STAGE_BUSY.labels(stage.name).set_function(lambda s=stage: s.busy)
+            self._tasks.extend(
+                asyncio.create_task(self._worker(stage, i))
+                for i in range(stage.concurrency)
+            )
+        print("✓ Deployment pipeline started: " + ", ".join(
+            f"{s.name}={s.concurrency}" for s in self.stages
+        ))
+
+    async def stop(self):
+        """Cancel all workers."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await preflight.close()
+
+    @staticmethod
+    def deployment_key(request: Dict[str, Any]) -> Tuple[str, str, int, str]:
+        """Idempotency key of a task request."""
+        return (request["email"], request["task"], int(request["round"]), request["nonce"])
+
+    async def submit(self, request: Dict[str, Any]) -> Tuple[DeploymentJob, bool]:
+        """Persist and enqueue a deployment job at the first stage.
+
+        A request whose (email, task, round, nonce) matches an in-flight or
+        completed deployment is not deployed again; the existing job is
+        returned instead. Failed jobs may be retried.
+
+        Returns:
+            (job, created) where created is False for a duplicate request
+
+        Raises:
+            asyncio.QueueFull if the pipeline intake is saturated
+        """
+        self.start()
+        key = self.deployment_key(request)
+        existing = self._by_key.get(key)
+        if existing is None:
+            loaded = await asyncio.to_thread(self._load_by_key, key)
+            existing = self._by_key.get(key) or loaded
+        if existing and existing.status != "failed":
+            return existing, False
+
+        first = self.stages[0]
+        if first.queue.full():
+            raise asyncio.QueueFull()
+        job = DeploymentJob(request)
+        if existing:
+            job.id = existing.id  # reuse the failed deployment's row
+        job.enqueue(first.name)
+        self._track(job)  # before any await, so concurrent duplicates attach to it
+        await asyncio.to_thread(self._save, job)
+        try:
+            first.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            job.finish("failed", "Deployment queue is full")
+            await asyncio.to_thread(self._save, job)
+            raise
+        return job, True
+
+    async def resume(self):
+        """Re-enqueue unfinished deployments from their last completed stage."""
+        if self._resumed:
+            return
+        self._resumed = True
+        self.start()
+        callback_outbox.start()  # delivers callbacks left pending by a restart
+        jobs = await asyncio.to_thread(self._load_unfinished)
+        for job in jobs:
+            stage = next(
+                (s for s in self.stages if s.name not in job.completed_stages), None
+            )
+            if stage is None:
+                job.finish("completed")
+                await asyncio.to_thread(self._save, job)
+                continue
+            print(f"Resuming deployment {job.id} ({job.request['task']}) at stage {stage.name}")
+            job.enqueue(stage.name)
+            self._track(job)
+            await stage.queue.put(job)
+        if jobs:
+            print(f"✓ Resumed {len(jobs)} unfinished deployments")
+
+    def get_job(self, job_id: str) -> Optional[DeploymentJob]:
+        return self.jobs.get(job_id)
+
+    async def find_job(self, job_id: str) -> Optional[DeploymentJob]:
+        """Look a job up in memory, falling back to the deployments table."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            job = await asyncio.to_thread(self._load_by_job_id, job_id)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-stage queue depth, wait times and job counts."""
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "stages": {stage.name: stage.stats() for stage in self.stages},
+            "jobs": counts,
+            "pages_watcher": pages_watcher.stats(),
+            "generation_cache": generation_cache.stats(),
+            "template_reuse": template_reuse.stats(),
+            "repo_pool": repo_pool.stats(),
+            "llm_rate_limiter": rate_limiter.stats(),
+            "preflight": preflight.stats(),
+        }
+
+    def _track(self, job: DeploymentJob):
+        self.jobs[job.id] = job
+        self._by_key[self.deployment_key(job.request)] = job
+        self._prune_history()
+
+    def _save(self, job: DeploymentJob):
+        """Upsert the job's deployment row."""
+        with get_db() as db:
+            row = db.query(Deployment).filter(Deployment.job_id == job.id).first()
+            if row is None:
+                row = Deployment()
+                db.add(row)
+            job.to_row(row)
+
+    def _load_by_key(self, key: Tuple[str, str, int, str]) -> Optional[DeploymentJob]:
+        email, task, round_num, nonce = key
+        with get_db() as db:
+            row = db.query(Deployment).filter(
+                Deployment.email == email,
+                Deployment.task == task,
+                Deployment.round == round_num,
+                Deployment.nonce == nonce
+            ).first()
+            return DeploymentJob.from_row(row) if row else None
+
+    def _load_by_job_id(self, job_id: str) -> Optional[DeploymentJob]:
+        with get_db() as db:
+            row = db.query(Deployment).filter(Deployment.job_id == job_id).first()
+            return DeploymentJob.from_row(row) if row else None
+
+    def _load_revision_base(self, request: Dict[str, Any]) -> Optional[DeploymentJob]:
+        """Latest completed deployment of the previous round of the same template.
+
+        Task ids are "{template}-{hash}", and the hash differs between rounds.
+        """
+        template = request["task"].rsplit("-", 1)[0]
+        with get_db() as db:
+            rows = db.query(Deployment).filter(
+                Deployment.email == request["email"],
+                Deployment.round == int(request["round"]) - 1,
+                Deployment.status == "completed"
+            ).order_by(Deployment.created_at.desc()).all()
+            for row in rows:
+                if row.task.rsplit("-", 1)[0] == template and row.files and row.repo_name:
+                    return DeploymentJob.from_row(row)
+        return None
+
+    def _load_unfinished(self) -> List[DeploymentJob]:
+        with get_db() as db:
+            rows = db.query(Deployment).filter(
+                Deployment.status.in_(["queued", "running"])
+            ).order_by(Deployment.created_at).all()
+            return [DeploymentJob.from_row(row) for row in rows]
+
+    def _prune_history(self):
+        """Forget the oldest finished jobs beyond the configured history size."""
+        finished = [j for j in self.jobs.values() if j.finished_at]
+        excess = len(finished) - config.DEPLOYMENT_JOB_HISTORY
+        if excess <= 0:
+            return
+        finished.sort(key=lambda j: j.finished_at)
+        for job in finished[:excess]:
+            self.jobs.pop(job.id, None)
+            key = self.deployment_key(job.request)
+            if self._by_key.get(key) is job:
+                del self._by_key[key]
+
+    def _next_stage(self, stage: PipelineStage) -> Optional[PipelineStage]:
+        index = self.stages.index(stage)
+        return self.stages[index + 1] if index + 1 < len(self.stages) else None
+
+    async def _worker(self, stage: PipelineStage, index: int):
+        while True:
+            job = await stage.queue.get()
+            waited = job.begin(stage.name)
+            stage.wait_total += waited
+            stage.wait_max = max(stage.wait_max, waited)
+            metrics.PIPELINE_STAGE_WAIT_SECONDS.labels(stage.name).observe(waited)
+            now = time.time()
+            tracing.record(f"queue.{stage.name}", now - waited, now, trace_id=job.trace_id)
+            stage.busy += 1
+            outcome = "ok"
+            try:
+                with tracing.span(f"stage.{stage.name}", trace_id=job.trace_id, job_id=job.id):
+                    await stage.handler(job)
+                job.completed_stages.append(stage.name)
+                stage.processed += 1
+            except Exception as e:
+                outcome = "error"
+                stage.failed += 1
+                print(f"Deployment job {job.id} failed in {stage.name}: {e}")
+                job.finish("failed", f"{stage.name}: {e}")
+            finally:
+                elapsed = job.end(stage.name)
+                stage.service_total += elapsed
+                metrics.PIPELINE_STAGE_SECONDS.labels(stage.name, outcome).observe(elapsed)
+                stage.busy -= 1
+                stage.queue.task_done()
+
+            next_stage = self._next_stage(stage) if job.status != "failed" else None
+            if next_stage is None and job.status != "failed":
+                job.finish("completed")
+            elif next_stage is not None:
+                job.enqueue(next_stage.name)
+            if job.finished_at:
+                metrics.DEPLOYMENTS_TOTAL.labels(job.status).inc()
+                metrics.DEPLOYMENT_SECONDS.labels(job.status).observe(job.finished_at - job.created_at)
+            try:
+                await asyncio.to_thread(self._save, job)
+            except Exception as e:
+                print(f"Warning: Failed to persist deployment {job.id}: {e}")
+
+            if next_stage is not None:
+                # Blocks while the next stage's queue is full (backpressure)
+                blocked_since = time.time()
+                await next_stage.queue.put(job)
+                stage.blocked_total += time.time() - blocked_since
+
+    async def _generate(self, job: DeploymentJob):
+        """Generate app files using the LLM.
+
+        Unless the previous round's repo is being revised, the repository is
+        created speculatively while the LLM runs and deleted again if
+        generation fails.
+        """
+        task = job.request
+        print(f"Generating app for task: {task['task']}")
+        started = time.time()
+        files_ready = job.result.setdefault("files_ready", [])
+
+        def on_file(name: str, content: str):
+            files_ready.append({"file": name, "bytes": len(content),
+                                "seconds": round(time.time() - started, 3)})
+
+        if int(task["round"]) > 1 and config.REVISION_MODE_ENABLED:
+            if await self._revise(job, on_file):
+                return
+
+        speculative = None
+        if config.PIPELINE_SPECULATIVE_REPO and not job.result.get("repo_name"):
+            speculative = asyncio.create_task(self._create_repo_speculatively(job, started))
+        try:
+            await self._generate_files(job, on_file)
+        except Exception:
+            if speculative:
+                await self._rollback_repo(job, speculative)
+            raise
+        if speculative:
+            await speculative
+            created = job.timings.get("create_repo_overlapped")
+            if created is not None:
+                # Creation time hidden behind generation (it ran entirely inside this stage)
+                job.result["overlap_seconds"] = round(min(created, time.time() - started), 3)
+
+    async def _generate_files(self, job: DeploymentJob, on_file: Callable[[str, str], None]):
+        task = job.request
+        if config.TEMPLATE_REUSE_ENABLED:
+            reused = await template_reuse.generate(
+                task["brief"], task["checks"], task.get("attachments") or [], on_file,
+            )
+            if reused:
+                job.files, match = reused
+                job.result["template"] = {key: match[key] for key in ("template_id", "round", "variant")}
+                return
+
+        job.files = await async_llm_client.generate_app(
+            brief=task["brief"],
+            checks=task["checks"],
+            attachments=task.get("attachments") or [],
+            on_file=on_file,
+        )
+
+    async def _create_repo_speculatively(self, job: DeploymentJob, generate_started: float) -> Optional[str]:
+        """Create the repo during generation; on failure leave it to the create_repo stage.
+
+        Generation may still fail, so an existing repo of the same name (e.g.
+        from an earlier deploy) is never replaced here; that decision waits
+        for the create_repo stage. Returns the name of the repo created.
+        """
+        began = time.time()
+        try:
+            await self._create_repository(job, replace_existing=False)
+        except RepoExistsError:
+            print("Repository already exists, leaving it to the create_repo stage")
+            return None
+        except Exception as e:
+            print(f"⚠ Speculative repo creation failed ({str(e)[:200]}), will retry after generation")
+            return None
+        job.timings["create_repo_overlapped"] = round(time.time() - began, 3)
+        metrics.PIPELINE_STEP_SECONDS.labels("create_repo_overlapped").observe(time.time() - began)
+        job.result["create_repo_started_at"] = round(began - generate_started, 3)  # offset into generate
+        return job.result["repo_name"]
+
+    async def _rollback_repo(self, job: DeploymentJob, speculative: asyncio.Task):
+        """Delete the repo the speculative creation made, after generation failed."""
+        repo_name = (await asyncio.gather(speculative, return_exceptions=True))[0]
+        if not isinstance(repo_name, str):
+            return  # nothing was created by this job
+        job.result.pop("repo_name", None)
+        job.result.pop("repo_url", None)
+        job.result.pop("pooled_repo", None)
+        job.result.pop("create_repo_started_at", None)
+        job.timings.pop("create_repo_overlapped", None)
+        print(f"Rolling back speculative repository {repo_name}")
+        try:
+            await asyncio.to_thread(github_helper.delete_repo, repo_name)
+        except Exception as e:
+            print(f"Warning: Failed to delete speculative repository {repo_name}: {e}")
+
+    async def _revise(self, job: DeploymentJob, on_file: Callable[[str, str], None]) -> bool:
+        """Patch the previous round's app in place; return False to regenerate instead."""
+        task = job.request
+        base = await asyncio.to_thread(self._load_revision_base, task)
+        if base is None:
+            print(f"No previous deployment to revise for {task['task']}, generating from scratch")
+            return False
+        repo_name = base.result["repo_name"]
+        print(f"Revising {repo_name} from deployment {base.id}")
+        try:
+            changed = await async_llm_client.generate_revision(
+                brief=task["brief"],
+                checks=task["checks"],
+                files=base.files,
+                attachments=task.get("attachments") or [],
+            )
+        except Exception as e:
+            print(f"⚠ Revision of {repo_name} failed ({str(e)[:200]}), generating from scratch")
+            return False
+        for name, content in changed.items():
+            on_file(name, content)
+        job.files = {**base.files, **changed}
+        job.result.update({
+            "revision_of": base.id,
+            "repo_name": repo_name,
+            "repo_url": base.result["repo_url"],
+            "base_commit_sha": base.result.get("commit_sha"),
+            "changed_files": sorted(changed),
+        })
+        return True
+
+    async def _preflight(self, job: DeploymentJob):
+        """Run the task's js: checks against the files locally before anything is pushed.
+
+        A failing build is repaired with targeted index.html edits (up to
+        config.PREFLIGHT_MAX_REPAIRS times); when a repair cannot be produced
+        or applied, the app is regenerated instead (up to
+        config.PREFLIGHT_MAX_REGENERATIONS times). Each fix starts from the
+        build that passed the most checks so far, and that build is deployed.
+        """
+        if not config.PREFLIGHT_ENABLED:
+            return
+        task = job.request
+        template = await asyncio.to_thread(self._template_label, job)
+        attachment_files = attachments.as_files(task.get("attachments") or [])
+        runs = []
+        best = None
+        repairs = regenerations = 0
+        fix = "generate"
+        while True:
+            result = await preflight.run({**job.files, **attachment_files}, task["checks"], template)
+            if result is None:
+                if best is None:
+                    return  # no js: checks, or no browser to run them
+                # The browser went away after a fix: deploy the best build that was checked
+                runs.append({"fix": fix, "skipped": True})
+                break
+            runs.append({"fix": fix, "passed": result["passed"], "failed": len(result["failed"]),
+                         "seconds": result["seconds"]})
+            if best is None or len(result["failed"]) < len(best[2]["failed"]):
+                best = (job.files, job.result.get("changed_files"), result)
+            if result["passed"]:
+                break
+
+            # Never build on a fix that made things worse
+            job.files = best[0]
+            if best[1] is not None:
+                job.result["changed_files"] = best[1]
+            print(f"⚠ Preflight failed {len(best[2]['failed'])} check(s) for {task['task']}")
+            fix = None
+            if repairs < config.PREFLIGHT_MAX_REPAIRS:
+                repairs += 1
+                fix = "repair" if await self._repair(job, best[2]) else None
+            if fix is None and regenerations < config.PREFLIGHT_MAX_REGENERATIONS:
+                regenerations += 1
+                fix = "regenerate" if await self._regenerate(job, best[2]) else None
+            if fix is None:
+                break
+
+        job.files, changed_files, result = best
+        if changed_files is not None:
+            job.result["changed_files"] = changed_files
+        job.result["preflight"] = {
+            "template": template,
+            "passed": result["passed"],
+            "failed": result["failed"],
+            "errors": result["errors"],
+            "runs": runs,
+        }
+        if result["passed"]:
+            print(f"✓ Preflight passed for {task['task']} ({len(runs)} run(s))")
+        else:
+            print(f"⚠ Deploying {task['task']} with {len(result['failed'])} check(s) failing in preflight")
+
+    async def _repair(self, job: DeploymentJob, result: Dict[str, Any]) -> bool:
+        """Patch index.html for the failed checks; False if no usable repair came back."""
+        print(f"Repairing index.html for {job.request['task']}")
+        try:
+            changed = await async_llm_client.generate_repair(
+                brief=job.request["brief"],
+                failures=[r for r in result["checks"] if not r["passed"]],
+                files=job.files,
+                errors=result["errors"],
+            )
+        except Exception as e:
+            print(f"⚠ Repair failed: {str(e)[:200]}")
+            return False
+        job.files = {**job.files, **changed}
+        if job.result.get("revision_of"):
+            job.result["changed_files"] = sorted(set(job.result["changed_files"]) | set(changed))
+        return True
+
+    async def _regenerate(self, job: DeploymentJob, result: Dict[str, Any]) -> bool:
+        """Generate the app again with a failed preflight as feedback; False on failure."""
+        task = job.request
+        brief = task["brief"] + preflight.feedback(result)
+        print(f"Regenerating app for {task['task']}")
+        try:
+            if job.result.get("revision_of"):
+                changed = await async_llm_client.generate_revision(
+                    brief=brief,
+                    checks=task["checks"],
+                    files=job.files,
+                    attachments=task.get("attachments") or [],
+                )
+                job.files = {**job.files, **changed}
+                job.result["changed_files"] = sorted(set(job.result["changed_files"]) | set(changed))
+                return True
+            # The cached generation is the one that failed, so bypass the cache
+            job.files = await async_llm_client.generate_app(
+                brief=brief,
+                checks=task["checks"],
+                attachments=task.get("attachments") or [],
+                use_cache=False,
+            )
+        except Exception as e:
+            print(f"⚠ Regeneration after preflight failed: {str(e)[:200]}")
+            return False
+        return True
+
+    @staticmethod
+    def _template_label(job: DeploymentJob) -> str:
+        """Template/round a job's task was generated from, for per-template stats."""
+        match = job.result.get("template") or task_loader.match_task(job.request["brief"], job.request["checks"])
+        return f"{match['template_id']}/round{match['round']}" if match else "unmatched"
+
+    async def _create_repo(self, job: DeploymentJob):
+        """Create the repository unless it is reused or was created during generation."""
+        if job.result.get("revision_of"):
+            print(f"Reusing repository {job.result['repo_name']} for revision")
+            return
+        if job.result.get("repo_name"):
+            return  # already created during generation
+        await self._create_repository(job)
+
+    async def _create_repository(self, job: DeploymentJob, replace_existing: bool = True):
+        """Create the repository with collision handling (auto-suffix).
+
+        With replace_existing=False an existing repo of the same name raises
+        RepoExistsError instead of being replaced.
+        """
+        task = job.request
+        repo_name = f"{task['task']}-{task['round']}".replace("_", "-").lower()
+        attempt = 0
+        while True:
+            try:
+                print(f"Creating repository: {repo_name}")
+                description = f"Task: {task['task']} Round {task['round']}"
+                async with self._repo_slots:
+                    repo_url = await asyncio.to_thread(repo_pool.claim, repo_name, description)
+                    pooled = repo_url is not None
+                    if repo_url is None:
+                        repo_url = await asyncio.to_thread(
+                            github_helper.create_repo,
+                            repo_name=repo_name,
+                            description=description,
+                            replace_existing=replace_existing,
+                        )
+                break
+            except RepoExistsError:
+                raise
+            except Exception as ce:
+                msg = str(ce).lower()
+                if "already exists" in msg and attempt < 3:
+                    attempt += 1
+                    suffix = str(int(datetime.utcnow().timestamp()))
+                    repo_name = f"{repo_name}-{suffix}"
+                    print(f"Repository exists, retrying with name: {repo_name}")
+                    continue
+                raise
+        job.result.update({"repo_name": repo_name, "repo_url": repo_url})
+        if pooled:
+            job.result["pooled_repo"] = True  # its placeholder main may be replaced
+
+    async def _push(self, job: DeploymentJob):
+        """Push files (including gh-pages branch for auto Pages deployment)."""
+        # Attachment data is deployed next to the app rather than generated into it
+        attachment_files = attachments.as_files(job.request.get("attachments") or [])
+        if job.result.get("revision_of"):
+            changed = {name: job.files[name] for name in job.result["changed_files"]}
+            changed.update(attachment_files)
+            print(f"Pushing revision ({', '.join(changed)}) to repository")
+            job.result["commit_sha"] = await asyncio.to_thread(
+                github_helper.push_revision, job.result["repo_name"], changed,
+                message=f"Round {job.request['round']}: {job.request['task']}", also_gh_pages=True
+            )
+            return
+        print(f"Pushing files to repository")
+        job.result["commit_sha"] = await asyncio.to_thread(
+            github_helper.push_files, job.result["repo_name"], {**job.files, **attachment_files},
+            also_gh_pages=True, replace_main=bool(job.result.get("pooled_repo")),
+        )
+
+    async def _pages(self, job: DeploymentJob):
+        """Enable GitHub Pages and wait for the site to be available."""
+        repo_name = job.result["repo_name"]
+        print(f"Enabling GitHub Pages")
+        with metrics.timed(metrics.PIPELINE_STEP_SECONDS, step="pages_enable"):
+            pages_url = await asyncio.to_thread(github_helper.enable_github_pages, repo_name)
+        job.result["pages_url"] = pages_url
+
+        print(f"Waiting for GitHub Pages to be available")
+        # A revised site already serves the previous round, so wait for the new commit's build
+        commit_sha = job.result.get("commit_sha") if job.result.get("revision_of") else None
+        with metrics.timed(metrics.PIPELINE_STEP_SECONDS, step="pages_wait"):
+            ready = await pages_watcher.wait(
+                repo_name, pages_url, timeout=config.GITHUB_PAGES_TIMEOUT, commit_sha=commit_sha
+            )
+        pages_status = await asyncio.to_thread(github_helper.get_pages_build_status, repo_name)
+        job.result.update({"pages_ready": ready, "pages_status": pages_status.get("status")})
+
+    async def _callback(self, job: DeploymentJob):
+        """Queue the evaluation response in the durable callback outbox."""
+        task = job.request
+        evaluation_data = {
+            "email": task["email"],
+            "task": task["task"],
+            "round": task["round"],
+            "nonce": task["nonce"],
+            "repo_url": job.result["repo_url"],
+            "commit_sha": job.result["commit_sha"],
+            "pages_url": job.result["pages_url"],
+        }
+        print(f"Queueing evaluation response to {task['evaluation_url']}")
+        job.result["callback_id"] = await callback_outbox.enqueue(
+            task["evaluation_url"], evaluation_data, job_id=job.id
+        )
+        job.result.setdefault("callback_status", "pending")
+
+    def _on_callback_settled(self, job_id: str, status: str):
+        job = self.jobs.get(job_id)
+        if job:
+            job.result["callback_status"] = status
+
+
+# Singleton instance (workers start on first submission)
+deployment_pipeline = DeploymentPipeline()
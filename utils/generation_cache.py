@@ -0,0 +1,233 @@
+"""Content-addressed cache for generated apps.
+
+Entries live in the ``generation_cache`` table, keyed by a sha256 of the
+normalized generation inputs and the model. The table is bounded by entry
+count and total size and evicts least recently used entries first.
+Concurrent calls for the same key are collapsed so only one of them reaches
+the LLM; the others wait for its result (threads via ``get_or_generate``,
+coroutines via ``aget_or_generate``).
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Tuple, Awaitable
+
+from sqlalchemy import func
+
+from database.db import get_db
+from database.models import GenerationCacheEntry
+from config.config import config
+
+
+class _Flight:
+    """An in-progress generation that identical callers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.files: Optional[Dict[str, str]] = None
+        self.error: Optional[BaseException] = None
+
+
+class GenerationCache:
+    """SQLite/SQL-backed LRU cache of generate_app results."""
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        self.max_entries = max_entries or config.LLM_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or config.LLM_CACHE_MAX_BYTES
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0  # callers served by another caller's in-flight generation
+        self.errors = 0
+
+    @staticmethod
+    def make_key(provider: str, model: str, **inputs: Any) -> str:
+        """Hash the model and inputs (canonical JSON, so key order does not matter)."""
+        material = json.dumps(
+            {"provider": provider, "model": model, "inputs": inputs},
+            sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get_or_generate(
+        self,
+        key: str,
+        generate: Callable[[], Tuple[Dict[str, str], bool]],
+        provider: str = None,
+        model: str = None,
+    ) -> Tuple[Dict[str, str], str]:
+        """Return (files, source) where source is "hit", "collapsed" or "miss".
+
+        generate() returns (files, cacheable); degraded results (e.g. fallback
+        pages) are returned to the caller but not stored.
+        """
+        files = self.get(key)
+        if files is not None:
+            return files, "hit"
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            with self._lock:
+                self.collapsed += 1
+            return dict(flight.files), "collapsed"
+
+        try:
+            with self._lock:
+                self.misses += 1
+            files, cacheable = generate()
+            flight.files = files
+            if cacheable:
+                self.put(key, files, provider, model)
+            return files, "miss"
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def aget_or_generate(
+        self,
+        key: str,
+        generate: Callable[[], Awaitable[Tuple[Dict[str, str], bool]]],
+        provider: str = None,
+        model: str = None,
+    ) -> Tuple[Dict[str, str], str]:
+        """Async variant of get_or_generate for callers on one event loop."""
+        files = await asyncio.to_thread(self.get, key)
+        if files is not None:
+            return files, "hit"
+
+        flight = self._async_flights.get(key)
+        if flight is not None:
+            # shield: a cancelled waiter must not cancel the leader's result
+            files = await asyncio.shield(flight)
+            with self._lock:
+                self.collapsed += 1
+            return dict(files), "collapsed"
+
+        flight = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            with self._lock:
+                self.misses += 1
+            files, cacheable = await generate()
+            flight.set_result(files)
+            if cacheable:
+                await asyncio.to_thread(self.put, key, files, provider, model)
+            return files, "miss"
+        except BaseException as e:
+            if not flight.done():
+                if isinstance(e, asyncio.CancelledError):
+                    e = Exception("Generation was cancelled")
+                flight.set_exception(e)
+                flight.exception()  # mark retrieved; there may be no waiters
+            raise
+        finally:
+            self._async_flights.pop(key, None)
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        try:
+            with get_db() as db:
+                row = db.query(GenerationCacheEntry).filter(GenerationCacheEntry.key == key).first()
+                if row is None:
+                    return None
+                row.hits += 1
+                row.last_used_at = datetime.utcnow()
+                files = dict(row.files)
+        except Exception as e:
+            self._warn("lookup", e)
+            return None
+        with self._lock:
+            self.hits += 1
+        return files
+
+    def put(self, key: str, files: Dict[str, str], provider: str = None, model: str = None):
+        size = sum(len(content.encode("utf-8")) for content in files.values())
+        if size > self.max_bytes:
+            return
+        try:
+            with get_db() as db:
+                row = db.query(GenerationCacheEntry).filter(GenerationCacheEntry.key == key).first()
+                if row is None:
+                    row = GenerationCacheEntry(key=key, hits=0)
+                    db.add(row)
+                row.provider = provider
+                row.model = model
+                row.files = files
+                row.size_bytes = size
+                row.last_used_at = datetime.utcnow()
+                db.flush()
+                self._evict(db)
+        except Exception as e:
+            self._warn("store", e)
+
+    def _evict(self, db):
+        """Drop least recently used entries until both bounds hold."""
+        count, total = db.query(
+            func.count(GenerationCacheEntry.id), func.coalesce(func.sum(GenerationCacheEntry.size_bytes), 0)
+        ).one()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        oldest = db.query(GenerationCacheEntry.id, GenerationCacheEntry.size_bytes).order_by(
+            GenerationCacheEntry.last_used_at
+        ).all()
+        doomed = []
+        for entry_id, size in oldest:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append(entry_id)
+            count -= 1
+            total -= size or 0
+        if doomed:
+            db.query(GenerationCacheEntry).filter(
+                GenerationCacheEntry.id.in_(doomed)
+            ).delete(synchronize_session=False)
+
+    def clear(self):
+        with get_db() as db:
+            db.query(GenerationCacheEntry).delete()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.collapsed
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collapsed": self.collapsed,
+            "hit_rate": round((self.hits + self.collapsed) / lookups, 3) if lookups else 0.0,
+            "in_flight": len(self._flights) + len(self._async_flights),
+            "errors": self.errors,
+        }
+        try:
+            with get_db() as db:
+                count, total = db.query(
+                    func.count(GenerationCacheEntry.id),
+                    func.coalesce(func.sum(GenerationCacheEntry.size_bytes), 0)
+                ).one()
+            stats.update({"entries": count, "size_bytes": int(total),
+                          "max_entries": self.max_entries, "max_bytes": self.max_bytes})
+        except Exception:
+            pass
+        return stats
+
+    def _warn(self, action: str, error: Exception):
+        with self._lock:
+            self.errors += 1
+        # A missing table (DB not initialised) just disables caching
+        print(f"Warning: Generation cache {action} failed: {str(error)[:200]}")
+
+
+# Singleton instance
+generation_cache = GenerationCache()
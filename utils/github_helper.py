@@ -1,13 +1,22 @@
 """GitHub API helper functions."""
 import time
-from urllib.parse import urlparse
-from typing import Dict, Optional
-from github import Github, GithubException
-from git import Repo as GitRepo
+import uuid
+import base64
+import threading
+from urllib.parse import urlparse, quote
+from typing import Dict, Optional, Union, Any, List, TYPE_CHECKING
 import os
 import tempfile
 import shutil
 from config.config import config
+from utils import metrics, tracing
+
+if TYPE_CHECKING:
+    from github import Github
+
+
+class RepoExistsError(Exception):
+    """A repository with the requested name already exists."""
 
 
 class GitHubHelper:
@@ -16,13 +25,16 @@ class GitHubHelper:
     This helper now lazily initializes the GitHub client so the app can start
     even when GITHUB_TOKEN is not provided (e.g., on Hugging Face Spaces).
     GitHub operations will raise a clear error if credentials are missing.
+    PyGithub and GitPython are imported on first use to keep startup fast.
     """
 
     def __init__(self):
         # Defer client creation to allow runtime without GH credentials
         self.token = (getattr(config, "GITHUB_TOKEN", "") or os.getenv("GITHUB_TOKEN", "")).strip()
         self.username = (getattr(config, "GITHUB_USERNAME", "") or os.getenv("GITHUB_USERNAME", "")).strip()
-        self.gh: Optional[Github] = None
+        self.api_base = config.GITHUB_API_URL.rstrip("/")
+        self.gh: Optional["Github"] = None
+        self._session = None
 
     @staticmethod
     def _is_placeholder(value: str) -> bool:
@@ -37,12 +49,21 @@ class GitHubHelper:
             raise RuntimeError(
                 "GitHub token is not configured. Set GITHUB_TOKEN as a secret/env to use GitHub features."
             )
+        from github import Github
         try:
             self.gh = Github(self.token)
         except AssertionError:
             # PyGithub asserts non-empty token; convert to helpful error
             raise RuntimeError("Invalid or empty GITHUB_TOKEN provided. Please configure a valid token.")
 
+    def _record_client_rate_limit(self):
+        """Update the rate-limit gauge from PyGithub's last response."""
+        try:
+            remaining, _limit = self.gh.rate_limiting
+            metrics.GITHUB_RATE_LIMIT_REMAINING.labels("core").set(remaining)
+        except Exception:
+            pass
+
     def has_credentials(self) -> bool:
         """Return True if both token and username appear configured."""
         return not self._is_placeholder(self.token) and not self._is_placeholder(self.username)
@@ -55,19 +76,28 @@ class GitHubHelper:
             "username": self.username if self.username and not self._is_placeholder(self.username) else "",
         }
     
-    def create_repo(self, repo_name: str, description: str = "") -> str:
-        """Create a new GitHub repository."""
+    def create_repo(self, repo_name: str, description: str = "", replace_existing: bool = True) -> str:
+        """Create a new GitHub repository.
+        
+        An existing repository of the same name is deleted and recreated,
+        unless replace_existing is False; then RepoExistsError is raised.
+        """
+        from github import GithubException
         try:
             self._ensure_client()
             user = self.gh.get_user()
-            repo = user.create_repo(
-                name=repo_name,
-                description=description,
-                private=False,
-                auto_init=False
-            )
+            with tracing.span("github.create_repo", repo=repo_name):
+                repo = user.create_repo(
+                    name=repo_name,
+                    description=description,
+                    private=False,
+                    auto_init=False
+                )
+            self._record_client_rate_limit()
             return repo.html_url
         except GithubException as e:
+            if e.status == 422 and not replace_existing:
+                raise RepoExistsError(f"Repository {repo_name} already exists")
             if e.status == 422:  # Repository already exists
                 # Delete and recreate
                 try:
@@ -80,17 +110,48 @@ class GitHubHelper:
                     raise Exception(f"Repository {repo_name} already exists")
             raise Exception(f"Failed to create repository: {str(e)}")
     
-    def push_files(self, repo_name: str, files: Dict[str, str], also_gh_pages: bool = False) -> str:
+    def delete_repo(self, repo_name: str):
+        """Delete a repository (no error if it does not exist)."""
+        self._ensure_client()
+        self._api_request("DELETE", f"/repos/{self.username}/{repo_name}", ok_statuses=(204, 404))
+    
+    def push_files(
+        self,
+        repo_name: str,
+        files: Dict[str, Union[str, bytes]],
+        also_gh_pages: bool = False,
+        mode: Optional[str] = None,
+        replace_main: bool = False,
+    ) -> str:
         """Push files to repository and return commit SHA.
         
         Args:
             repo_name: Name of the repository
             files: Dict of filename -> content
             also_gh_pages: If True, also push to gh-pages branch for GitHub Pages
+            mode: "api" (Git Data API, in memory) or "git" (temp-dir clone);
+                defaults to config.GITHUB_PUSH_MODE
+            replace_main: Replace an existing main branch (repos claimed from
+                the pool, whose main is only their placeholder commit); otherwise
+                the commit is added on top of an existing main
         
         Returns:
             Commit SHA of the main branch push
         """
+        if (mode or config.GITHUB_PUSH_MODE) == "api":
+            return self.push_files_api(repo_name, files, also_gh_pages=also_gh_pages, replace_main=replace_main)
+        return self.push_files_git(repo_name, files, also_gh_pages=also_gh_pages, replace_main=replace_main)
+
+    def push_files_git(
+        self, repo_name: str, files: Dict[str, Union[str, bytes]], also_gh_pages: bool = False,
+        replace_main: bool = False,
+    ) -> str:
+        """Push files by committing them in a temp dir and pushing with git.
+
+        An existing main is only overwritten with replace_main, and then with
+        --force-with-lease on the commit seen before pushing.
+        """
+        from git import Repo as GitRepo
         temp_dir = tempfile.mkdtemp()
         
         try:
@@ -98,28 +159,41 @@ class GitHubHelper:
             if self._is_placeholder(self.username):
                 raise RuntimeError("GitHub username is not configured. Set GITHUB_USERNAME to use GitHub features.")
             # Clone the repository
-            repo_url = f"https://{self.token}@github.com/{self.username}/{repo_name}.git"
+            repo_url = self._remote_url(repo_name)
             repo = GitRepo.init(temp_dir)
             
             # Create files
             for filename, content in files.items():
                 file_path = os.path.join(temp_dir, filename)
                 os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(content)
+                if isinstance(content, bytes):
+                    with open(file_path, "wb") as f:
+                        f.write(content)
+                else:
+                    with open(file_path, "w", encoding="utf-8") as f:
+                        f.write(content)
+            
+            # Add remote; build on an existing main unless it may be replaced
+            origin = repo.create_remote("origin", repo_url)
+            remote_main = repo.git.ls_remote("origin", "refs/heads/main").split("\t")[0] or None
+            parents = []
+            if remote_main and not replace_main:
+                origin.fetch("main")
+                parents = [repo.commit("FETCH_HEAD")]
+            push_options = {"force_with_lease": f"main:{remote_main}"} if remote_main and replace_main else {}
             
             # Git operations
             repo.index.add(list(files.keys()))
-            commit = repo.index.commit("Initial commit")
+            commit = repo.index.commit("Initial commit", parent_commits=parents)
             
-            # Add remote and push to main with retry logic for network issues
-            origin = repo.create_remote("origin", repo_url)
+            # Push to main with retry logic for network issues
             
             # Retry git push up to 3 times for DNS/network failures
             max_retries = 3
             for attempt in range(max_retries):
                 try:
-                    origin.push(refspec="master:main")
+                    with tracing.span("git.push", repo=repo_name, ref="main"):
+                        origin.push(refspec="HEAD:main", **push_options)
                     break  # Success, exit retry loop
                 except Exception as push_error:
                     error_msg = str(push_error)
@@ -143,7 +217,8 @@ class GitHubHelper:
                     # Retry gh-pages push with same logic
                     for attempt in range(max_retries):
                         try:
-                            origin.push(refspec="gh-pages:gh-pages", force=True)
+                            with tracing.span("git.push", repo=repo_name, ref="gh-pages"):
+                                origin.push(refspec="gh-pages:gh-pages", force=True)
                             print(f"Successfully pushed to gh-pages branch")
                             break
                         except Exception as gh_push_error:
@@ -167,12 +242,207 @@ class GitHubHelper:
         finally:
             shutil.rmtree(temp_dir, ignore_errors=True)
     
+    def _remote_url(self, repo_name: str) -> str:
+        """Authenticated HTTPS remote used by the git push path."""
+        return f"https://{self.token}@github.com/{self.username}/{repo_name}.git"
+
+    def _api_session(self):
+        """Shared keep-alive session for REST calls made outside PyGithub."""
+        import requests
+        if self._session is None:
+            session = requests.Session()
+            session.headers.update({
+                "Authorization": f"token {self.token}",
+                "Accept": "application/vnd.github+json",
+                "User-Agent": "llm-code-deployment-bot"
+            })
+            self._session = session
+        return self._session
+
+    def _api_request(self, method: str, path: str, ok_statuses=(200, 201), **kwargs) -> Any:
+        """Call the GitHub REST API, retrying network errors and 5xx responses.
+
+        Returns the response object if its status is in ok_statuses, otherwise raises.
+        """
+        import requests
+        url = f"{self.api_base}{path}"
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                with tracing.span(f"github.{method}", path=path):
+                    resp = self._api_session().request(method, url, timeout=30, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if attempt < max_retries - 1:
+                    time.sleep(2 ** attempt)
+                    continue
+                raise Exception(f"GitHub API {method} {path} failed: {e}")
+            metrics.GITHUB_REQUESTS_TOTAL.labels(method, str(resp.status_code)).inc()
+            metrics.record_rate_limit(resp.headers)
+            if resp.status_code >= 500 and attempt < max_retries - 1:
+                time.sleep(2 ** attempt)
+                continue
+            if resp.status_code not in ok_statuses:
+                raise Exception(f"GitHub API {method} {path} returned HTTP {resp.status_code}: {resp.text[:200]}")
+            return resp
+
+    def _get_ref_sha(self, repo_name: str, branch: str) -> Optional[str]:
+        """Return the commit SHA a branch points to, or None if missing or the repo is empty."""
+        resp = self._api_request(
+            "GET", f"/repos/{self.username}/{repo_name}/git/ref/heads/{branch}",
+            ok_statuses=(200, 404, 409)
+        )
+        if resp.status_code != 200:
+            return None
+        return resp.json()["object"]["sha"]
+
+    def _set_ref(self, repo_name: str, branch: str, sha: str):
+        """Point a branch at a commit, creating the branch if needed."""
+        repo_path = f"/repos/{self.username}/{repo_name}/git"
+        resp = self._api_request(
+            "PATCH", f"{repo_path}/refs/heads/{branch}",
+            ok_statuses=(200, 404, 422), json={"sha": sha, "force": True}
+        )
+        if resp.status_code != 200:
+            self._api_request(
+                "POST", f"{repo_path}/refs",
+                json={"ref": f"refs/heads/{branch}", "sha": sha}
+            )
+
+    def _create_commit(
+        self,
+        repo_name: str,
+        files: Dict[str, Union[str, bytes]],
+        message: str,
+        parents: Optional[list] = None,
+        base_tree: Optional[str] = None,
+    ) -> str:
+        """Create blobs, a tree and a commit in memory; return the commit SHA.
+
+        Text files are sent inline in the tree request (GitHub creates their
+        blobs server-side); binary files are uploaded as base64 blobs first.
+        """
+        repo_path = f"/repos/{self.username}/{repo_name}/git"
+        tree = []
+        for path, content in files.items():
+            entry = {"path": path, "mode": "100644", "type": "blob"}
+            if isinstance(content, bytes):
+                blob = self._api_request("POST", f"{repo_path}/blobs", json={
+                    "content": base64.b64encode(content).decode("ascii"),
+                    "encoding": "base64"
+                }).json()
+                entry["sha"] = blob["sha"]
+            else:
+                entry["content"] = content
+            tree.append(entry)
+
+        tree_payload: Dict[str, Any] = {"tree": tree}
+        if base_tree:
+            tree_payload["base_tree"] = base_tree
+        tree_sha = self._api_request("POST", f"{repo_path}/trees", json=tree_payload).json()["sha"]
+
+        commit = self._api_request("POST", f"{repo_path}/commits", json={
+            "message": message,
+            "tree": tree_sha,
+            "parents": parents or []
+        }).json()
+        return commit["sha"]
+
+    def push_files_api(
+        self, repo_name: str, files: Dict[str, Union[str, bytes]], also_gh_pages: bool = False,
+        replace_main: bool = False,
+    ) -> str:
+        """Push files through the Git Data API without touching the filesystem.
+
+        Creates one commit and points main (and gh-pages) at it with ref
+        updates, so both branches share one upload and no git binary is needed.
+        The commit is a root commit for new and pooled (replace_main) repos;
+        an existing main is otherwise kept as its parent.
+        """
+        try:
+            self._ensure_client()
+            if self._is_placeholder(self.username):
+                raise RuntimeError("GitHub username is not configured. Set GITHUB_USERNAME to use GitHub features.")
+            if not files:
+                raise ValueError("No files to push")
+
+            # The Git Data API rejects empty repositories; seed one file through
+            # the contents API first. The root commit below replaces it.
+            main_sha = self._get_ref_sha(repo_name, "main")
+            if main_sha is None:
+                first_path, first_content = next(iter(files.items()))
+                if isinstance(first_content, str):
+                    first_content = first_content.encode("utf-8")
+                self._api_request(
+                    "PUT", f"/repos/{self.username}/{repo_name}/contents/{quote(first_path)}",
+                    json={
+                        "message": "Initial commit",
+                        "content": base64.b64encode(first_content).decode("ascii"),
+                        "branch": "main"
+                    }
+                )
+
+            parents = [main_sha] if main_sha and not replace_main else None
+            commit_sha = self._create_commit(repo_name, files, "Initial commit", parents=parents)
+            self._set_ref(repo_name, "main", commit_sha)
+
+            if also_gh_pages:
+                print(f"Pointing gh-pages branch at {commit_sha[:7]} for automatic GitHub Pages deployment")
+                try:
+                    self._set_ref(repo_name, "gh-pages", commit_sha)
+                except Exception as gh_error:
+                    print(f"Warning: Failed to update gh-pages branch: {gh_error}")
+
+            return commit_sha
+
+        except Exception as e:
+            raise Exception(f"Failed to push files: {str(e)}")
+    
+    def push_revision(
+        self,
+        repo_name: str,
+        files: Dict[str, Union[str, bytes]],
+        message: str = "Revise app",
+        also_gh_pages: bool = False,
+    ) -> str:
+        """Commit only the given files on top of main, keeping every other file.
+
+        The new tree is built on the current main tree (base_tree), so only the
+        changed files are uploaded. Always uses the Git Data API.
+        """
+        try:
+            self._ensure_client()
+            parent_sha = self._get_ref_sha(repo_name, "main")
+            if parent_sha is None:
+                raise RuntimeError(f"Repository {repo_name} has no main branch to revise")
+            parent = self._api_request(
+                "GET", f"/repos/{self.username}/{repo_name}/git/commits/{parent_sha}"
+            ).json()
+
+            commit_sha = self._create_commit(
+                repo_name, files, message,
+                parents=[parent_sha], base_tree=parent["tree"]["sha"]
+            )
+            self._set_ref(repo_name, "main", commit_sha)
+
+            if also_gh_pages:
+                print(f"Pointing gh-pages branch at {commit_sha[:7]} for automatic GitHub Pages deployment")
+                try:
+                    self._set_ref(repo_name, "gh-pages", commit_sha)
+                except Exception as gh_error:
+                    print(f"Warning: Failed to update gh-pages branch: {gh_error}")
+
+            return commit_sha
+
+        except Exception as e:
+            raise Exception(f"Failed to push revision: {str(e)}")
+    
     def enable_github_pages(self, repo_name: str, branch: str = "main") -> str:
         """Enable GitHub Pages for a repository.
         
         Tries to enable Pages via API, but returns the expected URL regardless of success.
         GitHub may auto-enable Pages for repos with gh-pages branch.
         """
+        from github import GithubException
         pages_url = f"https://{self.username}.github.io/{repo_name}/"
         
         try:
@@ -183,13 +453,14 @@ class GitHubHelper:
             # Try creating Pages (POST)
             try:
                 print(f"Attempting to create GitHub Pages for {repo_name} via API...")
-                repo._requester.requestJson(
-                    "POST",
-                    f"/repos/{self.username}/{repo_name}/pages",
-                    input={
-                        "source": {"branch": branch, "path": "/"}
-                    }
-                )
+                with tracing.span("github.enable_pages", repo=repo_name):
+                    repo._requester.requestJson(
+                        "POST",
+                        f"/repos/{self.username}/{repo_name}/pages",
+                        input={
+                            "source": {"branch": branch, "path": "/"}
+                        }
+                    )
                 print(f"✓ GitHub Pages created successfully for {repo_name}")
                 return pages_url
             except GithubException as create_error:
@@ -245,8 +516,8 @@ class GitHubHelper:
 
         # Step 1 & 2: Trigger and/or poll the Pages build status
         if repo_name:
-            build_url = f"https://api.github.com/repos/{self.username}/{repo_name}/pages/builds/latest"
-            trigger_url = f"https://api.github.com/repos/{self.username}/{repo_name}/pages/builds"
+            build_url = f"{self.api_base}/repos/{self.username}/{repo_name}/pages/builds/latest"
+            trigger_url = f"{self.api_base}/repos/{self.username}/{repo_name}/pages/builds"
             last_status = None
             while time.time() - start_time < timeout:
                 try:
@@ -350,8 +621,9 @@ class GitHubHelper:
                 "Accept": "application/vnd.github+json",
                 "User-Agent": "llm-code-deployment-bot"
             }
-            build_url = f"https://api.github.com/repos/{self.username}/{repo_name}/pages/builds/latest"
-            resp = requests.get(build_url, headers=headers, timeout=10)
+            build_url = f"{self.api_base}/repos/{self.username}/{repo_name}/pages/builds/latest"
+            with tracing.span("github.pages_build_status", repo=repo_name):
+                resp = requests.get(build_url, headers=headers, timeout=10)
             if resp.status_code == 404:
                 return {"status": "not_found", "created_at": None, "updated_at": None, "url": None, "error": None}
             if not resp.ok:
@@ -368,5 +640,158 @@ class GitHubHelper:
             return {"status": "error", "created_at": None, "updated_at": None, "url": None, "error": str(e)}
 
 
+class RepoPool:
+    """Pool of pre-created, Pages-ready repositories with neutral names.
+
+    Repositories named ``{REPO_POOL_PREFIX}-{random}`` are created ahead of
+    time (initial commit, gh-pages branch, Pages enabled). A deployment claims
+    one and renames it to its own name, which is a single API call instead of
+    create + Pages setup. A daemon thread tops the pool up when no claim has
+    happened for REPO_POOL_QUIET_SECONDS, so refills stay out of the way of
+    bursts. Pooled repos already exist on GitHub, so after a restart the pool
+    is rebuilt by listing them.
+
+    Note: a claimed repo's creation date predates the task it serves.
+    """
+
+    def __init__(self, helper: GitHubHelper, size: int = None, prefix: str = None):
+        self.helper = helper
+        self.size = config.REPO_POOL_SIZE if size is None else size
+        self.prefix = prefix or config.REPO_POOL_PREFIX
+        self._available: List[str] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_claim = 0.0
+        self.claimed = 0
+        self.misses = 0
+        self.created = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and self.helper.has_credentials()
+
+    def start(self):
+        """Discover existing pool repos and start the refill thread (idempotent)."""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="repo-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def claim(self, repo_name: str, description: str = "") -> Optional[str]:
+        """Rename a pooled repo to repo_name and return its URL, or None if none is usable."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._last_claim = time.time()
+            if not self._available:
+                self.misses += 1
+                return None
+            pool_name = self._available.pop(0)  # each pooled repo goes to one caller only
+
+        try:
+            resp = self.helper._api_request(
+                "PATCH", f"/repos/{self.helper.username}/{pool_name}",
+                ok_statuses=(200, 422),
+                json={"name": repo_name, "description": description}
+            )
+        except Exception as e:
+            print(f"Warning: Failed to claim pooled repo {pool_name}: {e}")
+            resp = None
+        if resp is None or resp.status_code != 200:
+            # Name taken (or transient error): keep the pooled repo for the next claim
+            with self._lock:
+                self._available.insert(0, pool_name)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.claimed += 1
+        print(f"✓ Claimed pooled repo {pool_name} as {repo_name}")
+        return resp.json()["html_url"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "available": len(self._available),
+            "claimed": self.claimed,
+            "misses": self.misses,
+            "created": self.created,
+            "errors": self.errors,
+        }
+
+    def _run(self):
+        try:
+            self._discover()
+        except Exception as e:
+            print(f"Warning: Repo pool discovery failed: {e}")
+        while not self._stop.is_set():
+            quiet = time.time() - self._last_claim >= config.REPO_POOL_QUIET_SECONDS
+            if quiet and len(self._available) < self.size:
+                try:
+                    name = self._create_pooled_repo()
+                    with self._lock:
+                        self._available.append(name)
+                        self.created += 1
+                    continue  # keep filling while it stays quiet
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Warning: Repo pool refill failed: {e}")
+            self._stop.wait(config.REPO_POOL_REFILL_INTERVAL)
+
+    def _discover(self):
+        """Adopt pool repos left over from a previous run."""
+        found = []
+        page = 1
+        while True:
+            repos = self.helper._api_request(
+                "GET", "/user/repos",
+                params={"affiliation": "owner", "per_page": 100, "page": page}
+            ).json()
+            found.extend(r["name"] for r in repos if r["name"].startswith(f"{self.prefix}-"))
+            if len(repos) < 100:
+                break
+            page += 1
+        with self._lock:
+            self._available = sorted(set(self._available) | set(found))
+        if found:
+            print(f"✓ Repo pool adopted {len(found)} existing repositories")
+
+    def _create_pooled_repo(self) -> str:
+        """Create a repo with an initial commit, a gh-pages branch and Pages enabled."""
+        helper = self.helper
+        helper._ensure_client()
+        name = f"{self.prefix}-{uuid.uuid4().hex[:10]}"
+        helper._api_request("POST", "/user/repos", json={
+            "name": name,
+            "description": "Reserved",
+            "private": False,
+            "auto_init": True
+        })
+        sha = None
+        for _ in range(5):
+            # auto_init commits asynchronously on GitHub's side
+            sha = helper._get_ref_sha(name, "main")
+            if sha:
+                break
+            time.sleep(1)
+        if sha:
+            helper._set_ref(name, config.GITHUB_PAGES_BRANCH, sha)
+            helper._api_request(
+                "POST", f"/repos/{helper.username}/{name}/pages",
+                ok_statuses=(201, 409, 422),
+                json={"source": {"branch": config.GITHUB_PAGES_BRANCH, "path": "/"}}
+            )
+        return name
+
+
 # Singleton instance (no immediate GH API initialization)
 github_helper = GitHubHelper()
+
+# Singleton pool (refill thread starts with the deployment pipeline)
+repo_pool = RepoPool(github_helper)
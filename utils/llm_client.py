@@ -1,7 +1,330 @@
 """LLM client for code generation."""
 import os
-from typing import Optional, Dict, Any
+import re
+import time
+import random
+import hashlib
+import asyncio
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, Callable, Iterator, AsyncIterator, List, Tuple
 from config.config import config
+from utils.generation_cache import generation_cache
+from utils.attachments import is_file_attachment, describe as describe_attachment
+from utils import metrics, tracing
+
+
+# Permissive Gemini safety settings for code generation
+GEMINI_SAFETY_SETTINGS = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_NONE"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_NONE"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_NONE"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_NONE"
+    },
+]
+
+
+class IncrementalFileParser:
+    """Split a streamed LLM response into files on [FILE: ...] / [END FILE] markers.
+
+    Feed chunks as they arrive; each call returns the files whose [END FILE]
+    marker has been seen, so callers can act on a file before generation ends.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, str] = {}
+        self._buffer = ""
+        self._current_file: Optional[str] = None
+        self._current_content: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Consume a chunk and return files completed by it."""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        completed = []
+        for line in lines:
+            done = self._feed_line(line)
+            if done:
+                completed.append(done)
+        return completed
+
+    def close(self) -> List[Tuple[str, str]]:
+        """Flush the remaining buffer; an unterminated last file is kept if non-empty."""
+        completed = []
+        if self._buffer:
+            done = self._feed_line(self._buffer)
+            self._buffer = ""
+            if done:
+                completed.append(done)
+        if self._current_file and self._current_content:
+            completed.append(self._save())
+        self._current_file = None
+        return completed
+
+    def _save(self) -> Tuple[str, str]:
+        name, content = self._current_file, "\n".join(self._current_content).strip()
+        self.files[name] = content
+        return name, content
+
+    def _feed_line(self, line: str) -> Optional[Tuple[str, str]]:
+        done = None
+        if line.startswith("[FILE:") and "]" in line:
+            # Save previous file
+            if self._current_file:
+                done = self._save()
+            # Start new file
+            self._current_file = line.split("[FILE:")[1].split("]")[0].strip()
+            self._current_content = []
+        elif line.startswith("[END FILE]"):
+            if self._current_file:
+                done = self._save()
+                self._current_file = None
+                self._current_content = []
+        elif self._current_file:
+            self._current_content.append(line)
+        return done
+
+
+EDIT_BLOCK = re.compile(
+    r"\[EDIT:\s*(?P<file>[^\]\n]+?)\s*\]\s*\n<<<<<<< SEARCH\n(?P<search>.*?)\n?=======\n(?P<replace>.*?)\n?>>>>>>> REPLACE",
+    re.DOTALL
+)
+
+
+def parse_edits(response: str) -> List[Tuple[str, str, str]]:
+    """Parse [EDIT: file] SEARCH/REPLACE blocks into (file, search, replace) tuples."""
+    return [
+        (m.group("file").strip(), m.group("search"), m.group("replace"))
+        for m in EDIT_BLOCK.finditer(response)
+    ]
+
+
+def apply_edits(files: Dict[str, str], edits: List[Tuple[str, str, str]]) -> Dict[str, str]:
+    """Apply SEARCH/REPLACE edits and return only the files they changed.
+    
+    Each SEARCH text must occur exactly once in its file, either verbatim or
+    line by line ignoring surrounding whitespace; otherwise ValueError is raised.
+    """
+    changed: Dict[str, str] = {}
+    for name, search, replace in edits:
+        content = changed.get(name, files.get(name))
+        if content is None or not isinstance(content, str):
+            raise ValueError(f"Edit targets unknown file {name}")
+        if not search.strip():
+            raise ValueError(f"Empty SEARCH block for {name}")
+        
+        occurrences = content.count(search)
+        if occurrences == 1:
+            content = content.replace(search, replace, 1)
+        elif occurrences > 1:
+            raise ValueError(f"SEARCH block matches {occurrences} places in {name}")
+        else:
+            # Tolerate indentation/trailing whitespace differences
+            lines = content.split("\n")
+            wanted = [line.strip() for line in search.strip("\n").split("\n")]
+            starts = [
+                i for i in range(len(lines) - len(wanted) + 1)
+                if [line.strip() for line in lines[i:i + len(wanted)]] == wanted
+            ]
+            if len(starts) != 1:
+                raise ValueError(f"SEARCH block not found exactly once in {name}")
+            start = starts[0]
+            lines[start:start + len(wanted)] = replace.split("\n")
+            content = "\n".join(lines)
+        changed[name] = content
+    return {name: content for name, content in changed.items() if content != files.get(name)}
+
+
+class _Bucket:
+    """A per-minute budget that refills continuously."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0  # units per second
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def shortfall(self, amount: float) -> float:
+        """Seconds until amount is available (0 if it is now)."""
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class RateLimiter:
+    """Client-side requests/tokens-per-minute budgets per provider and model.
+    
+    Each (provider, model) has a request bucket and a token bucket. A call
+    takes one request and its estimated tokens before it is sent, queueing
+    until both buckets hold enough instead of failing with 429s; the estimate
+    is corrected from the usage the provider reports. The sync and async
+    clients share one instance, so deployment and evaluation in a process draw
+    from one budget.
+    """
+    
+    POLL_INTERVAL = 1.0  # waiters re-check, since settled calls refund budget early
+    
+    def __init__(self, default_rpm: int = None, default_tpm: int = None, limits: str = None):
+        self.default_rpm = config.LLM_RPM_LIMIT if default_rpm is None else default_rpm
+        self.default_tpm = config.LLM_TPM_LIMIT if default_tpm is None else default_tpm
+        self.limits = self.parse_limits(config.LLM_RATE_LIMITS if limits is None else limits)
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], Tuple[Optional[_Bucket], Optional[_Bucket]]] = {}
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self.rate_limited = 0
+    
+    @staticmethod
+    def parse_limits(spec: str) -> Dict[Tuple[str, str], Tuple[int, int]]:
+        """Parse "provider[:model]=rpm/tpm,..." (0 or empty means unlimited)."""
+        limits = {}
+        for item in (spec or "").split(","):
+            if "=" not in item:
+                continue
+            key, budget = item.split("=", 1)
+            provider, _, model = key.strip().partition(":")
+            rpm, _, tpm = budget.strip().partition("/")
+            limits[(provider, model)] = (int(rpm or 0), int(tpm or 0))
+        return limits
+    
+    @staticmethod
+    def estimate_tokens(prompt: str, system_prompt: Optional[str] = None, max_output_tokens: int = 0) -> int:
+        """Rough token count (~4 characters per token) plus the output allowance."""
+        return (len(prompt) + len(system_prompt or "")) // 4 + 1 + max_output_tokens
+    
+    def _get_buckets(self, provider: str, model: str) -> Tuple[Optional[_Bucket], Optional[_Bucket]]:
+        buckets = self._buckets.get((provider, model))
+        if buckets is None:
+            rpm, tpm = self.limits.get(
+                (provider, model), self.limits.get((provider, ""), (self.default_rpm, self.default_tpm))
+            )
+            buckets = self._buckets[(provider, model)] = (
+                _Bucket(rpm) if rpm > 0 else None,
+                _Bucket(tpm) if tpm > 0 else None,
+            )
+        return buckets
+    
+    def _try_take(self, provider: str, model: str, tokens: int) -> float:
+        """Take the budget and return 0, or return how long to wait before trying again."""
+        with self._lock:
+            requests, token_budget = self._get_buckets(provider, model)
+            now = time.monotonic()
+            wanted = []
+            if requests:
+                wanted.append((requests, 1))
+            if token_budget:
+                # A call bigger than a whole minute's budget only has to wait for a full bucket
+                wanted.append((token_budget, min(tokens, token_budget.capacity)))
+            wait = 0.0
+            for bucket, amount in wanted:
+                bucket.refill(now)
+                wait = max(wait, bucket.shortfall(amount))
+            if wait == 0:
+                for bucket, amount in wanted:
+                    bucket.level -= amount
+            return wait
+    
+    def _waited(self, provider: str, model: str, started: float, tokens: int):
+        waited = time.time() - started
+        with self._lock:
+            self.waits += 1
+            self.waited_seconds += waited
+        metrics.LLM_RATE_LIMIT_WAIT_SECONDS.labels(provider, model).observe(waited)
+        tracing.record("llm.rate_limit_wait", started, time.time(), tokens=tokens)
+    
+    def acquire(self, provider: str, model: str, tokens: int):
+        """Block until a call of about `tokens` tokens fits the budget."""
+        wait = self._try_take(provider, model, tokens)
+        if wait == 0:
+            return
+        if wait >= self.POLL_INTERVAL:
+            print(f"LLM rate limit: queueing ~{wait:.1f}s for {provider}/{model}")
+        started = time.time()
+        while wait > 0:
+            time.sleep(min(wait, self.POLL_INTERVAL))
+            wait = self._try_take(provider, model, tokens)
+        self._waited(provider, model, started, tokens)
+    
+    async def acquire_async(self, provider: str, model: str, tokens: int):
+        """Async acquire; cancelling a queued caller takes nothing from the budget."""
+        wait = self._try_take(provider, model, tokens)
+        if wait == 0:
+            return
+        if wait >= self.POLL_INTERVAL:
+            print(f"LLM rate limit: queueing ~{wait:.1f}s for {provider}/{model}")
+        started = time.time()
+        while wait > 0:
+            await asyncio.sleep(min(wait, self.POLL_INTERVAL))
+            wait = self._try_take(provider, model, tokens)
+        self._waited(provider, model, started, tokens)
+    
+    def settle(self, provider: str, model: str, reserved: int, used: int):
+        """Correct a call's estimate with the tokens the provider reported."""
+        if used <= 0:
+            return
+        with self._lock:
+            token_budget = self._get_buckets(provider, model)[1]
+            if token_budget:
+                token_budget.refill(time.monotonic())
+                token_budget.level = min(token_budget.capacity, token_budget.level + reserved - used)
+    
+    def penalize(self, provider: str, model: str) -> bool:
+        """The provider rejected a call for rate limiting: spend the remaining budget.
+        
+        Returns False when no budget is configured for the model, so nothing
+        holds the next call back.
+        """
+        with self._lock:
+            self.rate_limited += 1
+            now = time.monotonic()
+            buckets = [bucket for bucket in self._get_buckets(provider, model) if bucket]
+            for bucket in buckets:
+                bucket.refill(now)
+                bucket.level = min(bucket.level, 0.0)
+            return bool(buckets)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            budgets = {}
+            for (provider, model), (requests, tokens) in self._buckets.items():
+                for bucket in (requests, tokens):
+                    if bucket:
+                        bucket.refill(now)
+                budgets[f"{provider}/{model}"] = {
+                    "requests_available": round(requests.level, 1) if requests else None,
+                    "tokens_available": round(tokens.level) if tokens else None,
+                }
+            return {
+                "waits": self.waits,
+                "waited_seconds": round(self.waited_seconds, 1),
+                "rate_limited": self.rate_limited,
+                "budgets": budgets,
+            }
+
+
+# Shared by every client in the process
+rate_limiter = RateLimiter()
+
+
+# Gemini CachedContent per (model, system prompt hash): (cache or None, expires_at)
+_gemini_caches: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+_gemini_cache_lock = threading.Lock()
+# In-progress creates from async callers, shared by identical concurrent requests
+_gemini_cache_flights: Dict[Tuple[str, str], asyncio.Task] = {}
 
 
 class LLMClient:
@@ -12,73 +335,67 @@ class LLMClient:
         self.api_key = config.LLM_API_KEY
         self.model = config.LLM_MODEL
         
-        if self.provider == "gemini":
-            import google.generativeai as genai
-            genai.configure(api_key=self.api_key)
-            
-            # Create the Gemini client
-            self.client = genai.GenerativeModel(self.model)
-        elif self.provider == "aipipe":
-            # AIPipe uses OpenAI-compatible API
-            from openai import OpenAI
-            self.client = OpenAI(
-                api_key=self.api_key,
-                base_url=config.LLM_API_BASE_URL
-            )
-        elif self.provider == "openai":
-            from openai import OpenAI
-            self.client = OpenAI(api_key=self.api_key)
-        elif self.provider == "anthropic":
-            from anthropic import Anthropic
-            self.client = Anthropic(api_key=self.api_key)
-        else:
+        if self.provider not in ["gemini", "aipipe", "openai", "anthropic"]:
             raise ValueError(f"Unsupported LLM provider: {self.provider}")
+        # The provider SDK is imported on first use; importing it costs
+        # seconds of startup for processes that never call the LLM
+        self.client = None
+        self._client_lock = threading.Lock()
+    
+    def _get_client(self):
+        """Return the provider SDK client, creating it on first use."""
+        with self._client_lock:
+            if self.client is not None:
+                return self.client
+            if self.provider == "gemini":
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                
+                # Create the Gemini client
+                self.client = genai.GenerativeModel(self.model)
+            elif self.provider == "aipipe":
+                # AIPipe uses OpenAI-compatible API
+                from openai import OpenAI
+                self.client = OpenAI(
+                    api_key=self.api_key,
+                    base_url=config.LLM_API_BASE_URL
+                )
+            elif self.provider == "openai":
+                from openai import OpenAI
+                self.client = OpenAI(api_key=self.api_key)
+            else:
+                from anthropic import Anthropic
+                self.client = Anthropic(api_key=self.api_key)
+            return self.client
     
     def generate_code(self, prompt: str, system_prompt: Optional[str] = None, max_retries: int = 3) -> str:
         """Generate code using LLM with retry logic for safety filter issues."""
-        
+        with tracing.span("llm.complete", provider=self.provider, model=self.model), \
+                metrics.timed(metrics.LLM_REQUEST_SECONDS, provider=self.provider, model=self.model, mode="complete"):
+            return self._generate_code(prompt, system_prompt, max_retries)
+    
+    def _generate_code(self, prompt: str, system_prompt: Optional[str] = None, max_retries: int = 3) -> str:
         for attempt in range(max_retries):
             try:
+                reserved = self._acquire(prompt, system_prompt)
                 if self.provider == "gemini":
                     # Google Gemini API
-                    # Combine system prompt and user prompt for Gemini
-                    full_prompt = prompt
-                    if system_prompt:
-                        full_prompt = f"{system_prompt}\n\n{prompt}"
+                    model, full_prompt = self._gemini_request(self._get_client(), system_prompt, prompt)
                     
                     # On retry, slightly vary the prompt to bypass false positives
+                    # (at the end, so the cacheable prefix stays the same)
                     if attempt > 0:
-                        full_prompt = f"[Attempt {attempt+1}] {full_prompt}\n\nNote: This is a code generation task for educational purposes."
+                        full_prompt = f"{full_prompt}\n\n[Attempt {attempt+1}] Note: This is a code generation task for educational purposes."
                     
-                    # Configure safety settings to be more permissive for code generation
-                    import google.generativeai as genai
-                    safety_settings = [
-                        {
-                            "category": "HARM_CATEGORY_HARASSMENT",
-                            "threshold": "BLOCK_NONE"
-                        },
-                        {
-                            "category": "HARM_CATEGORY_HATE_SPEECH",
-                            "threshold": "BLOCK_NONE"
-                        },
-                        {
-                            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                            "threshold": "BLOCK_NONE"
-                        },
-                        {
-                            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                            "threshold": "BLOCK_NONE"
-                        },
-                    ]
-                    
-                    response = self.client.generate_content(
+                    response = model.generate_content(
                         full_prompt,
                         generation_config={
                             "temperature": 0.7 + (attempt * 0.05),  # Slightly increase temperature on retry
                             "max_output_tokens": 8192,
                         },
-                        safety_settings=safety_settings
+                        safety_settings=GEMINI_SAFETY_SETTINGS
                     )
+                    self._record_usage(response, reserved)
                     
                     # Handle safety blocks with retry
                     if not response.text:
@@ -86,7 +403,6 @@ class LLMClient:
                             error_msg = f"Content blocked by safety filters: {response.prompt_feedback}"
                             if attempt < max_retries - 1:
                                 print(f"⚠️  Safety filter triggered (attempt {attempt+1}/{max_retries}), retrying with modified prompt...")
-                                import time
                                 time.sleep(2)  # Brief pause before retry
                                 continue
                             raise Exception(error_msg)
@@ -97,7 +413,6 @@ class LLMClient:
                                 return candidate.content.parts[0].text
                         if attempt < max_retries - 1:
                             print(f"⚠️  Empty response (attempt {attempt+1}/{max_retries}), retrying...")
-                            import time
                             time.sleep(2)
                             continue
                         raise Exception("No valid response from Gemini API")
@@ -111,37 +426,544 @@ class LLMClient:
                         messages.append({"role": "system", "content": system_prompt})
                     messages.append({"role": "user", "content": prompt})
                     
-                    response = self.client.chat.completions.create(
+                    response = self._get_client().chat.completions.create(
                         model=self.model,
                         messages=messages,
                         temperature=0.7,
                         max_tokens=4000
                     )
+                    self._record_usage(response, reserved)
                     return response.choices[0].message.content
                 
                 elif self.provider == "anthropic":
-                    response = self.client.messages.create(
+                    response = self._get_client().messages.create(
                         model=self.model,
                         max_tokens=4000,
-                        system=system_prompt or "",
+                        system=self._anthropic_system(system_prompt),
                         messages=[
                             {"role": "user", "content": prompt}
                         ]
                     )
+                    self._record_usage(response, reserved)
                     return response.content[0].text
             
             except Exception as e:
+                if attempt < max_retries - 1 and self._is_rate_limited(e):
+                    delay = self._rate_limit_delay(e, attempt)
+                    print(f"⚠️  Rate limited (attempt {attempt+1}/{max_retries}), waiting {delay:.1f}s for budget...")
+                    time.sleep(delay)
+                    continue
                 if attempt < max_retries - 1 and self.provider == "gemini":
                     print(f"⚠️  Error occurred (attempt {attempt+1}/{max_retries}): {str(e)[:100]}")
-                    import time
                     time.sleep(2)
                     continue
                 raise Exception(f"LLM API error: {str(e)}")
     
-    def generate_app(self, brief: str, checks: list, attachments: list = None) -> Dict[str, str]:
-        """Generate a complete app based on brief and checks."""
+    def stream_code(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        """Stream a completion as text chunks (no retries; callers fall back to generate_code)."""
+        with tracing.span("llm.stream", provider=self.provider, model=self.model), \
+                metrics.timed(metrics.LLM_REQUEST_SECONDS, provider=self.provider, model=self.model, mode="stream"):
+            yield from self._stream_code(prompt, system_prompt)
+    
+    def _stream_code(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        reserved = self._acquire(prompt, system_prompt)
+        if self.provider == "gemini":
+            model, full_prompt = self._gemini_request(self._get_client(), system_prompt, prompt)
+            response = model.generate_content(
+                full_prompt,
+                generation_config={"temperature": 0.7, "max_output_tokens": 8192},
+                safety_settings=GEMINI_SAFETY_SETTINGS,
+                stream=True
+            )
+            last_chunk = None
+            for chunk in response:
+                last_chunk = chunk
+                # chunk.text raises if the chunk was blocked by safety filters
+                if chunk.candidates and chunk.candidates[0].content.parts:
+                    yield chunk.text
+            if last_chunk is not None:
+                self._record_usage(last_chunk, reserved)  # the final chunk carries the totals
+        
+        elif self.provider in ["aipipe", "openai"]:
+            messages = []
+            if system_prompt:
+                messages.append({"role": "system", "content": system_prompt})
+            messages.append({"role": "user", "content": prompt})
+            stream = self._get_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=4000,
+                stream=True,
+                # AIPipe proxies may not accept stream_options
+                **({"stream_options": {"include_usage": True}} if self.provider == "openai" else {})
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    self._record_usage(chunk, reserved)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        
+        elif self.provider == "anthropic":
+            with self._get_client().messages.stream(
+                model=self.model,
+                max_tokens=4000,
+                system=self._anthropic_system(system_prompt),
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                for text in stream.text_stream:
+                    yield text
+                self._record_usage(stream.get_final_message(), reserved)
+    
+    def _acquire(self, prompt: str, system_prompt: Optional[str]) -> int:
+        """Wait for rate-limit budget; returns the tokens reserved."""
+        tokens = rate_limiter.estimate_tokens(prompt, system_prompt, self._max_output_tokens())
+        rate_limiter.acquire(self.provider, self.model, tokens)
+        return tokens
+    
+    def _max_output_tokens(self) -> int:
+        return 8192 if self.provider == "gemini" else 4000
+    
+    @staticmethod
+    def _is_rate_limited(error: Exception) -> bool:
+        """True for HTTP 429 / quota errors from any of the SDKs."""
+        status = getattr(error, "status_code", None) or getattr(error, "code", None)
+        return status == 429 or "ResourceExhausted" in error.__class__.__name__ or "429" in str(error)
+    
+    def _rate_limit_delay(self, error: Exception, attempt: int) -> float:
+        """Seconds to sleep before retrying a rate-limited call.
+        
+        The limiter is penalized so that every caller waits for the budget to
+        refill. A Retry-After / retry_delay from the provider is honoured;
+        without one and without a configured budget (nothing would hold the
+        retry back), the call backs off exponentially with jitter.
+        """
+        limited = rate_limiter.penalize(self.provider, self.model)
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, config.LLM_RATE_LIMIT_BACKOFF_MAX)
+        if limited:
+            return 0.0  # the next acquire waits for the refill
+        delay = min(config.LLM_RATE_LIMIT_BACKOFF * 2 ** attempt, config.LLM_RATE_LIMIT_BACKOFF_MAX)
+        return delay * random.uniform(1.0, 1.25)
+    
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Retry delay the provider asked for (Retry-After header or Gemini retry_delay), if any."""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except (TypeError, ValueError):
+            pass  # HTTP-date form: fall back to backoff
+        match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(error)) or \
+            re.search(r"retry in (\d+(?:\.\d+)?)\s*s", str(error), re.IGNORECASE)
+        return float(match.group(1)) if match else None
+    
+    def _record_usage(self, response, reserved: int = 0):
+        """Count prompt/completion/cached tokens reported by the provider.
+        
+        The counts are also attached to the call's trace span.
+        
+        Args:
+            reserved: Tokens reserved with the rate limiter, settled against the usage
+        """
+        prompt_tokens, completion_tokens = self._usage(response)
+        cached_tokens = self._cached_tokens(response)
+        tracing.annotate(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                         cached_tokens=cached_tokens)
+        if cached_tokens:
+            metrics.LLM_TOKENS_TOTAL.labels(self.provider, self.model, "cached").inc(cached_tokens)
+        if reserved:
+            rate_limiter.settle(self.provider, self.model, reserved, prompt_tokens + completion_tokens)
+        if prompt_tokens:
+            metrics.LLM_TOKENS_TOTAL.labels(self.provider, self.model, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            metrics.LLM_TOKENS_TOTAL.labels(self.provider, self.model, "completion").inc(completion_tokens)
+    
+    def _usage(self, response) -> Tuple[int, int]:
+        """Return (prompt_tokens, completion_tokens) from a provider response."""
+        try:
+            if self.provider == "gemini":
+                meta = response.usage_metadata
+                return meta.prompt_token_count or 0, meta.candidates_token_count or 0
+            if self.provider in ["aipipe", "openai"]:
+                return response.usage.prompt_tokens or 0, response.usage.completion_tokens or 0
+            if self.provider == "anthropic":
+                usage = response.usage
+                # input_tokens excludes the tokens read from or written to the prompt cache
+                prompt_tokens = (usage.input_tokens or 0) + (getattr(usage, "cache_read_input_tokens", 0) or 0) \
+                    + (getattr(usage, "cache_creation_input_tokens", 0) or 0)
+                return prompt_tokens, usage.output_tokens or 0
+        except AttributeError:
+            pass
+        return 0, 0
+    
+    def _cached_tokens(self, response) -> int:
+        """Prompt tokens served from the provider's prompt cache."""
+        try:
+            if self.provider == "gemini":
+                return response.usage_metadata.cached_content_token_count or 0
+            if self.provider in ["aipipe", "openai"]:
+                details = response.usage.prompt_tokens_details
+                return (details.cached_tokens or 0) if details else 0
+            if self.provider == "anthropic":
+                return getattr(response.usage, "cache_read_input_tokens", 0) or 0
+        except AttributeError:
+            pass
+        return 0
+    
+    def _anthropic_system(self, system_prompt: Optional[str]):
+        """System prompt as a cacheable block (Anthropic ignores blocks under its minimum size)."""
+        if not system_prompt or not config.LLM_PROMPT_CACHING:
+            return system_prompt or ""
+        return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+    
+    def _gemini_request(self, model, system_prompt: Optional[str], prompt: str):
+        """Return (model, contents) for a Gemini call.
+        
+        A system prompt long enough for explicit context caching is served from
+        a CachedContent; shorter ones are sent first in the contents, where
+        Gemini's implicit prefix caching can reuse them.
+        """
+        cached = self._gemini_cached_content(system_prompt)
+        if cached is not None:
+            import google.generativeai as genai
+            return genai.GenerativeModel.from_cached_content(cached), prompt
+        return model, f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+    
+    def _gemini_cache_key(self, system_prompt: Optional[str]) -> Optional[Tuple[str, str]]:
+        """(model, system prompt hash), or None if the prompt is not cached explicitly."""
+        if (not system_prompt or not config.LLM_PROMPT_CACHING
+                or RateLimiter.estimate_tokens(system_prompt) < config.LLM_GEMINI_CACHE_MIN_TOKENS):
+            return None
+        return self.model, hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    
+    def _gemini_cached_content(self, system_prompt: Optional[str]):
+        """Create or reuse a CachedContent holding system_prompt, or None if not applicable.
+        
+        Blocks while the cache is created; async callers use
+        AsyncLLMClient._gemini_cached_content_async.
+        """
+        key = self._gemini_cache_key(system_prompt)
+        if key is None:
+            return None
+        with _gemini_cache_lock:
+            cached, expires = _gemini_caches.get(key, (None, 0.0))
+            if time.time() < expires:
+                return cached
+            try:
+                from datetime import timedelta
+                import google.generativeai as genai
+                cached = genai.caching.CachedContent.create(
+                    model=self.model,
+                    system_instruction=system_prompt,
+                    ttl=timedelta(seconds=config.LLM_GEMINI_CACHE_TTL),
+                )
+            except Exception as e:
+                print(f"⚠️  Gemini context caching unavailable ({str(e)[:100]}), sending the prompt inline")
+                cached = None
+            # Refresh a minute before the provider expires it; failures are not retried until then
+            _gemini_caches[key] = (cached, time.time() + config.LLM_GEMINI_CACHE_TTL - 60)
+            return cached
+
+    def generate_app(
+        self,
+        brief: str,
+        checks: list,
+        attachments: list = None,
+        on_file: Optional[Callable[[str, str], None]] = None,
+        stream: Optional[bool] = None,
+        use_cache: Optional[bool] = None,
+    ) -> Dict[str, str]:
+        """Generate a complete app based on brief and checks.
+        
+        Args:
+            brief: Task brief
+            checks: Checks the app must pass
+            attachments: List of {"name", "url"} attachments; data URIs are deployed
+                as files and described rather than inlined (pass "sample": False to
+                leave their data-specific sample out of the prompt)
+            on_file: Called with (filename, content) as soon as each file is complete
+            stream: Stream the completion and parse files incrementally
+                (defaults to config.LLM_STREAMING)
+            use_cache: Reuse a previous generation for identical inputs
+                (defaults to config.LLM_CACHE_ENABLED); pass False to force a fresh one
+        """
+        brief = (brief or "").strip()
+        checks = [str(c).strip() for c in (checks or [])]
+        attachments = sorted(
+            ({"name": a.get("name"), "url": a.get("url"), "sample": a.get("sample", True)} for a in (attachments or [])),
+            key=lambda a: (a["name"] or "", a["url"] or "")
+        )
+        system_prompt, prompt = self._build_app_prompt(brief, checks, attachments)
+        
+        def generate() -> Tuple[Dict[str, str], bool]:
+            return self._generate_app_files(brief, prompt, system_prompt, on_file, stream)
+        
+        if use_cache is None:
+            use_cache = config.LLM_CACHE_ENABLED
+        if not use_cache:
+            return generate()[0]
+        
+        # The rendered prompts capture every input, so template edits invalidate old entries
+        key = generation_cache.make_key(
+            self.provider, self.model, system_prompt=system_prompt, prompt=prompt
+        )
+        files, source = generation_cache.get_or_generate(key, generate, self.provider, self.model)
+        if source != "miss":
+            print(f"✓ Generation cache {source}: {key[:12]}")
+            if on_file:
+                for name, content in files.items():
+                    on_file(name, content)
+        return files
+    
+    def _generate_app_files(
+        self,
+        brief: str,
+        prompt: str,
+        system_prompt: str,
+        on_file: Optional[Callable[[str, str], None]] = None,
+        stream: Optional[bool] = None,
+    ) -> Tuple[Dict[str, str], bool]:
+        """Call the LLM and return (files, cacheable); fallback-filled results are not cacheable."""
+        if stream is None:
+            stream = config.LLM_STREAMING
+        files = None
+        emitted = set()  # files a failed stream already handed to on_file
+        if stream:
+            try:
+                files = self._generate_files_streaming(prompt, system_prompt, self._track_emitted(on_file, emitted))
+            except Exception as e:
+                print(f"⚠️  Streaming generation failed ({str(e)[:100]}), retrying without streaming")
+        if files is None:
+            response = self.generate_code(prompt, system_prompt)
+            files = self._parse_files(response)
+            if on_file:
+                for name, content in files.items():
+                    if name not in emitted:
+                        on_file(name, content)
+        
+        return self._complete_files(brief, files)
+    
+    @staticmethod
+    def _track_emitted(
+        on_file: Optional[Callable[[str, str], None]], emitted: set
+    ) -> Optional[Callable[[str, str], None]]:
+        """Wrap on_file to remember which files were emitted."""
+        if on_file is None:
+            return None
+
+        def emit(name: str, content: str):
+            emitted.add(name)
+            on_file(name, content)
+        return emit
+    
+    def _complete_files(self, brief: str, files: Dict[str, str]) -> Tuple[Dict[str, str], bool]:
+        """Fill in missing required files; returns (files, cacheable)."""
+        cacheable = "index.html" in files
+        
+        # Ensure we have the required files
+        if "index.html" not in files:
+            files["index.html"] = self._generate_fallback_html(brief)
+        if "README.md" not in files:
+            files["README.md"] = self._generate_fallback_readme(brief)
+        if "LICENSE" not in files:
+            files["LICENSE"] = self._generate_mit_license()
+        
+        return files, cacheable
+    
+    def _generate_files_streaming(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        on_file: Optional[Callable[[str, str], None]] = None,
+    ) -> Dict[str, str]:
+        """Stream a completion, emitting each file as soon as its [END FILE] arrives."""
+        parser = IncrementalFileParser()
+        for chunk in self.stream_code(prompt, system_prompt):
+            for name, content in parser.feed(chunk):
+                if on_file:
+                    on_file(name, content)
+        for name, content in parser.close():
+            if on_file:
+                on_file(name, content)
+        if not parser.files:
+            raise Exception("Streamed response contained no files")
+        return parser.files
+    
+    def generate_revision(
+        self,
+        brief: str,
+        checks: list,
+        files: Dict[str, str],
+        attachments: list = None,
+    ) -> Dict[str, str]:
+        """Revise an existing app with minimal SEARCH/REPLACE edits.
+        
+        Args:
+            brief: Brief describing the change
+            checks: Checks the revised app must pass
+            files: Current files of the app (text files are shown to the LLM)
+            attachments: List of {"name", "url"} attachments
+        
+        Returns:
+            Only the files that were changed or added, with their full new content
+        
+        Raises:
+            ValueError if the response has no usable edits or an edit does not apply
+        """
+        system_prompt, prompt = self._build_revision_prompt(brief, checks, files, attachments)
+        response = self.generate_code(prompt, system_prompt)
+        return self._apply_revision(response, files)
+    
+    def _apply_revision(self, response: str, files: Dict[str, str]) -> Dict[str, str]:
+        """Turn a revision response into the changed files."""
+        edits = parse_edits(response)
+        changed = apply_edits(files, edits)
+        # Whole files are allowed for new files only; existing ones must be edited
+        for name, content in self._parse_files(response).items():
+            if name not in files:
+                changed[name] = content
+        if not changed:
+            raise ValueError("Revision response contained no applicable edits")
+        return changed
+    
+    def _build_revision_prompt(
+        self, brief: str, checks: list, files: Dict[str, str], attachments: list = None
+    ) -> Tuple[str, str]:
+        """Build the (system_prompt, prompt) pair for revising an existing app."""
+        system_prompt = """You are an expert web developer revising an existing, working single-page web application.
+        
+CRITICAL Requirements:
+- Make the smallest set of changes that implements the new brief and passes ALL checks
+- Preserve ALL existing functionality, IDs, classes and elements
+- Keep using vanilla HTML, CSS, and JavaScript with libraries loaded from CDN
+- Update README.md to document the new features
+- Output ONLY edit blocks in the requested format, never whole existing files"""
+        
+        current_files = ""
+        for name, content in files.items():
+            if isinstance(content, str) and name != "LICENSE":
+                current_files += f"\n[CURRENT FILE: {name}]\n{content}\n[END CURRENT FILE]\n"
+        
+        attachments_info = self._attachments_info(attachments)
+        
+        checks_info = "\n\nThe revised app must pass these checks:\n"
+        for i, check in enumerate(checks, 1):
+            checks_info += f"{i}. {check}\n"
+        
+        prompt = f"""The app below is already deployed. Revise it for this new brief:
+
+BRIEF:
+{brief}
+{attachments_info}
+{checks_info}
+
+CURRENT FILES:
+{current_files}
+
+Output format - one block per change; SEARCH must copy existing lines exactly
+and match only one place in the file; keep each block small:
+[EDIT: index.html]
+<<<<<<< SEARCH
+... existing lines ...
+=======
+... replacement lines ...
+>>>>>>> REPLACE
+
+To add a NEW file (never for existing files):
+[FILE: path/name.ext]
+... content ...
+[END FILE]
+"""
+        return system_prompt, prompt
+    
+    def generate_repair(
+        self,
+        brief: str,
+        failures: List[Dict[str, Any]],
+        files: Dict[str, str],
+        errors: List[str] = None,
+    ) -> Dict[str, str]:
+        """Fix failing checks with minimal SEARCH/REPLACE edits to index.html only.
+        
+        Only index.html and the failures are sent, so a repair prompt is a
+        fraction of a full generation.
+        
+        Args:
+            brief: Task brief, for context
+            failures: Failed checks as {"check", "result"} dicts (e.g. from preflight)
+            files: Current files of the app
+            errors: Console errors and uncaught exceptions seen on the page
+        
+        Returns:
+            {"index.html": repaired content}
+        
+        Raises:
+            ValueError if there is no index.html or the response has no applicable edits
+        """
+        system_prompt, prompt = self._build_repair_prompt(brief, failures, files, errors)
+        response = self.generate_code(prompt, system_prompt)
+        return self._apply_repair(response, files)
+    
+    @staticmethod
+    def _apply_repair(response: str, files: Dict[str, str]) -> Dict[str, str]:
+        """Apply the index.html edits of a repair response (edits to other files are ignored)."""
+        edits = [edit for edit in parse_edits(response) if edit[0] == "index.html"]
+        changed = apply_edits({"index.html": files["index.html"]}, edits)
+        if not changed:
+            raise ValueError("Repair response contained no applicable edits")
+        return changed
+    
+    def _build_repair_prompt(
+        self, brief: str, failures: List[Dict[str, Any]], files: Dict[str, str], errors: List[str] = None
+    ) -> Tuple[str, str]:
+        """Build the (system_prompt, prompt) pair for repairing index.html."""
+        if not isinstance(files.get("index.html"), str):
+            raise ValueError("No index.html to repair")
+        system_prompt = """You are an expert web developer fixing a single-page web application that fails automated browser checks.
         
-        # Build the prompt
+CRITICAL Requirements:
+- Each check is a JavaScript expression evaluated in the loaded page; it must return a truthy value
+- Make the smallest change to index.html that makes ALL failing checks pass
+- Never rewrite the file, remove features or rename existing IDs, classes and elements
+- Attachment files deployed with the app must be loaded with fetch() at runtime, never inlined
+- Output ONLY edit blocks for index.html; SEARCH must copy existing lines exactly and match only one place:
+[EDIT: index.html]
+<<<<<<< SEARCH
+... existing lines ...
+=======
+... replacement lines ...
+>>>>>>> REPLACE"""
+        
+        failing = "\n".join(f"{i}. {f['check']}\n   Result: {f['result']}" for i, f in enumerate(failures, 1))
+        errors_info = ""
+        if errors:
+            errors_info = "\n\nERRORS ON THE PAGE:\n" + "\n".join(f"- {error}" for error in errors)
+        
+        prompt = f"""BRIEF:
+{brief}
+
+FAILING CHECKS:
+{failing}{errors_info}
+
+[CURRENT FILE: index.html]
+{files["index.html"]}
+[END CURRENT FILE]
+"""
+        return system_prompt, prompt
+    
+    def _build_app_prompt(self, brief: str, checks: list, attachments: list = None) -> Tuple[str, str]:
+        """Build the (system_prompt, prompt) pair for app generation.
+        
+        The system prompt holds every fixed instruction and is identical for all
+        tasks, so providers can cache it as a prompt prefix; everything that
+        varies (brief, attachments, checks) goes in the prompt.
+        """
         system_prompt = """You are an expert web developer. Generate a complete, production-ready single-page web application.
         
 CRITICAL Requirements:
@@ -153,40 +975,11 @@ CRITICAL Requirements:
 - Follow best practices and ensure ALL checks will pass
 - Add proper error handling and loading states
 - Write clean, commented code
-- When attachments are provided as data URIs, parse and use them in JavaScript
+- Attachment files deployed with the app must be loaded with fetch('<name>') at runtime, never inlined
 - For markdown tasks: MUST use marked.js library from CDN
 - For syntax highlighting: MUST use highlight.js library from CDN
 - For GitHub API tasks: MUST make actual fetch() calls to https://api.github.com/users/{username}
-- All interactive features must be fully functional, not placeholder code"""
-        
-        attachments_info = ""
-        if attachments:
-            attachments_info = "\n\nAttachments provided (embed these directly in your code):\n"
-            for att in attachments:
-                # Provide the full data URI for the LLM to use
-                attachments_info += f"\n{att['name']}:\n{att['url']}\n"
-        
-        checks_info = "\n\nThe app must pass these checks:\n"
-        for i, check in enumerate(checks, 1):
-            checks_info += f"{i}. {check}\n"
-        
-        # Add implicit requirements based on common patterns
-        implicit_requirements = "\n\nIMPLICIT REQUIREMENTS (based on standard patterns):\n"
-        if "github" in brief.lower():
-            implicit_requirements += "- For GitHub-related tasks: Always include #github-created-at to display the account creation date\n"
-            implicit_requirements += "- Preserve ALL form elements and data display areas from previous rounds\n"
-        if "markdown" in brief.lower():
-            implicit_requirements += "- For Markdown tasks: Always preserve #markdown-output for rendered content\n"
-            implicit_requirements += "- If adding tabs/views, keep all original display elements visible\n"
-        
-        checks_info += implicit_requirements
-        
-        prompt = f"""Create a single-page web application with the following requirements:
-
-BRIEF:
-{brief}
-{attachments_info}
-{checks_info}
+- All interactive features must be fully functional, not placeholder code
 
 CRITICAL IMPLEMENTATION RULES:
 1. If checks mention "marked" or "markdown": MUST include <script src="https://cdn.jsdelivr.net/npm/marked/marked.min.js"></script>
@@ -194,15 +987,16 @@ CRITICAL IMPLEMENTATION RULES:
 3. If checks mention "Bootstrap": MUST include Bootstrap CSS and JS from CDN
 4. If checks mention "fetch(" or API calls: MUST implement actual working fetch() requests
 5. ALL checks MUST be satisfied - review each one carefully before generating code
-6. For data URIs: Parse the base64 content and use it directly in JavaScript
+6. For attachment files: fetch('<name>') relative to index.html, then parse the response (text for CSV, json() for JSON)
 7. CRITICAL: If the brief mentions updates/improvements to an existing feature, you MUST preserve ALL original functionality
    - Round 2 builds ON TOP of Round 1, never removes or replaces original elements
    - Keep ALL IDs, classes, and elements from the original requirements
    - Add new features alongside existing ones, never remove them
 
-Example for CSV data URI:
-const dataUri = "data:text/csv;base64,....";
-const csvText = atob(dataUri.split(',')[1]);
+Example for a deployed CSV attachment named data.csv:
+const response = await fetch('data.csv');
+if (!response.ok) throw new Error(`Failed to load data.csv: ${response.status}`);
+const csvText = await response.text();
 // then parse csvText
 
 Example for Markdown with marked.js:
@@ -231,49 +1025,58 @@ Output format:
 [END FILE]
 """
         
-        response = self.generate_code(prompt, system_prompt)
+        attachments_info = self._attachments_info(attachments)
         
-        # Parse the response into files
-        files = self._parse_files(response)
+        checks_info = "\n\nThe app must pass these checks:\n"
+        for i, check in enumerate(checks, 1):
+            checks_info += f"{i}. {check}\n"
         
-        # Ensure we have the required files
-        if "index.html" not in files:
-            files["index.html"] = self._generate_fallback_html(brief)
-        if "README.md" not in files:
-            files["README.md"] = self._generate_fallback_readme(brief)
-        if "LICENSE" not in files:
-            files["LICENSE"] = self._generate_mit_license()
+        # Add implicit requirements based on common patterns
+        implicit_requirements = "\n\nIMPLICIT REQUIREMENTS (based on standard patterns):\n"
+        if "github" in brief.lower():
+            implicit_requirements += "- For GitHub-related tasks: Always include #github-created-at to display the account creation date\n"
+            implicit_requirements += "- Preserve ALL form elements and data display areas from previous rounds\n"
+        if "markdown" in brief.lower():
+            implicit_requirements += "- For Markdown tasks: Always preserve #markdown-output for rendered content\n"
+            implicit_requirements += "- If adding tabs/views, keep all original display elements visible\n"
         
-        return files
+        checks_info += implicit_requirements
+        
+        prompt = f"""Create a single-page web application with the following requirements:
+
+BRIEF:
+{brief}
+{attachments_info}
+{checks_info}
+
+Follow the CRITICAL IMPLEMENTATION RULES and the output format from the instructions.
+"""
+        
+        return system_prompt, prompt
+    
+    def _attachments_info(self, attachments: list = None) -> str:
+        """Prompt section listing data URIs to embed and attachment files deployed with the app."""
+        inline = [att for att in attachments or [] if not is_file_attachment(att)]
+        deployed = [att for att in attachments or [] if is_file_attachment(att)]
+        attachments_info = ""
+        if inline:
+            attachments_info += ("\n\nAttachments provided as data URIs (embed these directly in your code; "
+                                 "decode base64 ones with atob(dataUri.split(',')[1])):\n")
+            for att in inline:
+                # Provide the full data URI for the LLM to use
+                attachments_info += f"\n{att['name']}:\n{att['url']}\n"
+        if deployed:
+            attachments_info += "\n\nAttachment files deployed with the app:\n"
+            for att in deployed:
+                attachments_info += f"\n{att['name']}:\n{describe_attachment(att['name'], att['url'], att.get('sample', True))}\n"
+        return attachments_info
     
     def _parse_files(self, response: str) -> Dict[str, str]:
         """Parse files from LLM response."""
-        files = {}
-        current_file = None
-        current_content = []
-        
-        for line in response.split("\n"):
-            if line.startswith("[FILE:") and "]" in line:
-                # Save previous file
-                if current_file:
-                    files[current_file] = "\n".join(current_content).strip()
-                
-                # Start new file
-                current_file = line.split("[FILE:")[1].split("]")[0].strip()
-                current_content = []
-            elif line.startswith("[END FILE]"):
-                if current_file:
-                    files[current_file] = "\n".join(current_content).strip()
-                    current_file = None
-                    current_content = []
-            elif current_file:
-                current_content.append(line)
-        
-        # Save last file if not closed
-        if current_file and current_content:
-            files[current_file] = "\n".join(current_content).strip()
-        
-        return files
+        parser = IncrementalFileParser()
+        parser.feed(response)
+        parser.close()
+        return parser.files
     
     def _generate_fallback_html(self, brief: str) -> str:
         """Generate a basic fallback HTML."""
@@ -340,5 +1143,540 @@ SOFTWARE.
 """
 
 
-# Singleton instance
+class AsyncLLMClient(LLMClient):
+    """Asyncio client with the same provider switch as LLMClient.
+    
+    Uses the providers' async SDKs over one shared keep-alive connection pool
+    (config.LLM_MAX_CONNECTIONS), so many calls can be in flight on a single
+    event loop without pinning threads. Each attempt is bounded by
+    config.LLM_TIMEOUT, and cancelling the awaiting task aborts the request.
+    Prompt building, parsing and fallbacks are inherited from LLMClient.
+    
+    With config.LLM_FALLBACK_PROVIDERS set, generate_code runs in
+    multi-provider mode: when the primary is slower than its observed p95
+    latency a hedge request goes to the first fallback, the first valid
+    answer wins and the other request is cancelled. Errors and safety blocks
+    fail over to the next provider straight away instead of being retried.
+    stream_code hedges the same way on time to the first chunk: the first
+    stream to produce text is kept and the others are cancelled.
+    """
+    
+    def __init__(
+        self,
+        provider: str = None,
+        model: str = None,
+        api_key: str = None,
+        fallbacks: List["AsyncLLMClient"] = None,
+    ):
+        self.provider = provider or config.LLM_API_PROVIDER
+        self.api_key = api_key or config.LLM_API_KEY
+        self.model = model or config.LLM_MODEL
+        self.base_url = config.LLM_API_BASE_URL
+        if self.provider != config.LLM_API_PROVIDER:
+            # LLM_API_BASE_URL belongs to the primary provider
+            self.base_url = os.getenv(f"{self.provider.upper()}_BASE_URL", "https://aipipe.org/openai/v1")
+        self.timeout = config.LLM_TIMEOUT
+        if self.provider not in ["gemini", "aipipe", "openai", "anthropic"]:
+            raise ValueError(f"Unsupported LLM provider: {self.provider}")
+        self.client = None
+        self._loop = None
+        self._latencies = deque(maxlen=config.LLM_HEDGE_HISTORY)  # seconds, successful calls
+        self._first_chunk_latencies = deque(maxlen=config.LLM_HEDGE_HISTORY)  # seconds, streams
+        if fallbacks is None:
+            fallbacks = [
+                AsyncLLMClient(fb_provider, fb_model, fb_key, fallbacks=[])
+                for fb_provider, fb_model, fb_key in self.parse_fallbacks(config.LLM_FALLBACK_PROVIDERS)
+            ]
+        self.fallbacks = fallbacks
+    
+    @staticmethod
+    def parse_fallbacks(spec: str) -> List[Tuple[str, str, str]]:
+        """Parse "provider:model,..." into (provider, model, api_key) tuples.
+        
+        Keys come from <PROVIDER>_API_KEY, falling back to LLM_API_KEY.
+        """
+        fallbacks = []
+        for item in (spec or "").split(","):
+            provider, _, model = item.strip().partition(":")
+            if provider and model:
+                api_key = os.getenv(f"{provider.upper()}_API_KEY", config.LLM_API_KEY)
+                fallbacks.append((provider, model, api_key))
+        return fallbacks
+    
+    def _get_client(self):
+        """Return the async SDK client, (re)built for the running event loop.
+        
+        Connection pools are bound to the loop that opened them, so scripts
+        that call asyncio.run() more than once get a fresh client each time.
+        """
+        loop = asyncio.get_running_loop()
+        if self.client is not None and self._loop is loop:
+            return self.client
+        
+        if self.provider == "gemini":
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            # The grpc.aio channel is opened lazily on the first call
+            self.client = genai.GenerativeModel(self.model)
+        else:
+            import httpx
+            http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=config.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.LLM_MAX_CONNECTIONS,
+                ),
+            )
+            if self.provider == "aipipe":
+                from openai import AsyncOpenAI
+                self.client = AsyncOpenAI(
+                    api_key=self.api_key, base_url=self.base_url, http_client=http_client
+                )
+            elif self.provider == "openai":
+                from openai import AsyncOpenAI
+                self.client = AsyncOpenAI(api_key=self.api_key, http_client=http_client)
+            else:
+                from anthropic import AsyncAnthropic
+                self.client = AsyncAnthropic(api_key=self.api_key, http_client=http_client)
+        self._loop = loop
+        return self.client
+    
+    async def generate_code(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        max_retries: int = 3,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Generate code; retries Gemini safety blocks and errors like LLMClient.
+        
+        Args:
+            timeout: Seconds per attempt (defaults to config.LLM_TIMEOUT)
+        """
+        if self.fallbacks:
+            return await self._generate_hedged(prompt, system_prompt, timeout)
+        return await self._generate_single(prompt, system_prompt, max_retries, timeout)
+    
+    async def _generate_single(
+        self, prompt: str, system_prompt: Optional[str], max_retries: int = 3, timeout: Optional[float] = None
+    ) -> str:
+        with tracing.span("llm.complete", provider=self.provider, model=self.model), \
+                metrics.timed(metrics.LLM_REQUEST_SECONDS, provider=self.provider, model=self.model, mode="complete"):
+            started = time.monotonic()
+            response = await self._generate_code(prompt, system_prompt, max_retries, timeout or self.timeout)
+            if not response or not response.strip():
+                raise Exception(f"LLM API error: empty response from {self.provider}")
+            self._latencies.append(time.monotonic() - started)
+            return response
+    
+    def hedge_delay(self, first_chunk: bool = False) -> float:
+        """Seconds to wait for this client before hedging: its observed p95 latency.
+        
+        With first_chunk, the p95 time to a stream's first chunk instead.
+        """
+        latencies = self._first_chunk_latencies if first_chunk else self._latencies
+        if len(latencies) < config.LLM_HEDGE_MIN_SAMPLES:
+            return config.LLM_STREAM_HEDGE_DELAY if first_chunk else config.LLM_HEDGE_DELAY
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    
+    async def _generate_hedged(self, prompt: str, system_prompt: Optional[str], timeout: Optional[float]) -> str:
+        """Race the primary against fallbacks; see the class docstring."""
+        clients = [self, *self.fallbacks]
+        running: Dict[asyncio.Task, Tuple[AsyncLLMClient, str]] = {}
+        errors = []
+        
+        def launch(role: str):
+            client = clients[len(running) + len(errors)]
+            if role != "primary":
+                metrics.LLM_HEDGES_TOTAL.labels(role).inc()
+                print(f"⚠️  {'Hedging' if role == 'hedge' else 'Failing over'} to {client.provider}/{client.model}")
+            # One attempt each: moving on to another provider replaces retrying
+            task = asyncio.create_task(client._generate_single(prompt, system_prompt, 1, timeout))
+            running[task] = (client, role)
+        
+        def untried() -> bool:
+            return len(running) + len(errors) < len(clients)
+        
+        launch("primary")
+        hedge_at = time.monotonic() + self.hedge_delay()
+        try:
+            while running:
+                wait = max(0.0, hedge_at - time.monotonic()) if hedge_at else None
+                done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The primary is slower than usual; race it against the next provider
+                    hedge_at = None
+                    launch("hedge")
+                    continue
+                for task in done:
+                    client, role = running.pop(task)
+                    if task.exception() is None:
+                        metrics.LLM_HEDGE_WINS_TOTAL.labels(client.provider, client.model, role).inc()
+                        return task.result()
+                    errors.append(f"{client.provider}/{client.model}: {str(task.exception())[:200]}")
+                if not running and untried():
+                    hedge_at = None
+                    launch("failover")
+            raise Exception("LLM API error: all providers failed (" + "; ".join(errors) + ")")
+        finally:
+            for task in running:
+                task.cancel()
+    
+    async def _generate_code(
+        self, prompt: str, system_prompt: Optional[str], max_retries: int, timeout: float
+    ) -> str:
+        for attempt in range(max_retries):
+            try:
+                # Queueing for budget does not count against the request timeout
+                reserved = await self._acquire_async(prompt, system_prompt)
+                return await asyncio.wait_for(self._complete(prompt, system_prompt, attempt, reserved), timeout)
+            except Exception as e:
+                # CancelledError is not an Exception, so cancellation is never retried
+                if attempt < max_retries - 1 and self._is_rate_limited(e):
+                    delay = self._rate_limit_delay(e, attempt)
+                    print(f"⚠️  Rate limited (attempt {attempt+1}/{max_retries}), waiting {delay:.1f}s for budget...")
+                    await asyncio.sleep(delay)
+                    continue
+                if attempt < max_retries - 1 and self.provider == "gemini":
+                    print(f"⚠️  Error occurred (attempt {attempt+1}/{max_retries}): {str(e)[:100] or e.__class__.__name__}")
+                    await asyncio.sleep(2)
+                    continue
+                raise Exception(f"LLM API error: {str(e) or e.__class__.__name__}")
+    
+    async def _acquire_async(self, prompt: str, system_prompt: Optional[str]) -> int:
+        tokens = rate_limiter.estimate_tokens(prompt, system_prompt, self._max_output_tokens())
+        await rate_limiter.acquire_async(self.provider, self.model, tokens)
+        return tokens
+    
+    async def _complete(self, prompt: str, system_prompt: Optional[str], attempt: int, reserved: int = 0) -> str:
+        """One request to the provider."""
+        client = self._get_client()
+        if self.provider == "gemini":
+            model, full_prompt = await self._gemini_request_async(client, system_prompt, prompt)
+            # On retry, slightly vary the prompt to bypass false positives
+            if attempt > 0:
+                full_prompt = f"{full_prompt}\n\n[Attempt {attempt+1}] Note: This is a code generation task for educational purposes."
+            response = await model.generate_content_async(
+                full_prompt,
+                generation_config={
+                    "temperature": 0.7 + (attempt * 0.05),
+                    "max_output_tokens": 8192,
+                },
+                safety_settings=GEMINI_SAFETY_SETTINGS
+            )
+            self._record_usage(response, reserved)
+            try:
+                return response.text
+            except ValueError:
+                pass
+            if response.candidates and response.candidates[0].content.parts:
+                return response.candidates[0].content.parts[0].text
+            raise Exception(f"Content blocked by safety filters: {response.prompt_feedback}")
+        
+        if self.provider in ["aipipe", "openai"]:
+            messages = []
+            if system_prompt:
+                messages.append({"role": "system", "content": system_prompt})
+            messages.append({"role": "user", "content": prompt})
+            response = await client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=4000
+            )
+            self._record_usage(response, reserved)
+            return response.choices[0].message.content
+        
+        response = await client.messages.create(
+            model=self.model,
+            max_tokens=4000,
+            system=self._anthropic_system(system_prompt),
+            messages=[{"role": "user", "content": prompt}]
+        )
+        self._record_usage(response, reserved)
+        return response.content[0].text
+    
+    async def _gemini_request_async(self, model, system_prompt: Optional[str], prompt: str):
+        """_gemini_request without blocking the event loop on cache creation."""
+        cached = await self._gemini_cached_content_async(system_prompt)
+        if cached is not None:
+            import google.generativeai as genai
+            return genai.GenerativeModel.from_cached_content(cached), prompt
+        return model, f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+    
+    async def _gemini_cached_content_async(self, system_prompt: Optional[str]):
+        """Async _gemini_cached_content: the blocking create runs in a worker thread.
+        
+        Concurrent callers for the same prompt await one shared create, so
+        the event loop never waits on _gemini_cache_lock.
+        """
+        key = self._gemini_cache_key(system_prompt)
+        if key is None:
+            return None
+        cached, expires = _gemini_caches.get(key, (None, 0.0))
+        if time.time() < expires:
+            return cached
+        loop = asyncio.get_running_loop()
+        flight = _gemini_cache_flights.get(key)
+        if flight is None or flight.get_loop() is not loop:
+            flight = loop.create_task(asyncio.to_thread(self._gemini_cached_content, system_prompt))
+            _gemini_cache_flights[key] = flight
+            flight.add_done_callback(
+                lambda done: _gemini_cache_flights.pop(key, None) if _gemini_cache_flights.get(key) is done else None
+            )
+        # shield: a cancelled caller must not cancel the create others wait on
+        return await asyncio.shield(flight)
+    
+    async def stream_code(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream a completion as text chunks (no retries; callers fall back to generate_code)."""
+        if self.fallbacks:
+            async for chunk in self._stream_hedged(prompt, system_prompt):
+                yield chunk
+            return
+        async for chunk in self._stream_single(prompt, system_prompt):
+            yield chunk
+    
+    async def _stream_single(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        with tracing.span("llm.stream", provider=self.provider, model=self.model), \
+                metrics.timed(metrics.LLM_REQUEST_SECONDS, provider=self.provider, model=self.model, mode="stream"):
+            started = time.monotonic()
+            first = True
+            async for chunk in self._stream_code(prompt, system_prompt):
+                if first:
+                    self._first_chunk_latencies.append(time.monotonic() - started)
+                    first = False
+                yield chunk
+    
+    async def _stream_hedged(self, prompt: str, system_prompt: Optional[str]) -> AsyncIterator[str]:
+        """Race the primary's stream against fallbacks until one produces its first chunk.
+        
+        Each stream runs in its own task and hands chunks over through a
+        queue, ending with None or the exception that stopped it. A stream
+        that fails before its first chunk fails over to the next provider;
+        after that, errors reach the caller like those of a single stream.
+        """
+        clients = [self, *self.fallbacks]
+        streams: List[Tuple[asyncio.Task, asyncio.Queue]] = []
+        waiting: Dict[asyncio.Task, Tuple[AsyncLLMClient, str, asyncio.Queue]] = {}
+        errors = []
+        
+        async def pump(client: AsyncLLMClient, queue: asyncio.Queue):
+            try:
+                async for chunk in client._stream_single(prompt, system_prompt):
+                    queue.put_nowait(chunk)
+                queue.put_nowait(None)
+            except Exception as e:
+                queue.put_nowait(e)
+        
+        def launch(role: str):
+            client = clients[len(streams)]
+            if role != "primary":
+                metrics.LLM_HEDGES_TOTAL.labels(role).inc()
+                print(f"⚠️  {'Hedging' if role == 'hedge' else 'Failing over'} to {client.provider}/{client.model} (stream)")
+            queue = asyncio.Queue()
+            streams.append((asyncio.create_task(pump(client, queue)), queue))
+            waiting[asyncio.create_task(queue.get())] = (client, role, queue)
+        
+        launch("primary")
+        hedge_at = time.monotonic() + self.hedge_delay(first_chunk=True)
+        winner = None
+        try:
+            while waiting and winner is None:
+                wait = max(0.0, hedge_at - time.monotonic()) if hedge_at else None
+                done, _ = await asyncio.wait(waiting, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # No text from the primary yet; race it against the next provider
+                    hedge_at = None
+                    launch("hedge")
+                    continue
+                for getter in done:
+                    client, role, queue = waiting.pop(getter)
+                    item = getter.result()
+                    if isinstance(item, str) and winner is None:
+                        winner = (client, role, queue, item)
+                    elif not isinstance(item, str):
+                        errors.append(f"{client.provider}/{client.model}: {str(item or 'empty stream')[:200]}")
+                if winner is None and not waiting and len(streams) < len(clients):
+                    hedge_at = None
+                    launch("failover")
+            if winner is None:
+                raise Exception("LLM API error: all providers failed (" + "; ".join(errors) + ")")
+            for getter in waiting:
+                getter.cancel()
+            client, role, queue, item = winner
+            for task, other in streams:
+                if other is not queue:
+                    task.cancel()
+            metrics.LLM_HEDGE_WINS_TOTAL.labels(client.provider, client.model, role).inc()
+            
+            while item is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                item = await queue.get()
+        finally:
+            for getter in waiting:
+                getter.cancel()
+            for task, _ in streams:
+                task.cancel()
+    
+    async def _stream_code(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        client = self._get_client()
+        reserved = await self._acquire_async(prompt, system_prompt)
+        if self.provider == "gemini":
+            model, full_prompt = await self._gemini_request_async(client, system_prompt, prompt)
+            response = await model.generate_content_async(
+                full_prompt,
+                generation_config={"temperature": 0.7, "max_output_tokens": 8192},
+                safety_settings=GEMINI_SAFETY_SETTINGS,
+                stream=True,
+                request_options={"timeout": self.timeout}
+            )
+            last_chunk = None
+            async for chunk in response:
+                last_chunk = chunk
+                if chunk.candidates and chunk.candidates[0].content.parts:
+                    yield chunk.text
+            if last_chunk is not None:
+                self._record_usage(last_chunk, reserved)
+        
+        elif self.provider in ["aipipe", "openai"]:
+            messages = []
+            if system_prompt:
+                messages.append({"role": "system", "content": system_prompt})
+            messages.append({"role": "user", "content": prompt})
+            stream = await client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=4000,
+                stream=True,
+                **({"stream_options": {"include_usage": True}} if self.provider == "openai" else {})
+            )
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    self._record_usage(chunk, reserved)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        
+        else:
+            async with client.messages.stream(
+                model=self.model,
+                max_tokens=4000,
+                system=self._anthropic_system(system_prompt),
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                self._record_usage(await stream.get_final_message(), reserved)
+    
+    async def generate_app(
+        self,
+        brief: str,
+        checks: list,
+        attachments: list = None,
+        on_file: Optional[Callable[[str, str], None]] = None,
+        stream: Optional[bool] = None,
+        use_cache: Optional[bool] = None,
+    ) -> Dict[str, str]:
+        """Async generate_app; see LLMClient.generate_app for the arguments."""
+        brief = (brief or "").strip()
+        checks = [str(c).strip() for c in (checks or [])]
+        attachments = sorted(
+            ({"name": a.get("name"), "url": a.get("url"), "sample": a.get("sample", True)} for a in (attachments or [])),
+            key=lambda a: (a["name"] or "", a["url"] or "")
+        )
+        system_prompt, prompt = self._build_app_prompt(brief, checks, attachments)
+        
+        async def generate() -> Tuple[Dict[str, str], bool]:
+            return await self._generate_app_files(brief, prompt, system_prompt, on_file, stream)
+        
+        if use_cache is None:
+            use_cache = config.LLM_CACHE_ENABLED
+        if not use_cache:
+            return (await generate())[0]
+        
+        key = generation_cache.make_key(
+            self.provider, self.model, system_prompt=system_prompt, prompt=prompt
+        )
+        files, source = await generation_cache.aget_or_generate(key, generate, self.provider, self.model)
+        if source != "miss":
+            print(f"✓ Generation cache {source}: {key[:12]}")
+            if on_file:
+                for name, content in files.items():
+                    on_file(name, content)
+        return files
+    
+    async def _generate_app_files(
+        self,
+        brief: str,
+        prompt: str,
+        system_prompt: str,
+        on_file: Optional[Callable[[str, str], None]] = None,
+        stream: Optional[bool] = None,
+    ) -> Tuple[Dict[str, str], bool]:
+        if stream is None:
+            stream = config.LLM_STREAMING
+        files = None
+        emitted = set()  # files a failed stream already handed to on_file
+        if stream:
+            try:
+                files = await self._generate_files_streaming(prompt, system_prompt, self._track_emitted(on_file, emitted))
+            except Exception as e:
+                print(f"⚠️  Streaming generation failed ({str(e)[:100]}), retrying without streaming")
+        if files is None:
+            response = await self.generate_code(prompt, system_prompt)
+            files = self._parse_files(response)
+            if on_file:
+                for name, content in files.items():
+                    if name not in emitted:
+                        on_file(name, content)
+        return self._complete_files(brief, files)
+    
+    async def _generate_files_streaming(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        on_file: Optional[Callable[[str, str], None]] = None,
+    ) -> Dict[str, str]:
+        parser = IncrementalFileParser()
+        async for chunk in self.stream_code(prompt, system_prompt):
+            for name, content in parser.feed(chunk):
+                if on_file:
+                    on_file(name, content)
+        for name, content in parser.close():
+            if on_file:
+                on_file(name, content)
+        if not parser.files:
+            raise Exception("Streamed response contained no files")
+        return parser.files
+    
+    async def generate_revision(
+        self,
+        brief: str,
+        checks: list,
+        files: Dict[str, str],
+        attachments: list = None,
+    ) -> Dict[str, str]:
+        """Async generate_revision; see LLMClient.generate_revision."""
+        system_prompt, prompt = self._build_revision_prompt(brief, checks, files, attachments)
+        response = await self.generate_code(prompt, system_prompt)
+        return self._apply_revision(response, files)
+    
+    async def generate_repair(
+        self,
+        brief: str,
+        failures: List[Dict[str, Any]],
+        files: Dict[str, str],
+        errors: List[str] = None,
+    ) -> Dict[str, str]:
+        """Async generate_repair; see LLMClient.generate_repair."""
+        system_prompt, prompt = self._build_repair_prompt(brief, failures, files, errors)
+        response = await self.generate_code(prompt, system_prompt)
+        return self._apply_repair(response, files)
+
+
+# Singleton instances
 llm_client = LLMClient()
+async_llm_client = AsyncLLMClient()
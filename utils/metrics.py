@@ -0,0 +1,125 @@
+"""Prometheus metrics for the deployment pipeline, evaluation and external APIs.
+
+Metrics live in the default registry and are exposed by ``GET /metrics`` on
+the main app. Scripts that run in their own process (e.g. scripts/evaluate.py)
+record into their own registry, which is only visible while they run.
+"""
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Deployments span seconds (push) to minutes (LLM generation, Pages builds)
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "deployment_stage_seconds", "Time spent working in a pipeline stage",
+    ["stage", "outcome"], buckets=DURATION_BUCKETS
+)
+PIPELINE_STAGE_WAIT_SECONDS = Histogram(
+    "deployment_stage_wait_seconds", "Time a job spent queued before a pipeline stage",
+    ["stage"], buckets=DURATION_BUCKETS
+)
+PIPELINE_STEP_SECONDS = Histogram(
+    "deployment_step_seconds", "Time spent in individual steps within a stage",
+    ["step"], buckets=DURATION_BUCKETS
+)
+PIPELINE_QUEUE_DEPTH = Gauge(
+    "deployment_queue_depth", "Jobs waiting in a pipeline stage queue", ["stage"]
+)
+PIPELINE_STAGE_BUSY = Gauge(
+    "deployment_stage_busy", "Jobs currently being processed by a stage", ["stage"]
+)
+DEPLOYMENTS_TOTAL = Counter(
+    "deployments_total", "Deployments that finished", ["status"]
+)
+DEPLOYMENT_SECONDS = Histogram(
+    "deployment_seconds", "End-to-end time from request to finished deployment",
+    ["status"], buckets=DURATION_BUCKETS
+)
+
+EVALUATION_CHECK_SECONDS = Histogram(
+    "evaluation_check_seconds", "Time spent running an evaluation check",
+    ["check"], buckets=DURATION_BUCKETS
+)
+EVALUATION_CHECKS_TOTAL = Counter(
+    "evaluation_checks_total", "Evaluation checks run", ["check", "result"]
+)
+
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds", "LLM request latency", ["provider", "model", "mode", "outcome"],
+    buckets=DURATION_BUCKETS
+)
+LLM_TOKENS_TOTAL = Counter(
+    "llm_tokens_total", "LLM tokens used", ["provider", "model", "kind"]
+)
+LLM_HEDGES_TOTAL = Counter(
+    "llm_hedges_total", "Extra requests sent to fallback LLM providers", ["reason"]
+)
+LLM_HEDGE_WINS_TOTAL = Counter(
+    "llm_hedge_wins_total", "Multi-provider LLM calls by the request that answered",
+    ["provider", "model", "role"]
+)
+LLM_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "llm_rate_limit_wait_seconds", "Time a call queued for client-side LLM rate-limit budget",
+    ["provider", "model"], buckets=DURATION_BUCKETS
+)
+
+GITHUB_REQUESTS_TOTAL = Counter(
+    "github_api_requests_total", "GitHub REST API requests", ["method", "status"]
+)
+GITHUB_RATE_LIMIT_REMAINING = Gauge(
+    "github_rate_limit_remaining", "Remaining GitHub API requests in the current window", ["resource"]
+)
+GITHUB_RATE_LIMIT_RESET = Gauge(
+    "github_rate_limit_reset_timestamp", "When the GitHub rate-limit window resets (unix time)", ["resource"]
+)
+
+PREFLIGHT_RUNS_TOTAL = Counter(
+    "preflight_runs_total", "Local preflight runs of generated sites", ["template", "outcome"]
+)
+PREFLIGHT_SECONDS = Histogram(
+    "preflight_seconds", "Time to serve a generated site locally and run its js: checks",
+    ["template"], buckets=DURATION_BUCKETS
+)
+
+CALLBACK_DELIVERIES_TOTAL = Counter(
+    "evaluation_callback_deliveries_total", "Evaluation callback delivery attempts", ["outcome"]
+)
+CALLBACK_DELIVERY_SECONDS = Histogram(
+    "evaluation_callback_delivery_seconds", "Evaluation callback request latency",
+    buckets=DURATION_BUCKETS
+)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe the duration of a block; adds outcome=ok/error if the histogram has that label."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        if "outcome" in histogram._labelnames:
+            labels["outcome"] = outcome
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def record_rate_limit(headers):
+    """Update the rate-limit gauges from GitHub response headers."""
+    remaining = headers.get("X-RateLimit-Remaining")
+    if remaining is None:
+        return
+    resource = headers.get("X-RateLimit-Resource", "core")
+    GITHUB_RATE_LIMIT_REMAINING.labels(resource).set(float(remaining))
+    reset = headers.get("X-RateLimit-Reset")
+    if reset is not None:
+        GITHUB_RATE_LIMIT_RESET.labels(resource).set(float(reset))
+
+
+def render():
+    """Return (body, content_type) for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,208 @@
+"""Shared asyncio watcher for GitHub Pages readiness.
+
+Instead of one blocking ``wait_for_pages`` loop (and one sleeping thread) per
+deployment, a single background task tracks every pending Pages site, polls
+them through one pooled HTTP client, and resolves a future per site once it
+serves HTTP 200. Poll times adapt to recently observed build durations.
+"""
+import asyncio
+import time
+import statistics
+from collections import deque
+from typing import Dict, Optional, Any
+
+import httpx
+
+from utils.github_helper import github_helper
+from config.config import config
+from utils import metrics, tracing
+
+
+class _PendingSite:
+    """A Pages site being watched."""
+
+    def __init__(self, repo_name: str, pages_url: str, timeout: float, commit_sha: str = None):
+        self.repo_name = repo_name
+        self.pages_url = pages_url
+        self.commit_sha = commit_sha  # build to wait for when the site already serves an older one
+        self.started_at = time.time()
+        self.deadline = self.started_at + timeout
+        self.next_poll_at = self.started_at
+        self.interval = config.PAGES_POLL_MIN_INTERVAL
+        self.phase = "build"  # build: poll Pages build status, site: poll public URL
+        self.polls = 0
+        # Polls run on the watcher's own task, so remember the caller's span
+        self.trace_id = tracing.current_trace_id()
+        self.parent_span_id = tracing.current_span_id()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class PagesWatcher:
+    """Multiplexes Pages readiness polling for all in-flight deployments."""
+
+    def __init__(self):
+        self._pending: Dict[str, _PendingSite] = {}
+        self._history = deque(maxlen=config.PAGES_HISTORY_SIZE)  # seconds until ready
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.polls = 0
+        self.ready = 0
+        self.timed_out = 0
+
+    def start(self):
+        """Start the polling loop on the running event loop (idempotent)."""
+        if self._task and not self._task.done():
+            return
+        self._client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(
+                max_connections=config.PAGES_WATCHER_CONNECTIONS,
+                max_keepalive_connections=config.PAGES_WATCHER_CONNECTIONS,
+            ),
+            headers={"User-Agent": "llm-code-deployment-bot"},
+        )
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def wait(self, repo_name: str, pages_url: str, timeout: float = None, commit_sha: str = None) -> bool:
+        """Wait until pages_url serves HTTP 200; return False on timeout.
+
+        With commit_sha, the site only counts as ready once the Pages build
+        for that commit has finished (for revisions of a live site).
+        """
+        self.start()
+        site = self._pending.get(pages_url)
+        if site is not None and commit_sha:
+            site.commit_sha = commit_sha
+        if site is None:
+            site = _PendingSite(repo_name, pages_url, timeout or config.GITHUB_PAGES_TIMEOUT, commit_sha)
+            site.next_poll_at = site.started_at + self._initial_delay()
+            self._pending[pages_url] = site
+            self._wakeup.set()
+        return await asyncio.shield(site.future)
+
+    def expected_build_seconds(self) -> float:
+        """Median time-to-ready of recent deployments (or the configured default)."""
+        if not self._history:
+            return float(config.PAGES_EXPECTED_BUILD_SECONDS)
+        return statistics.median(self._history)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "expected_build_seconds": round(self.expected_build_seconds(), 1),
+            "history_size": len(self._history),
+            "polls": self.polls,
+            "ready": self.ready,
+            "timed_out": self.timed_out,
+        }
+
+    def _initial_delay(self) -> float:
+        # Builds rarely finish much faster than usual, so skip the early polls
+        return max(0.0, self.expected_build_seconds() * 0.5)
+
+    def _next_interval(self, site: _PendingSite) -> float:
+        """Poll often around the expected ready time, back off once overdue."""
+        elapsed = time.time() - site.started_at
+        expected = self.expected_build_seconds()
+        if elapsed < expected * 2:
+            interval = expected / 10
+        else:
+            interval = site.interval * 1.5
+        site.interval = min(config.PAGES_POLL_MAX_INTERVAL, max(config.PAGES_POLL_MIN_INTERVAL, interval))
+        return site.interval
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            for site in list(self._pending.values()):
+                if now >= site.deadline:
+                    self._resolve(site, False)
+
+            due = [s for s in self._pending.values() if s.next_poll_at <= now]
+            if due:
+                await asyncio.gather(*(self._poll(site) for site in due))
+                continue
+
+            self._wakeup.clear()
+            if self._pending:
+                sleep_for = min(
+                    min(s.next_poll_at, s.deadline) for s in self._pending.values()
+                ) - time.time()
+            else:
+                sleep_for = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=sleep_for)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, site: _PendingSite):
+        site.polls += 1
+        self.polls += 1
+        started = time.time()
+        phase = site.phase
+        try:
+            if site.phase == "build":
+                await self._poll_build(site)
+            if site.phase == "site":
+                resp = await self._client.get(site.pages_url)
+                if resp.status_code == 200:
+                    self._resolve(site, True)
+                    return
+        except Exception:
+            # Network errors and odd responses just mean "not ready yet"
+            pass
+        finally:
+            if site.trace_id:
+                tracing.record("pages.poll", started, time.time(), trace_id=site.trace_id,
+                               parent_id=site.parent_span_id, phase=phase, poll=site.polls,
+                               ready=site.future.done())
+        site.next_poll_at = time.time() + self._next_interval(site)
+
+    async def _poll_build(self, site: _PendingSite):
+        """Poll the latest Pages build, triggering one if none exists yet."""
+        headers = {
+            "Authorization": f"token {github_helper.token}",
+            "Accept": "application/vnd.github+json",
+        }
+        repo_path = f"{github_helper.api_base}/repos/{github_helper.username}/{site.repo_name}"
+        resp = await self._client.get(f"{repo_path}/pages/builds/latest", headers=headers)
+        metrics.GITHUB_REQUESTS_TOTAL.labels("GET", str(resp.status_code)).inc()
+        metrics.record_rate_limit(resp.headers)
+        if resp.status_code == 404:
+            await self._client.post(f"{repo_path}/pages/builds", headers=headers)
+        elif resp.is_success:
+            data = resp.json() or {}
+            status = (data.get("status") or data.get("build") or "").lower()
+            built_commit = data.get("commit")
+            if site.commit_sha and built_commit and built_commit != site.commit_sha:
+                return  # latest build is still for an older commit
+            if status in {"built", "succeeded", "success"}:
+                site.phase = "site"
+        else:
+            # Build status unavailable (e.g. token lacks Pages scope): watch the site itself
+            site.phase = "site"
+
+    def _resolve(self, site: _PendingSite, ready: bool):
+        self._pending.pop(site.pages_url, None)
+        if ready:
+            self.ready += 1
+            self._history.append(time.time() - site.started_at)
+        else:
+            self.timed_out += 1
+        if not site.future.done():
+            site.future.set_result(ready)
+
+
+# Singleton instance (polling loop starts on first wait)
+pages_watcher = PagesWatcher()
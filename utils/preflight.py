@@ -0,0 +1,288 @@
+"""Local preflight of generated sites before they are pushed.
+
+The files of a deployment (including attachments deployed as files) are
+served by an in-process static server under their own path, like a project
+Pages site, and the task's ``js:`` checks are evaluated in headless Chromium
+the same way scripts/evaluate.py does. A failing build is then caught within
+seconds instead of after a push, a Pages build and an evaluation run.
+
+One Chromium is launched on first use and shared; every run gets a fresh
+browser context. Without Playwright or its browser, preflight is skipped with
+a warning and deployments go ahead unchecked; so do runs the browser itself
+fails (a crash, a closed target), after which it is relaunched.
+"""
+import time
+import uuid
+import asyncio
+import mimetypes
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+from typing import Dict, Any, Optional, List, Union, Tuple
+
+from config.config import config
+from utils import metrics, tracing
+
+# After "load", give fetch()es of attachments a moment to finish
+SETTLE_TIMEOUT_MS = 3000
+MAX_PAGE_ERRORS = 10
+
+
+class BrowserUnavailable(RuntimeError):
+    """Playwright or its Chromium build is not installed."""
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    """Serves GET /<site_id>/<file> from the server's in-memory sites."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        site_id, slash, name = urlparse(self.path).path.lstrip("/").partition("/")
+        files = self.server.sites.get(site_id)
+        if files is not None and not slash:
+            # Relative URLs only resolve inside the site with a trailing slash
+            self.send_response(301)
+            self.send_header("Location", f"/{site_id}/")
+            self.end_headers()
+            return
+        name = unquote(name) or "index.html"
+        content = files.get(name) if files is not None else None
+        if content is None:
+            self.send_error(404)
+            return
+        body = content.encode("utf-8") if isinstance(content, str) else content
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StaticSiteServer:
+    """Serves in-memory sites at http://127.0.0.1:<port>/<site_id>/ from a daemon thread."""
+
+    def __init__(self):
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._lock = threading.Lock()
+
+    def add(self, files: Dict[str, Union[str, bytes]]) -> Tuple[str, str]:
+        """Publish a site; returns (site_id, url)."""
+        with self._lock:
+            if self._server is None:
+                self._server = ThreadingHTTPServer(("127.0.0.1", 0), _SiteHandler)
+                self._server.daemon_threads = True
+                self._server.sites = {}
+                threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        site_id = uuid.uuid4().hex[:12]
+        self._server.sites[site_id] = dict(files)
+        return site_id, f"http://127.0.0.1:{self._server.server_port}/{site_id}/"
+
+    def remove(self, site_id: str):
+        if self._server is not None:
+            self._server.sites.pop(site_id, None)
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                self._server.shutdown()
+                self._server.server_close()
+                self._server = None
+
+
+class BrowserPool:
+    """A shared headless Chromium handing out isolated pages, at most ``size`` at once."""
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+        self._playwright = None
+        self._browser = None
+        self.launches = 0
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        """Yield a page in a fresh browser context (closed afterwards)."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+            self._launch_lock = asyncio.Lock()
+        async with self._slots:
+            browser = await self._get_browser()
+            context = await browser.new_context()
+            try:
+                yield await context.new_page()
+            finally:
+                await context.close()
+
+    async def _get_browser(self):
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            try:
+                from playwright.async_api import async_playwright
+            except ImportError as e:
+                raise BrowserUnavailable(f"Playwright is not installed: {e}")
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            try:
+                self._browser = await self._playwright.chromium.launch(headless=True)
+            except Exception as e:
+                await self.close()
+                raise BrowserUnavailable(str(e).splitlines()[0] if str(e) else e.__class__.__name__)
+            self.launches += 1
+            return self._browser
+
+    async def reset(self):
+        """Drop the shared browser after a failure; the next page launches a new one."""
+        if self._launch_lock is None:
+            return
+        async with self._launch_lock:
+            if self._browser is not None:
+                with contextlib.suppress(Exception):
+                    await self._browser.close()
+                self._browser = None
+
+    async def close(self):
+        if self._browser is not None:
+            with contextlib.suppress(Exception):
+                await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            with contextlib.suppress(Exception):
+                await self._playwright.stop()
+            self._playwright = None
+
+
+class Preflight:
+    """Runs a task's js: checks against generated files served locally."""
+
+    def __init__(self):
+        self.server = StaticSiteServer()
+        self.browsers = BrowserPool(config.PIPELINE_PREFLIGHT_CONCURRENCY)
+        self.unavailable: Optional[str] = None
+        self.skipped = 0
+        self.errors = 0  # runs skipped because the browser failed
+        self._templates: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def js_checks(checks: List[str]) -> List[str]:
+        return [str(c).strip() for c in checks or [] if str(c).strip().startswith("js:")]
+
+    async def run(
+        self, files: Dict[str, Union[str, bytes]], checks: List[str], template: str = "unmatched"
+    ) -> Optional[Dict[str, Any]]:
+        """Serve the files and evaluate the js: checks.
+
+        Returns None when there is nothing to check or no browser, otherwise
+        {"passed", "failed" (check list), "checks" (per-check results),
+        "errors" (console errors, uncaught exceptions, load failures), "seconds"}.
+        """
+        js_checks = self.js_checks(checks)
+        if not js_checks or self.unavailable:
+            self.skipped += 1
+            return None
+
+        started = time.perf_counter()
+        site_id, url = self.server.add(files)
+        try:
+            with tracing.span("preflight.run", template=template, checks=len(js_checks)):
+                result = await self._run_checks(url, js_checks)
+                tracing.annotate(failed=len(result["failed"]))
+        except BrowserUnavailable as e:
+            self.unavailable = str(e)
+            self.skipped += 1
+            print(f"⚠ Preflight disabled, no headless browser: {self.unavailable[:200]}")
+            return None
+        except Exception as e:
+            # The browser failed, not the app: deploy unchecked rather than fail the deployment
+            self.skipped += 1
+            self.errors += 1
+            print(f"⚠ Preflight skipped, browser error: {e.__class__.__name__}: {str(e)[:200]}")
+            await self.browsers.reset()
+            return None
+        finally:
+            self.server.remove(site_id)
+
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        self._record(template, result)
+        return result
+
+    async def _run_checks(self, url: str, js_checks: List[str]) -> Dict[str, Any]:
+        errors: List[str] = []
+
+        def add_error(message: str):
+            if len(errors) < MAX_PAGE_ERRORS:
+                errors.append(message[:300])
+
+        async with self.browsers.page() as page:
+            page.on("console", lambda msg: add_error(f"console.error: {msg.text}") if msg.type == "error" else None)
+            page.on("pageerror", lambda exc: add_error(f"Uncaught {exc}"))
+            try:
+                await page.goto(url, timeout=config.PLAYWRIGHT_TIMEOUT)
+                with contextlib.suppress(Exception):
+                    await page.wait_for_load_state("networkidle", timeout=SETTLE_TIMEOUT_MS)
+            except Exception as e:
+                add_error(f"Page load failed: {e}")
+
+            results = []
+            for check in js_checks:
+                try:
+                    value = await page.evaluate(check[3:].strip())
+                    results.append({"check": check, "passed": bool(value), "result": repr(value)[:200]})
+                except Exception as e:
+                    results.append({"check": check, "passed": False, "result": f"Error: {str(e)[:300]}"})
+
+        failed = [r["check"] for r in results if not r["passed"]]
+        return {"passed": not failed, "failed": failed, "checks": results, "errors": errors}
+
+    @staticmethod
+    def feedback(result: Dict[str, Any]) -> str:
+        """Prompt text describing a failed preflight, appended to the brief on regeneration."""
+        lines = ["", "", "A previous version of this app failed these checks when loaded in a browser:"]
+        lines += [f"- {r['check']} -> {r['result']}" for r in result["checks"] if not r["passed"]]
+        if result["errors"]:
+            lines.append("Errors on the page:")
+            lines += [f"- {error}" for error in result["errors"]]
+        lines.append("Fix these problems; every check must pass.")
+        return "\n".join(lines)
+
+    def _record(self, template: str, result: Dict[str, Any]):
+        entry = self._templates.setdefault(template, {"runs": 0, "passed": 0, "seconds": 0.0})
+        entry["runs"] += 1
+        entry["passed"] += int(result["passed"])
+        entry["seconds"] += result["seconds"]
+        metrics.PREFLIGHT_RUNS_TOTAL.labels(template, "pass" if result["passed"] else "fail").inc()
+        metrics.PREFLIGHT_SECONDS.labels(template).observe(result["seconds"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": config.PREFLIGHT_ENABLED,
+            "unavailable": self.unavailable,
+            "browser_launches": self.browsers.launches,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "templates": {
+                template: {
+                    "runs": entry["runs"],
+                    "passed": entry["passed"],
+                    "pass_rate": round(entry["passed"] / entry["runs"], 3),
+                    "avg_seconds": round(entry["seconds"] / entry["runs"], 3),
+                }
+                for template, entry in self._templates.items()
+            },
+        }
+
+    async def close(self):
+        await self.browsers.close()
+        self.server.close()
+
+
+# Singleton instance (server and browser start on first use)
+preflight = Preflight()
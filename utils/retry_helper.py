@@ -47,8 +47,8 @@ def retry_request(
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
             
-            # Check if successful
-            if response.status_code == 200:
+            # Check if successful (202 = accepted for background processing)
+            if 200 <= response.status_code < 300:
                 return response
             
             last_error = f"HTTP {response.status_code}: {response.text}"
@@ -92,7 +92,7 @@ def send_evaluation_response(
             json_data=data,
             timeout=90  # Increased from 30 to 90 seconds
         )
-        return response.status_code == 200
+        return 200 <= response.status_code < 300
     except Exception as e:
         print(f"Failed to send evaluation response: {e}")
         print("Warning: Failed to send evaluation response")
@@ -0,0 +1,135 @@
+"""Template-level reuse of generated apps.
+
+Briefs generated from the same template variant differ only in their
+seed-derived values and attachment payloads. For a recognised variant the app
+is generated once with placeholders (``__SEED__``, ``__RESULT__``,
+``__ATTACHMENT_<NAME>__``) by the async LLM client, whose generation cache
+(config.LLM_CACHE_ENABLED) shares it across students, then instantiated per
+student by substituting the real values (attachments deployed as files need
+no substitution; the app fetches them). Any validation failure returns None
+so the caller falls back to a full generation.
+"""
+import re
+import threading
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+from templates.task_loader import task_loader
+from utils.llm_client import async_llm_client
+from utils.attachments import is_file_attachment
+from config.config import config
+
+PLACEHOLDER_NOTE = (
+    "\n\nValues written as __NAME__ (for example __SEED__) are placeholders that are filled in "
+    "at deploy time. Copy them verbatim into the code as string literals; never rewrite, "
+    "split or compute them."
+)
+LEFTOVER_PLACEHOLDER = re.compile(r"__(?:SEED|RESULT|ATTACHMENT_[A-Z0-9_]+)__")
+
+
+class TemplateReuse:
+    """Generates once per template variant and instantiates per student."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.matched = 0
+        self.unmatched = 0
+        self.reused = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def attachment_placeholder(name: str) -> str:
+        return "__ATTACHMENT_" + re.sub(r"[^A-Z0-9]+", "_", name.upper()).strip("_") + "__"
+
+    async def generate(
+        self,
+        brief: str,
+        checks: List[str],
+        attachments: List[Dict[str, str]] = None,
+        on_file: Optional[Callable[[str, str], None]] = None,
+    ) -> Optional[Tuple[Dict[str, str], Dict[str, Any]]]:
+        """Return (files, match) for a recognised variant, or None to fall back."""
+        match = task_loader.match_task(brief, checks)
+        if match is None:
+            self._count("unmatched")
+            return None
+        self._count("matched")
+        label = f"{match['template_id']} round {match['round']} variant {match['variant']}"
+
+        try:
+            values = {"__SEED__": match["seed"], "__RESULT__": match["result"]}
+            parameterized_attachments = []
+            for att in attachments or []:
+                if is_file_attachment(att):
+                    # Deployed as a file: describe only its schema, which all students share
+                    parameterized_attachments.append({"name": att["name"], "url": att["url"], "sample": False})
+                    continue
+                placeholder = self.attachment_placeholder(att["name"])
+                values[placeholder] = att["url"]
+                parameterized_attachments.append({"name": att["name"], "url": placeholder})
+
+            def parameterize(text: str) -> str:
+                return text.replace("${seed}", "__SEED__").replace("${result}", "__RESULT__")
+
+            template_files = await async_llm_client.generate_app(
+                brief=parameterize(match["brief"]) + PLACEHOLDER_NOTE,
+                checks=[parameterize(check) for check in match["checks"]],
+                attachments=parameterized_attachments,
+                use_cache=config.LLM_CACHE_ENABLED,
+            )
+            files = self._instantiate(template_files, values, match)
+        except Exception as e:
+            print(f"⚠️  Template reuse failed for {label}: {str(e)[:200]}")
+            files = None
+
+        if files is None:
+            self._count("fallbacks")
+            return None
+
+        self._count("reused")
+        print(f"✓ Reused generation for {label}")
+        if on_file:
+            for name, content in files.items():
+                on_file(name, content)
+        return files, match
+
+    def _instantiate(
+        self, template_files: Dict[str, str], values: Dict[str, Optional[str]], match: Dict[str, Any]
+    ) -> Optional[Dict[str, str]]:
+        """Substitute placeholders, or return None if the result cannot be trusted."""
+        combined = "\n".join(template_files.values())
+        # Per-student data has to reach the page, otherwise every student gets the same app
+        required = [p for p in values if p.startswith("__ATTACHMENT_")]
+        if match["seed"] is not None and any("${seed}" in c for c in match["checks"]):
+            required.append("__SEED__")
+        missing = [p for p in required if p not in combined]
+        if missing:
+            print(f"⚠️  Template solution does not use {', '.join(missing)}")
+            return None
+
+        files = {}
+        for name, content in template_files.items():
+            for placeholder, value in values.items():
+                if value is not None:
+                    content = content.replace(placeholder, value)
+            leftover = LEFTOVER_PLACEHOLDER.search(content)
+            if leftover:
+                print(f"⚠️  Unresolved placeholder {leftover.group(0)} in {name}")
+                return None
+            files[name] = content
+        return files
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "matched": self.matched,
+            "unmatched": self.unmatched,
+            "reused": self.reused,
+            "fallbacks": self.fallbacks,
+        }
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+# Singleton instance
+template_reuse = TemplateReuse()
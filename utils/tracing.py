@@ -0,0 +1,266 @@
+"""Lightweight end-to-end tracing.
+
+Every task shares one trace id, derived from its nonce (uuid5), so the
+instructor scripts, the student deployment pipeline and the evaluator agree on
+it without coordination; HTTP hops also carry it in an ``X-Trace-Id`` header.
+Spans are queued and appended as JSON lines to ``config.TRACE_FILE`` by one
+background writer thread, so recording never blocks the event loop; the file is
+rotated past ``TRACE_FILE_MAX_BYTES`` (``traces.jsonl.1`` ...). Traces can be
+viewed as a waterfall with ``scripts/trace_view.py`` or ``GET /traces/{trace_id}``.
+
+The current span lives in a context variable, so nested spans (including code
+run through ``asyncio.to_thread``) are parented automatically.
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Tuple
+
+from config.config import config
+
+TRACE_HEADER = "X-Trace-Id"
+_TRACE_NAMESPACE = uuid.UUID("6f1d2c1e-8c1a-4f5e-9a43-2b7f3c0d9e11")
+
+# (trace_id, span_id) of the innermost active span
+_current: ContextVar[Optional[Tuple[str, str]]] = ContextVar("trace_span", default=None)
+_attributes: ContextVar[Optional[Dict[str, Any]]] = ContextVar("trace_attributes", default=None)
+
+_queue: "queue.Queue[str]" = queue.Queue(maxsize=config.TRACE_QUEUE_SIZE)
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+dropped = 0  # spans lost because the writer fell behind
+
+
+def trace_id_for(nonce: str) -> str:
+    """Deterministic trace id for a task nonce."""
+    return uuid.uuid5(_TRACE_NAMESPACE, str(nonce)).hex
+
+
+def current_trace_id() -> Optional[str]:
+    ctx = _current.get()
+    return ctx[0] if ctx else None
+
+
+def current_span_id() -> Optional[str]:
+    ctx = _current.get()
+    return ctx[1] if ctx else None
+
+
+def trace_headers(trace_id: str = None) -> Dict[str, str]:
+    """Headers that propagate the (current) trace to another service."""
+    trace_id = trace_id or current_trace_id()
+    return {TRACE_HEADER: trace_id} if trace_id else {}
+
+
+def trace_id_from_header(value: Optional[str], nonce: str = None) -> Optional[str]:
+    """Use a well-formed incoming trace id, else derive one from the nonce."""
+    if value and len(value) == 32 and all(c in "0123456789abcdef" for c in value.lower()):
+        return value.lower()
+    return trace_id_for(nonce) if nonce else None
+
+
+@contextmanager
+def span(name: str, trace_id: str = None, **attributes: Any):
+    """Record a span around a block.
+
+    Args:
+        name: Span name, e.g. "stage.push" or "github.POST"
+        trace_id: Start/join this trace; defaults to the current one. Without
+            any trace the block runs untraced.
+        attributes: Extra fields stored with the span
+    """
+    parent = _current.get()
+    if (trace_id is None and parent is None) or not config.TRACING_ENABLED:
+        yield None
+        return
+    if trace_id is None:
+        trace_id = parent[0]
+    parent_id = parent[1] if parent and parent[0] == trace_id else None
+    span_id = uuid.uuid4().hex[:16]
+    token = _current.set((trace_id, span_id))
+    attributes_token = _attributes.set(attributes)
+    start = time.time()
+    error = None
+    try:
+        yield span_id
+    except BaseException as e:
+        error = f"{e.__class__.__name__}: {str(e)[:300]}"
+        raise
+    finally:
+        _attributes.reset(attributes_token)
+        _current.reset(token)
+        record(name, start, time.time(), trace_id=trace_id, parent_id=parent_id,
+               span_id=span_id, error=error, **attributes)
+
+
+def annotate(**attributes: Any):
+    """Add attributes to the innermost active span (e.g. results known only at the end)."""
+    current = _attributes.get()
+    if current is not None:
+        current.update(attributes)
+
+
+def record(
+    name: str,
+    start: float,
+    end: float,
+    trace_id: str = None,
+    parent_id: str = None,
+    span_id: str = None,
+    error: str = None,
+    **attributes: Any,
+):
+    """Write a finished span (for timings measured outside a ``with`` block)."""
+    if not config.TRACING_ENABLED:
+        return
+    if trace_id is None:
+        ctx = _current.get()
+        if ctx is None:
+            return
+        trace_id, parent_id = ctx[0], parent_id or ctx[1]
+    entry = {
+        "trace_id": trace_id,
+        "span_id": span_id or uuid.uuid4().hex[:16],
+        "parent_id": parent_id,
+        "name": name,
+        "start": round(start, 6),
+        "end": round(end, 6),
+        "duration_ms": round((end - start) * 1000, 1),
+        "status": "error" if error else "ok",
+        "error": error,
+        "pid": os.getpid(),
+        "attributes": attributes,
+    }
+    _enqueue(json.dumps(entry, default=str))
+
+
+def _enqueue(line: str):
+    global dropped
+    _start_writer()
+    try:
+        _queue.put_nowait(line)
+    except queue.Full:
+        dropped += 1
+
+
+def _start_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name="trace-writer", daemon=True)
+            _writer.start()
+
+
+def _write_loop():
+    while True:
+        lines = [_queue.get()]
+        while True:
+            try:
+                lines.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write(lines)
+        except OSError as e:
+            print(f"Warning: Failed to write {len(lines)} trace spans: {e}")
+        finally:
+            for _ in lines:
+                _queue.task_done()
+
+
+def _write(lines: List[str]):
+    path = config.TRACE_FILE
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+        size = f.tell()
+    if config.TRACE_FILE_MAX_BYTES and size >= config.TRACE_FILE_MAX_BYTES:
+        _rotate(path, config.TRACE_FILE_BACKUPS)
+
+
+def _rotate(path: str, backups: int):
+    """traces.jsonl -> traces.jsonl.1 -> ... -> traces.jsonl.N (oldest dropped)."""
+    if backups <= 0:
+        os.remove(path)
+        return
+    for index in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{index}"):
+            os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def flush(timeout: float = 5.0) -> bool:
+    """Wait until queued spans are written; False if the writer did not catch up in time."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+atexit.register(flush)
+
+
+def load_trace(trace_id: str, path: str = None) -> List[Dict[str, Any]]:
+    """Read all spans of a trace from the trace file and its rotations, ordered by start time."""
+    if path is None:
+        path = config.TRACE_FILE
+        flush(timeout=1.0)
+    spans = []
+    paths = [path] + [f"{path}.{index}" for index in range(1, config.TRACE_FILE_BACKUPS + 1)]
+    for candidate in paths:
+        if not os.path.exists(candidate):
+            continue
+        with open(candidate, "r", encoding="utf-8") as f:
+            for line in f:
+                if trace_id not in line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("trace_id") == trace_id:
+                    spans.append(entry)
+    spans.sort(key=lambda s: s["start"])
+    return spans
+
+
+def render_waterfall(spans: List[Dict[str, Any]], width: int = 60) -> str:
+    """Render spans as an indented text waterfall."""
+    if not spans:
+        return "(no spans)"
+    t0 = min(s["start"] for s in spans)
+    total = max(max(s["end"] for s in spans) - t0, 1e-6)
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    ids = {s["span_id"] for s in spans}
+    for s in spans:
+        parent = s["parent_id"] if s["parent_id"] in ids else None
+        children.setdefault(parent, []).append(s)
+
+    lines = [f"trace {spans[0]['trace_id']}  total {total:.2f}s  spans {len(spans)}"]
+
+    def walk(parent: Optional[str], depth: int):
+        for s in children.get(parent, []):
+            offset = int((s["start"] - t0) / total * width)
+            length = max(1, int((s["end"] - s["start"]) / total * width))
+            bar = " " * offset + "█" * min(length, width - offset)
+            label = ("  " * depth + s["name"])[:40]
+            marker = " ✗" if s["status"] == "error" else ""
+            lines.append(
+                f"{label:<40} {s['start'] - t0:8.2f}s {s['duration_ms'] / 1000:8.2f}s |{bar:<{width}}|{marker}"
+            )
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)